@@ -0,0 +1,383 @@
+"""In-process stand-ins for Discord, Redis and the LLM provider used by the benchmarks."""
+import asyncio
+import datetime
+import fnmatch
+import itertools
+import math
+import random
+import time
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+import discord
+from discord.user import ClientUser
+from src.clients.base import BaseAIClient
+
+
+class FakeRedis:
+    """Single-process stand-in for the redis.asyncio commands the bot issues.
+
+    Every command (or pipeline) costs one event loop turn plus `latency` seconds,
+    so round trips show up in timings without a Redis server.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.commands = 0
+        self._data: Dict[str, object] = {}
+        self._expires: Dict[str, float] = {}
+        self.connection_pool = type('Pool', (), {'connection_kwargs': {'db': 0}})()
+
+    async def _round_trip(self):
+        await asyncio.sleep(self.latency)
+
+    def _live(self, key: str):
+        expires = self._expires.get(key)
+        if expires is not None and expires <= time.monotonic():
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        return self._data.get(key)
+
+    def _run(self, name: str, *args, **kwargs):
+        self.commands += 1
+        return getattr(self, '_' + name)(*args, **kwargs)
+
+    def __getattr__(self, name: str):
+        if not hasattr(type(self), '_' + name):
+            raise AttributeError(name)
+
+        async def command(*args, **kwargs):
+            await self._round_trip()
+            return self._run(name, *args, **kwargs)
+        return command
+
+    def pipeline(self, transaction: bool = True) -> 'FakePipeline':
+        return FakePipeline(self)
+
+    async def aclose(self):
+        pass
+
+    @staticmethod
+    def _encode(value) -> bytes:
+        if isinstance(value, bytes):
+            return value
+        return str(value).encode('utf-8')
+
+    # Lists
+    def _lpush(self, key, *values):
+        items = self._live(key)
+        if items is None:
+            items = self._data[key] = []
+        items[:0] = [self._encode(value) for value in reversed(values)]
+        return len(items)
+
+    def _lrange(self, key, start, end):
+        items = self._live(key) or []
+        end = len(items) if end == -1 else end + 1
+        return list(items[start:end])
+
+    def _ltrim(self, key, start, end):
+        items = self._live(key)
+        if items is not None:
+            end = len(items) if end == -1 else end + 1
+            items[:] = items[start:end]
+        return True
+
+    def _llen(self, key):
+        return len(self._live(key) or [])
+
+    # Strings and keys
+    def _get(self, key):
+        return self._live(key)
+
+    def _mget(self, keys):
+        return [self._live(key) for key in keys]
+
+    def _set(self, key, value, ex=None, nx=False):
+        if nx and self._live(key) is not None:
+            return None
+        self._data[key] = self._encode(value)
+        self._expires.pop(key, None)
+        if ex is not None:
+            self._expires[key] = time.monotonic() + ex
+        return True
+
+    def _expire(self, key, seconds):
+        if self._live(key) is None:
+            return False
+        self._expires[key] = time.monotonic() + seconds
+        return True
+
+    def _delete(self, *keys):
+        removed = 0
+        for key in keys:
+            key = key.decode('utf-8') if isinstance(key, bytes) else key
+            removed += self._data.pop(key, None) is not None
+            self._expires.pop(key, None)
+        return removed
+
+    def _keys(self, pattern='*'):
+        return [key.encode('utf-8') for key in list(self._data) if self._live(key) is not None and fnmatch.fnmatchcase(key, pattern)]
+
+    # Sorted sets
+    def _zadd(self, key, mapping):
+        scores = self._data.setdefault(key, {})
+        added = sum(member not in scores for member in mapping)
+        scores.update(mapping)
+        return added
+
+    def _zrem(self, key, *members):
+        scores = self._data.get(key, {})
+        removed = 0
+        for member in members:
+            member = member.decode('utf-8') if isinstance(member, bytes) else member
+            removed += scores.pop(member, None) is not None
+        return removed
+
+    def _zcard(self, key):
+        return len(self._data.get(key, {}))
+
+    def _zrange(self, key, start, end, desc=False):
+        ordered = sorted(self._data.get(key, {}).items(), key=lambda item: item[1], reverse=desc)
+        end = len(ordered) if end == -1 else end + 1
+        return [member.encode('utf-8') for member, _ in ordered[start:end]]
+
+    def _zremrangebyrank(self, key, start, end):
+        scores = self._data.get(key, {})
+        ordered = sorted(scores, key=scores.get)
+        # Negative ranks count from the highest score, as in Redis
+        start, end = (rank + len(ordered) if rank < 0 else rank for rank in (start, end))
+        doomed = ordered[max(0, start):end + 1]
+        for member in doomed:
+            del scores[member]
+        return len(doomed)
+
+    def _zremrangebyscore(self, key, low, high):
+        low = float(low)
+        high = float(high)
+        scores = self._data.get(key, {})
+        doomed = [member for member, score in scores.items() if low <= score <= high]
+        for member in doomed:
+            del scores[member]
+        return len(doomed)
+
+
+class FakePipeline:
+    """Queues commands and runs them together for the cost of one round trip."""
+
+    def __init__(self, redis: FakeRedis):
+        self.redis = redis
+        self._calls: List[Tuple[str, tuple, dict]] = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self._calls = []
+
+    def __getattr__(self, name: str):
+        if not hasattr(FakeRedis, '_' + name):
+            raise AttributeError(name)
+
+        def queue(*args, **kwargs):
+            self._calls.append((name, args, kwargs))
+            return self
+        return queue
+
+    async def execute(self):
+        await self.redis._round_trip()
+        calls, self._calls = self._calls, []
+        return [self.redis._run(name, *args, **kwargs) for name, args, kwargs in calls]
+
+
+class LatencyDistribution:
+    """Seconds to wait, parsed from 'fixed:S', 'uniform:LOW,HIGH' or 'lognormal:MEDIAN,SIGMA'."""
+
+    def __init__(self, spec: str, rng: Optional[random.Random] = None):
+        self.spec = spec
+        self.rng = rng or random.Random()
+        kind, _, params = spec.partition(':')
+        values = [float(value) for value in params.split(',') if value]
+        if kind == 'fixed' and len(values) == 1:
+            self._sample = lambda: values[0]
+        elif kind == 'uniform' and len(values) == 2:
+            self._sample = lambda: self.rng.uniform(values[0], values[1])
+        elif kind == 'lognormal' and len(values) == 2:
+            mu = math.log(values[0])
+            self._sample = lambda: self.rng.lognormvariate(mu, values[1])
+        else:
+            raise ValueError(f"Invalid latency distribution: {spec}")
+
+    def sample(self) -> float:
+        return max(0.0, self._sample())
+
+
+class StubAIClient(BaseAIClient):
+    """LLM client that answers after a sampled delay, streaming the reply in `chunks` pieces."""
+
+    provider = "stub"
+
+    def __init__(self, latency: LatencyDistribution, first_token: Optional[LatencyDistribution] = None,
+                 reply_chars: int = 400, chunks: int = 20, error_rate: float = 0.0,
+                 rng: Optional[random.Random] = None):
+        self.latency = latency
+        self.first_token = first_token or latency
+        self.reply_chars = reply_chars
+        self.chunks = max(1, chunks)
+        self.error_rate = error_rate
+        self.rng = rng or random.Random()
+        self.calls = 0
+        self.errors = 0
+
+    def _reply(self, messages: List[Dict]) -> str:
+        seed = messages[-1].get("message", "") if messages else ""
+        return (f"re: {seed} " + "lorem ipsum " * self.reply_chars)[:self.reply_chars]
+
+    def _maybe_fail(self):
+        if self.error_rate and self.rng.random() < self.error_rate:
+            self.errors += 1
+            raise RuntimeError("stub provider error")
+
+    async def generate_response(self, prompt: str) -> str:
+        response = await self.chat("stub", [{"role": "User", "message": prompt}])
+        return response["content"]
+
+    async def chat(self, model: str, messages: List[Dict], **kwargs) -> Dict:
+        self.calls += 1
+        await asyncio.sleep(self.latency.sample())
+        self._maybe_fail()
+        return {"content": self._reply(messages)}
+
+    async def chat_stream(self, model: str, messages: List[Dict], **kwargs) -> AsyncIterator[str]:
+        self.calls += 1
+        total = self.latency.sample()
+        first = min(self.first_token.sample(), total)
+        await asyncio.sleep(first)
+        self._maybe_fail()
+        reply = self._reply(messages)
+        step = -(-len(reply) // self.chunks)
+        for start in range(0, len(reply), step):
+            yield reply[start:start + step]
+            await asyncio.sleep((total - first) / self.chunks)
+
+
+class FakeDiscord:
+    """Guilds, channels and users wired into a client's connection state, with HTTP calls answered locally.
+
+    Incoming messages are real discord.Message objects dispatched through the
+    client's event machinery. Outgoing sends, edits and deletes are recorded
+    instead of reaching Discord, after `http_latency` seconds. The last
+    `history_limit` messages of each channel can be read back through the
+    message history endpoint.
+    """
+
+    BOT_ID = 100000000000000001
+
+    def __init__(self, client: discord.Client, http_latency: Optional[LatencyDistribution] = None,
+                 history_limit: int = 200):
+        self.client = client
+        self.state = client._connection
+        self.http_latency = http_latency
+        self._ids = itertools.count(200000000000000000)
+        self.sent = 0
+        self.edits = 0
+        self.deletes = 0
+        self.last_bot_message: Dict[int, dict] = {}
+        self.history_limit = history_limit
+        self.history: Dict[int, Dict[int, dict]] = {}
+        self.history_reads = 0
+        self._bot_user = {'id': self.BOT_ID, 'username': 'oracle', 'discriminator': '0', 'avatar': None, 'bot': True}
+        self.state.user = ClientUser(state=self.state, data=self._bot_user)
+        client.http.send_message = self._send_message
+        client.http.edit_message = self._edit_message
+        client.http.delete_message = self._delete_message
+        client.http.logs_from = self._logs_from
+
+    def next_id(self) -> int:
+        return next(self._ids)
+
+    @staticmethod
+    def user_payload(user_id: int) -> dict:
+        return {'id': user_id, 'username': f'user{user_id % 100000}', 'discriminator': '0', 'avatar': None}
+
+    def add_guild(self, channel_count: int) -> List[discord.TextChannel]:
+        guild_id = self.next_id()
+        channels = [{'id': self.next_id(), 'type': 0, 'name': f'chat-{i}', 'position': i} for i in range(channel_count)]
+        guild = discord.Guild(data={'id': guild_id, 'name': f'guild-{guild_id}', 'channels': channels,
+                                    'roles': [], 'members': [], 'member_count': 1}, state=self.state)
+        self.state._add_guild(guild)
+        return [guild.get_channel(channel['id']) for channel in channels]
+
+    def add_dm(self, user_id: int) -> discord.DMChannel:
+        channel = discord.DMChannel(me=self.state.user, state=self.state, data={
+            'id': self.next_id(), 'type': 1, 'recipients': [self.user_payload(user_id)]})
+        self.state._add_private_channel(channel)
+        return channel
+
+    def _message_payload(self, channel_id: int, author: dict, content: str, **extra) -> dict:
+        payload = {
+            'id': self.next_id(), 'channel_id': channel_id, 'author': author, 'content': content,
+            'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(), 'edited_timestamp': None,
+            'tts': False, 'mention_everyone': False, 'mentions': [], 'mention_roles': [],
+            'attachments': [], 'embeds': [], 'pinned': False, 'type': 0,
+        }
+        payload.update(extra)
+        return payload
+
+    def incoming(self, channel, author_id: int, content: str, mention: bool = False,
+                 reply_to_bot: bool = False) -> discord.Message:
+        """Build a user message as the gateway would deliver it."""
+        extra = {}
+        if isinstance(channel, discord.TextChannel):
+            extra['guild_id'] = channel.guild.id
+        if mention:
+            content = f'<@{self.BOT_ID}> {content}'
+            extra['mentions'] = [self._bot_user]
+        referenced = self.last_bot_message.get(channel.id) if reply_to_bot else None
+        if referenced is not None:
+            extra['message_reference'] = {'message_id': referenced['id'], 'channel_id': channel.id}
+            extra['referenced_message'] = referenced
+        payload = self._message_payload(channel.id, self.user_payload(author_id), content, **extra)
+        self._remember(payload)
+        return self.state.create_message(channel=channel, data=payload)
+
+    def _remember(self, payload: dict):
+        messages = self.history.setdefault(payload['channel_id'], {})
+        messages[payload['id']] = payload
+        if len(messages) > self.history_limit:
+            del messages[next(iter(messages))]
+
+    def dispatch(self, message: discord.Message):
+        self.client.dispatch('message', message)
+
+    async def _http(self):
+        await asyncio.sleep(self.http_latency.sample() if self.http_latency else 0)
+
+    async def _send_message(self, channel_id, *, params):
+        await self._http()
+        self.sent += 1
+        payload = self._message_payload(int(channel_id), self._bot_user, params.payload.get('content') or '')
+        self.last_bot_message[int(channel_id)] = payload
+        self._remember(payload)
+        return payload
+
+    async def _edit_message(self, channel_id, message_id, *, params):
+        await self._http()
+        self.edits += 1
+        payload = self._message_payload(int(channel_id), self._bot_user, params.payload.get('content') or '')
+        payload['id'] = int(message_id)
+        stored = self.history.get(int(channel_id), {}).get(int(message_id))
+        if stored is not None:
+            stored['content'] = payload['content']
+        return payload
+
+    async def _delete_message(self, channel_id, message_id, *, reason=None):
+        await self._http()
+        self.deletes += 1
+        self.history.get(int(channel_id), {}).pop(int(message_id), None)
+
+    async def _logs_from(self, channel_id, limit, before=None, after=None, around=None):
+        await self._http()
+        self.history_reads += 1
+        before = int(before) if before is not None else None
+        messages = [payload for message_id, payload in reversed(self.history.get(int(channel_id), {}).items())
+                    if before is None or message_id < before]
+        return messages[:limit]
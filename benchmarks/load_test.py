@@ -0,0 +1,353 @@
+"""End-to-end load test for the chat path, with no Discord, Redis or LLM provider required.
+
+Drives a real `Bot` and `AIChatModule` with a synthetic stream of guild chatter,
+mentions, replies to the bot and DMs. Messages are dispatched through discord.py's
+own event machinery (see benchmarks/fakes.py) and Redis is either an in-process
+stand-in or a real server (--redis-url). Run from the repository root, next to
+settings.toml:
+
+    python -m benchmarks.load_test --rate 200 --duration 30 --llm-latency lognormal:0.8,0.5
+
+Results are printed and written as JSON (--output, by default
+data/benchmarks/load-<commit>.json) so runs can be compared between commits.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import deque
+from types import SimpleNamespace
+from typing import Deque, Dict, List, Tuple
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    workload = parser.add_argument_group('workload')
+    workload.add_argument('--rate', type=float, default=50.0, help='Incoming messages per second (Poisson arrivals)')
+    workload.add_argument('--duration', type=float, default=20.0, help='Seconds to generate traffic for')
+    workload.add_argument('--guilds', type=int, default=10)
+    workload.add_argument('--channels-per-guild', type=int, default=10)
+    workload.add_argument('--users-per-channel', type=int, default=5)
+    workload.add_argument('--dm-users', type=int, default=100)
+    workload.add_argument('--dm-fraction', type=float, default=0.2, help='Share of messages that are DMs')
+    workload.add_argument('--mention-fraction', type=float, default=0.3, help='Share of guild messages that mention the bot')
+    workload.add_argument('--reply-fraction', type=float, default=0.1, help='Share of guild messages that reply to the bot')
+    workload.add_argument('--message-chars', type=int, default=120)
+    workload.add_argument('--seed', type=int, default=1)
+
+    services = parser.add_argument_group('services')
+    services.add_argument('--llm-latency', default='lognormal:0.8,0.5', help="fixed:S, uniform:LOW,HIGH or lognormal:MEDIAN,SIGMA")
+    services.add_argument('--llm-first-token', default='lognormal:0.25,0.4', help='Time to the first streamed chunk')
+    services.add_argument('--llm-error-rate', type=float, default=0.0)
+    services.add_argument('--reply-chars', type=int, default=400)
+    services.add_argument('--http-latency', default='fixed:0.02', help='Latency of each Discord REST call')
+    services.add_argument('--redis-latency', type=float, default=0.0005, help='Round trip of the in-process Redis stand-in')
+    services.add_argument('--redis-url', help='Use a real Redis server instead of the in-process stand-in')
+
+    run = parser.add_argument_group('run')
+    run.add_argument('--set', action='append', default=[], metavar='KEY=VALUE',
+                     help='Override a setting, e.g. --set chat.streaming=false (value parsed as JSON when possible)')
+    run.add_argument('--drain-timeout', type=float, default=60.0, help='Seconds to wait for in-flight turns after traffic stops')
+    run.add_argument('--lag-interval', type=float, default=0.01, help='Event loop lag probe interval')
+    run.add_argument('--tracemalloc', action='store_true', help='Also report Python heap peak (slows the run)')
+    run.add_argument('--output', help='Result file (JSON)')
+    return parser.parse_args(argv)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile; 0.0 for no samples."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[rank]
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    return {
+        'count': len(values),
+        'mean': sum(values) / len(values) if values else 0.0,
+        'p50': percentile(values, 50),
+        'p95': percentile(values, 95),
+        'p99': percentile(values, 99),
+        'max': max(values) if values else 0.0,
+    }
+
+
+def rss_bytes() -> int:
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        # ru_maxrss is kilobytes on Linux and bytes on macOS
+        scale = 1 if sys.platform == 'darwin' else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def git_revision() -> Dict[str, object]:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                                    capture_output=True, text=True, check=True).stdout.strip())
+        return {'commit': commit, 'dirty': dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return {'commit': None, 'dirty': None}
+
+
+def apply_overrides(config, overrides: List[str]):
+    """Set dotted settings on the loaded config, creating intermediate tables as needed."""
+    for override in overrides:
+        path, _, raw = override.partition('=')
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            value = raw
+        node = config.config
+        *parents, leaf = path.split('.')
+        for part in parents:
+            child = getattr(node, part, None)
+            if child is None:
+                child = SimpleNamespace()
+                setattr(node, part, child)
+            node = child
+        setattr(node, leaf, value)
+
+
+class LoopLagProbe:
+    """Measures how late a periodic sleep wakes up, and samples RSS along the way."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.lags: List[float] = []
+        self.peak_rss = rss_bytes()
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, loop.time() - started - self.interval))
+            if len(self.lags) % 50 == 0:
+                self.peak_rss = max(self.peak_rss, rss_bytes())
+
+
+class CompletionTracker:
+    """End-to-end latency per addressed message, from dispatch to the end of the turn that answered it.
+
+    Consecutive messages merged into one turn complete together, when the turn
+    for the latest of them finishes.
+    """
+
+    def __init__(self):
+        self.pending: Dict[int, Deque[Tuple[int, float]]] = {}
+        self.latencies: List[float] = []
+        self.completed = 0
+        self.idle = asyncio.Event()
+        self.idle.set()
+        self._outstanding = 0
+
+    def dispatched(self, channel_id: int, message_id: int):
+        self.pending.setdefault(channel_id, deque()).append((message_id, time.perf_counter()))
+        self._outstanding += 1
+        self.idle.clear()
+
+    def finished(self, channel_id: int, message_id: int):
+        queue = self.pending.get(channel_id)
+        now = time.perf_counter()
+        while queue:
+            queued_id, dispatched_at = queue.popleft()
+            self.latencies.append(now - dispatched_at)
+            self.completed += 1
+            self._outstanding -= 1
+            if queued_id == message_id:
+                break
+        if self._outstanding == 0:
+            self.idle.set()
+
+    @property
+    def outstanding(self) -> int:
+        return self._outstanding
+
+
+async def run(args: argparse.Namespace) -> Dict:
+    from src.core.config import config
+    apply_overrides(config, ['logging.level="WARNING"', 'metrics.enabled=false', 'memory.l1_invalidation=false'] + args.set)
+
+    from benchmarks.fakes import FakeDiscord, FakeRedis, LatencyDistribution, StubAIClient
+    import src.utils.redis_pool as redis_pool
+    from src.core.bot import Bot
+    from src.modules.ai.chat import AIChatModule
+    from src.modules.ai.short_term import setup as setup_short_term
+
+    rng = random.Random(args.seed)
+    fake_redis = None
+    if args.redis_url:
+        apply_overrides(config, [f'redis.url="{args.redis_url}"'])
+    else:
+        fake_redis = FakeRedis(latency=args.redis_latency)
+        redis_pool._clients[config.redis.url] = fake_redis
+
+    bot = Bot()
+    await bot._async_setup_hook()
+    discord_stub = FakeDiscord(bot, LatencyDistribution(args.http_latency, random.Random(args.seed + 1)))
+    client = StubAIClient(
+        LatencyDistribution(args.llm_latency, random.Random(args.seed + 2)),
+        LatencyDistribution(args.llm_first_token, random.Random(args.seed + 3)),
+        reply_chars=args.reply_chars,
+        error_rate=args.llm_error_rate,
+        rng=random.Random(args.seed + 4)
+    )
+    memory = await setup_short_term(bot)
+    module = AIChatModule(bot, client, memory)
+    await module.setup()
+    await bot.add_cog(module)
+
+    tracker = CompletionTracker()
+    process_chat = module._process_chat
+
+    async def tracked_process_chat(ctx, message):
+        try:
+            await process_chat(ctx, message)
+        finally:
+            tracker.finished(ctx.channel.id, ctx.message.id)
+    module._process_chat = tracked_process_chat
+
+    guild_channels = []
+    for _ in range(args.guilds):
+        guild_channels.extend(discord_stub.add_guild(args.channels_per_guild))
+    channel_users = {channel.id: [discord_stub.next_id() for _ in range(args.users_per_channel)] for channel in guild_channels}
+    dm_users = [discord_stub.next_id() for _ in range(args.dm_users)]
+    dm_channels = [discord_stub.add_dm(user_id) for user_id in dm_users]
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    rss_start = rss_bytes()
+    probe = LoopLagProbe(args.lag_interval)
+    probe.start()
+
+    counts = {'offered': 0, 'addressed': 0, 'ignored': 0, 'dm': 0, 'mention': 0, 'reply': 0}
+    words = ['oracle', 'what', 'do', 'you', 'think', 'about', 'this', 'weather', 'code', 'music', 'today', 'again']
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    next_arrival = started
+    while next_arrival - started < args.duration:
+        delay = next_arrival - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        next_arrival += rng.expovariate(args.rate)
+
+        text = ' '.join(rng.choice(words) for _ in range(max(1, args.message_chars // 6)))
+        if dm_channels and rng.random() < args.dm_fraction:
+            index = rng.randrange(len(dm_channels))
+            message = discord_stub.incoming(dm_channels[index], dm_users[index], text)
+            kind = 'dm'
+        else:
+            channel = rng.choice(guild_channels)
+            author = rng.choice(channel_users[channel.id])
+            roll = rng.random()
+            if roll < args.reply_fraction and channel.id in discord_stub.last_bot_message:
+                message = discord_stub.incoming(channel, author, text, reply_to_bot=True)
+                kind = 'reply'
+            elif roll < args.reply_fraction + args.mention_fraction:
+                message = discord_stub.incoming(channel, author, text, mention=True)
+                kind = 'mention'
+            else:
+                message = discord_stub.incoming(channel, author, text)
+                kind = None
+
+        counts['offered'] += 1
+        if kind is None:
+            counts['ignored'] += 1
+        else:
+            counts['addressed'] += 1
+            counts[kind] += 1
+            tracker.dispatched(message.channel.id, message.id)
+        discord_stub.dispatch(message)
+
+    traffic_seconds = loop.time() - started
+    try:
+        await asyncio.wait_for(tracker.idle.wait(), timeout=args.drain_timeout)
+    except asyncio.TimeoutError:
+        pass
+    elapsed = loop.time() - started
+    await probe.stop()
+
+    heap_peak = None
+    if args.tracemalloc:
+        heap_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    results = {
+        'messages': counts,
+        'completed': tracker.completed,
+        'unfinished': tracker.outstanding,
+        'traffic_seconds': traffic_seconds,
+        'elapsed_seconds': elapsed,
+        'offered_msgs_per_sec': counts['offered'] / traffic_seconds if traffic_seconds else 0.0,
+        'throughput_msgs_per_sec': tracker.completed / elapsed if elapsed else 0.0,
+        'latency_seconds': summarize(tracker.latencies),
+        'loop_lag_seconds': summarize(probe.lags),
+        'memory': {
+            'rss_start_bytes': rss_start,
+            'rss_peak_bytes': max(probe.peak_rss, rss_bytes()),
+            'rss_end_bytes': rss_bytes(),
+            'python_heap_peak_bytes': heap_peak,
+        },
+        'llm': {'calls': client.calls, 'errors': client.errors},
+        'coalesced_messages': module.coalesced_messages.value(),
+        'discord': {'sends': discord_stub.sent, 'edits': discord_stub.edits, 'deletes': discord_stub.deletes},
+        'redis_commands': fake_redis.commands if fake_redis is not None else None,
+    }
+
+    await bot.remove_cog(module.qualified_name)
+    await bot.close()
+    return results
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = asyncio.run(run(args))
+    revision = git_revision()
+    report = {
+        **revision,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python': platform.python_version(),
+        'params': vars(args),
+        'results': results,
+    }
+
+    output = args.output or os.path.join('data', 'benchmarks', f"load-{revision['commit'] or int(time.time())}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    latency = results['latency_seconds']
+    lag = results['loop_lag_seconds']
+    print(f"offered {results['offered_msgs_per_sec']:.1f} msg/s, answered {results['throughput_msgs_per_sec']:.1f} msg/s "
+          f"({results['completed']} done, {results['unfinished']} unfinished)")
+    print(f"latency p50 {latency['p50'] * 1000:.0f} ms, p95 {latency['p95'] * 1000:.0f} ms, p99 {latency['p99'] * 1000:.0f} ms")
+    print(f"loop lag p50 {lag['p50'] * 1000:.1f} ms, p99 {lag['p99'] * 1000:.1f} ms, max {lag['max'] * 1000:.1f} ms")
+    print(f"peak RSS {results['memory']['rss_peak_bytes'] / 2 ** 20:.1f} MiB")
+    print(f"results written to {output}")
+
+
+if __name__ == '__main__':
+    main()
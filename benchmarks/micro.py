@@ -0,0 +1,278 @@
+"""Microbenchmarks for the hot paths of a chat turn.
+
+Each benchmark is timed in repeats of `number` calls (auto-calibrated so a repeat
+takes at least --min-time seconds) with the garbage collector paused. The median
+time per call is reported together with allocation figures from tracemalloc,
+measured in a separate pass so tracing does not distort the timings. Run from the
+repository root, next to settings.toml:
+
+    python -m benchmarks.micro --save-baseline data/benchmarks/micro-baseline.json
+    python -m benchmarks.micro --compare data/benchmarks/micro-baseline.json --threshold 0.15
+
+With --compare, benchmarks slower (or allocating more) than the baseline by more
+than the threshold are flagged and the exit status is 1.
+"""
+import argparse
+import asyncio
+import fnmatch
+import gc
+import inspect
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Awaitable, Callable, Dict, List, Optional, Union
+
+Benchmark = Callable[[], Union[None, Awaitable[None]]]
+
+
+class Suite:
+    """Collects named benchmarks; async ones run on the suite's event loop."""
+
+    def __init__(self):
+        self.benchmarks: Dict[str, Benchmark] = {}
+        self.cleanups: List[Callable[[], Awaitable[None]]] = []
+
+    def add(self, name: str, fn: Benchmark):
+        self.benchmarks[name] = fn
+
+
+def _timed_loop(fn: Benchmark, number: int) -> Callable[[], Awaitable[float]]:
+    """Coroutine factory running fn `number` times and returning the elapsed seconds."""
+    if inspect.iscoroutinefunction(fn):
+        async def loop() -> float:
+            started = time.perf_counter()
+            for _ in range(number):
+                await fn()
+            return time.perf_counter() - started
+    else:
+        async def loop() -> float:
+            started = time.perf_counter()
+            for _ in range(number):
+                fn()
+            return time.perf_counter() - started
+    return loop
+
+
+async def measure(fn: Benchmark, repeat: int, min_time: float) -> Dict[str, float]:
+    # Warm up caches and lazy initialization, then grow `number` until a repeat takes min_time
+    await _timed_loop(fn, 1)()
+    number = 1
+    while True:
+        elapsed = await _timed_loop(fn, number)()
+        if elapsed >= min_time or number >= 1_000_000:
+            break
+        number *= 10 if elapsed < min_time / 10 else 2
+
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        gc.disable()
+        try:
+            timings.append(await _timed_loop(fn, number)() / number)
+        finally:
+            gc.enable()
+
+    # Allocation pass: peak traced bytes and blocks still held per call
+    alloc_calls = max(1, min(number, 1000))
+    gc.collect()
+    tracemalloc.start()
+    try:
+        blocks_before = sys.getallocatedblocks()
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        await _timed_loop(fn, alloc_calls)()
+        current, peak = tracemalloc.get_traced_memory()
+        blocks_after = sys.getallocatedblocks()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'number': number,
+        'median_seconds': statistics.median(timings),
+        'min_seconds': min(timings),
+        'stdev_seconds': statistics.stdev(timings) if len(timings) > 1 else 0.0,
+        'alloc_peak_bytes': max(0, peak - base),
+        'retained_bytes_per_call': max(0, current - base) / alloc_calls,
+        'retained_blocks_per_call': max(0, blocks_after - blocks_before) / alloc_calls,
+    }
+
+
+async def build_suite(history_sizes: List[int], tool_counts: List[int]) -> Suite:
+    from src.core.config import config
+    from benchmarks.fakes import FakeRedis, LatencyDistribution, StubAIClient
+    from benchmarks.load_test import apply_overrides
+    import src.utils.redis_pool as redis_pool
+    from src.utils.monitor import Monitor, configure_logging
+
+    # Keep benchmark logging out of the console and the bot's own log files
+    configure_logging(level='INFO', log_dir=tempfile.mkdtemp(prefix='oracle-bench-'), console=False)
+    apply_overrides(config, ['memory.l1_invalidation=false'])
+    redis_pool._clients[config.redis.url] = FakeRedis()
+
+    from src.modules.ai.chat import AIChatModule
+    from src.modules.ai.short_term import ShortTermMemory
+    suite = Suite()
+
+    # Short-term memory, with and without the in-process history cache
+    for l1 in (True, False):
+        apply_overrides(config, [f'memory.l1_cache={json.dumps(l1)}'])
+        memory = ShortTermMemory(config, Monitor('benchmarks.memory'))
+        await memory.setup()
+        suffix = 'l1' if l1 else 'redis'
+        for i in range(memory.short_term_limit):
+            await memory.store_interaction('bench', f'question {i} ' * 8, f'answer {i} ' * 30, False)
+
+        async def store(memory=memory):
+            await memory.store_interaction('bench', 'how is the weather today?', 'Sunny with a light breeze. ' * 10, False)
+
+        async def get(memory=memory):
+            await memory.get_recent_interactions('bench')
+
+        suite.add(f'short_term.store_interaction[{suffix}]', store)
+        suite.add(f'short_term.get_recent_interactions[{suffix}]', get)
+
+    # Conversation history assembly for growing histories
+    for size in history_sizes:
+        apply_overrides(config, ['memory.l1_cache=true', f'memory.short_term_limit={size}'])
+        memory = ShortTermMemory(config, Monitor('benchmarks.history'))
+        await memory.setup()
+        module = AIChatModule(None, StubAIClient(LatencyDistribution('fixed:0')), memory)
+        module.short_term_limit = size
+        module.prompt_cache.load()
+        for i in range(size):
+            await memory.store_interaction('history', f'question {i} ' * 8, f'answer {i} ' * 30, False)
+
+        async def history(module=module):
+            await module._get_conversation_history('history', 'and what about tomorrow?', False, 1)
+
+        suite.add(f'chat._get_conversation_history[{size}]', history)
+
+    # Tool schema conversion
+    from src.clients.cohere import CohereAIClient
+    from src.clients.tools import ToolRegistry
+    cohere_client = CohereAIClient()
+    suite.cleanups.append(cohere_client.close)
+    for count in tool_counts:
+        tools = [{
+            'type': 'function',
+            'function': {
+                'name': f'tool_{i}',
+                'description': f'Tool number {i} that does something useful',
+                'parameters': {
+                    'type': 'object',
+                    'properties': {f'arg_{j}': {'type': 'string', 'description': f'Argument {j}'} for j in range(6)},
+                },
+            },
+            'required': ['arg_0'],
+        } for i in range(count)]
+        suite.add(f'cohere.format_tools_for_cohere[{count}]', lambda tools=tools: cohere_client.format_tools_for_cohere(tools))
+        registry = ToolRegistry(config)
+        for tool in tools:
+            registry.register(tool['function']['name'], tool['function']['description'],
+                              tool['function']['parameters'], lambda **arguments: arguments)
+        suite.add(f'tools.schemas[cohere,{count}]', lambda registry=registry: registry.schemas('cohere'))
+
+    # Config access
+    suite.add('config.attribute', lambda: config.cohere.model)
+    suite.add('config.get', lambda: config.get('memory.context_budget', 2000))
+
+    # Logging: emitted records go through the queue; filtered ones should cost next to nothing
+    monitor = Monitor('benchmarks.monitor')
+    suite.add('monitor.log_info', lambda: monitor.log_info("Stored %d interaction(s) for channel %s", 1, 'bench'))
+    suite.add('monitor.log_debug[filtered]', lambda: monitor.log_debug("Sending chat request with history: %s", 'bench'))
+    return suite
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float) -> List[str]:
+    """Human-readable regressions of results against baseline."""
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        for metric in ('median_seconds', 'alloc_peak_bytes'):
+            old, new = previous.get(metric), result[metric]
+            # Ignore allocation noise of a few blocks on benchmarks that barely allocate
+            floor = 1e-9 if metric == 'median_seconds' else 256
+            if old is not None and new > max(old, floor) * (1 + threshold):
+                regressions.append(f"{name}: {metric} {old:.4g} -> {new:.4g} (+{(new / max(old, floor) - 1) * 100:.0f}%)")
+    return regressions
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--filter', default='*', help='Glob of benchmark names to run')
+    parser.add_argument('--repeat', type=int, default=7)
+    parser.add_argument('--min-time', type=float, default=0.05, help='Minimum seconds per timed repeat')
+    parser.add_argument('--history-sizes', default='5,20,100')
+    parser.add_argument('--tool-counts', default='10,100')
+    parser.add_argument('--output', help='Write results (JSON) here')
+    parser.add_argument('--save-baseline', metavar='PATH', help='Write results as the new baseline')
+    parser.add_argument('--compare', metavar='PATH', help='Baseline to compare against')
+    parser.add_argument('--threshold', type=float, default=0.15, help='Allowed relative slowdown before flagging')
+    return parser.parse_args(argv)
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Dict]:
+    suite = await build_suite(
+        [int(size) for size in args.history_sizes.split(',') if size],
+        [int(count) for count in args.tool_counts.split(',') if count]
+    )
+    results = {}
+    try:
+        for name, fn in suite.benchmarks.items():
+            if not fnmatch.fnmatchcase(name, args.filter):
+                continue
+            result = results[name] = await measure(fn, args.repeat, args.min_time)
+            print(f"{name:55} {result['median_seconds'] * 1e6:11.2f} us  ±{result['stdev_seconds'] * 1e6:8.2f}  "
+                  f"peak {result['alloc_peak_bytes']:>8} B  retained {result['retained_blocks_per_call']:6.1f} blocks/call")
+    finally:
+        for cleanup in suite.cleanups:
+            await cleanup()
+    return results
+
+
+def write_report(path: str, results: Dict[str, Dict], args: argparse.Namespace):
+    from benchmarks.load_test import git_revision
+    report = {
+        **git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python': platform.python_version(),
+        'params': vars(args),
+        'results': results,
+    }
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    baseline: Optional[Dict] = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+
+    results = asyncio.run(run(args))
+    for path in filter(None, (args.output, args.save_baseline)):
+        write_report(path, results, args)
+        print(f"results written to {path}")
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print(f"\nno regressions beyond {args.threshold:.0%} against {args.compare}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
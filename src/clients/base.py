@@ -1,7 +1,49 @@
 # clients/base.py
 from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, List, Optional
+
+if TYPE_CHECKING:
+    from src.clients.tools import ToolRegistry
+
+# OpenAI chat roles mapped onto the Cohere-style roles used throughout the bot
+COHERE_ROLES = {"system": "System", "user": "User", "assistant": "Chatbot", "chatbot": "Chatbot"}
+
+
+def normalize_messages(messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """Bring role/message (Cohere) or role/content (OpenAI) dicts into the bot's role/message shape."""
+    return [
+        {"role": COHERE_ROLES.get(msg["role"].lower(), msg["role"]),
+         "message": msg["message"] if "message" in msg else msg.get("content") or ""}
+        for msg in messages
+    ]
 
 class BaseAIClient(ABC):
+    # Name used for per-provider rate limits and metric labels
+    provider = "unknown"
+
     @abstractmethod
     async def generate_response(self, prompt: str) -> str:
         pass
+
+    @abstractmethod
+    async def chat(self, model: str, messages: List[Dict[str, str]], tools: Optional['ToolRegistry'] = None,
+                   max_tokens: Optional[int] = None, temperature: Optional[float] = None) -> Dict[str, Any]:
+        """Complete a conversation given as role/message dicts; returns {'content': ...}.
+
+        With tools, tool calls from the model are executed and answered before the final reply.
+        max_tokens and temperature fall back to the client's defaults when not given.
+        """
+        pass
+
+    async def chat_stream(self, model: str, messages: List[Dict[str, str]], tools: Optional['ToolRegistry'] = None,
+                          max_tokens: Optional[int] = None, temperature: Optional[float] = None) -> AsyncIterator[str]:
+        """Yield the reply in text chunks as they arrive.
+
+        Clients without native streaming yield the complete reply as a single chunk.
+        """
+        response = await self.chat(model, messages, tools=tools, max_tokens=max_tokens, temperature=temperature)
+        yield response["content"]
+
+    async def close(self):
+        """Release any network resources held by the client."""
+        pass
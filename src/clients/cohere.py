@@ -1,81 +1,195 @@
-import cohere
-from src.clients.base import BaseAIClient
+import asyncio
+import logging
+import time
+from src.clients.base import BaseAIClient, normalize_messages
+from src.clients.tools import ToolRegistry, cohere_tool
 from src.core.config import config
-from src.utils.monitor import Monitor
-import json
-from typing import Any, List, Dict
+from src.utils.monitor import LazyJSON, Monitor
+from typing import Any, AsyncIterator, List, Dict, Optional
 
 class CohereAIClient(BaseAIClient):
+    provider = "cohere"
+
     def __init__(self):
         self.monitor = Monitor(__name__)
-        self.client = cohere.Client(config.cohere.api_key)
+        self.timeout = config.get('cohere.timeout', 30.0)
+        self.max_concurrency = config.get('cohere.max_concurrency', 8)
+        # Used when a request doesn't set its own
+        self.max_tokens = config.get('cohere.max_tokens', 150)
+        self.temperature = config.get('cohere.temperature', 0.7)
+        self.http_client = None
+        self._client = None
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.request_latency = self.monitor.histogram(
+            'llm_request_seconds', 'Latency of LLM provider requests', ['provider', 'method', 'outcome'])
+
+    @property
+    def client(self):
+        # cohere and httpx are imported on first use so they stay off the startup path
+        if self._client is None:
+            import cohere
+            import httpx
+            # One pooled HTTP session shared by every request made through this client
+            self.http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency
+                ),
+                timeout=self.timeout
+            )
+            self._client = cohere.AsyncClient(
+                config.cohere.api_key,
+                timeout=self.timeout,
+                httpx_client=self.http_client
+            )
+        return self._client
+
+    async def _call(self, coro):
+        """Run a request against the API, bounded by the in-flight limit and the request timeout."""
+        async with self._semaphore:
+            return await asyncio.wait_for(coro, timeout=self.timeout)
 
-    def format_tools_for_cohere(self, tools):
+    async def close(self):
+        if self.http_client is not None:
+            await self.http_client.aclose()
+
+    def format_tools_for_cohere(self, tools: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Convert OpenAI-style tool definitions; prefer ToolRegistry.schemas('cohere'), which is cached."""
         formatted_tools = []
         for tool in tools:
             function = tool.get('function', {})
             if 'name' not in function:
                 self.monitor.log_warning(f"Skipping tool without name: {tool}")
                 continue
-            
-            formatted_tool = {
-                'name': function['name'],
-                'description': function.get('description', ''),
-                'parameters': function.get('parameters', {})
-            }
-            
-            if 'required' in tool:
-                formatted_tool['parameters']['required'] = tool['required']
-            
-            formatted_tools.append(formatted_tool)
-        
+            formatted_tools.append(cohere_tool(
+                function['name'], function.get('description', ''), function.get('parameters', {}),
+                required=tool.get('required')))
         return formatted_tools
 
     async def generate_response(self, prompt: str) -> str:
         try:
-            response = self.client.generate(
-                model=config.cohere.model,
-                prompt=prompt,
-                max_tokens=150,
-                temperature=0.7
-            )
+            with self.request_latency.time(provider='cohere', method='generate'):
+                response = await self._call(self.client.generate(
+                    model=config.cohere.model,
+                    prompt=prompt,
+                    max_tokens=150,
+                    temperature=0.7
+                ))
             self.monitor.log_info("Generated response successfully")
             return response.generations[0].text
         except Exception as e:
             self.monitor.log_error(f"Error generating response: {e}")
             raise
 
-    async def chat(self, model: str, messages: List[Dict[str, str]]) -> Dict[str, Any]:
-        try:
-            chat_history = []
-            system_message = None
-            for msg in messages:
-                role = msg["role"]
-                if role == "System":
-                    system_message = msg["message"]
-                elif role in ["User", "Chatbot"]:
-                    chat_history.append({"role": role.lower(), "message": msg["message"]})
-            
-            user_message = messages[-1]["message"]
+    def _build_chat_request(self, model: str, messages: List[Dict[str, str]], max_tokens: Optional[int] = None,
+                            temperature: Optional[float] = None) -> Dict[str, Any]:
+        """Split the conversation into Cohere's preamble, chat history and current message."""
+        messages = normalize_messages(messages)
+        chat_history = []
+        system_message = None
+        for msg in messages[:-1]:
+            role = msg["role"]
+            if role == "System":
+                system_message = msg["message"]
+            elif role in ["User", "Chatbot"]:
+                chat_history.append({"role": role.lower(), "message": msg["message"]})
 
-            response = self.client.chat(
-                model=model,
-                message=user_message,
-                chat_history=chat_history,
-                preamble=system_message,
-                temperature=0.7,
-                max_tokens=150
-            )
+        return {
+            "model": model,
+            "message": messages[-1]["message"],
+            "chat_history": chat_history,
+            "preamble": system_message,
+            "temperature": self.temperature if temperature is None else temperature,
+            "max_tokens": self.max_tokens if max_tokens is None else max_tokens
+        }
+
+    async def _run_tools(self, tools: ToolRegistry, tool_calls) -> List[Dict[str, Any]]:
+        """Execute the model's tool calls concurrently and shape the outputs as tool_results."""
+        outputs = await tools.execute([(call.name, call.parameters) for call in tool_calls])
+        return [{"call": call, "outputs": [output]} for call, output in zip(tool_calls, outputs)]
+
+    @staticmethod
+    def _follow_up(request: Dict[str, Any], chat_history, tool_results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        # The returned chat history already holds the user's message and the tool calls
+        return {**request, "message": "", "chat_history": chat_history, "tool_results": tool_results}
+
+    async def chat(self, model: str, messages: List[Dict[str, str]], tools: Optional[ToolRegistry] = None,
+                   max_tokens: Optional[int] = None, temperature: Optional[float] = None) -> Dict[str, Any]:
+        try:
+            request = self._build_chat_request(model, messages, max_tokens, temperature)
+            if tools:
+                request["tools"] = tools.schemas('cohere')
+            with self.request_latency.time(provider='cohere', method='chat'):
+                response = await self._call(self.client.chat(**request))
+            steps = 0
+            while tools and response.tool_calls and steps < tools.max_steps:
+                steps += 1
+                request = self._follow_up(request, response.chat_history, await self._run_tools(tools, response.tool_calls))
+                with self.request_latency.time(provider='cohere', method='chat_tools'):
+                    response = await self._call(self.client.chat(**request))
             self.monitor.log_info("Chat response generated successfully")
-            self.monitor.log_info(f"Raw response: {json.dumps(response.dict(), indent=2)}")
+            if self.monitor.is_enabled_for(logging.DEBUG):
+                self.monitor.log_debug("Raw response: %s", LazyJSON(response.dict(), indent=2))
 
             processed_response = {
                 "content": response.text
             }
 
-            self.monitor.log_info(f"Processed response: {json.dumps(processed_response, indent=2)}")
+            self.monitor.log_debug("Processed response: %s", LazyJSON(processed_response, indent=2))
             return processed_response
         except Exception as e:
             self.monitor.log_error(f"Error in chat method: {str(e)}")
             self.monitor.log_error(f"Error details: {type(e).__name__}: {str(e)}")
             raise
+
+    async def chat_stream(self, model: str, messages: List[Dict[str, str]], tools: Optional[ToolRegistry] = None,
+                          max_tokens: Optional[int] = None, temperature: Optional[float] = None) -> AsyncIterator[str]:
+        try:
+            request = self._build_chat_request(model, messages, max_tokens, temperature)
+            if tools:
+                request["tools"] = tools.schemas('cohere')
+            steps = 0
+            while True:
+                tool_calls = []
+                end = None
+                # Only time spent waiting on Cohere counts; the consumer's time between chunks doesn't
+                provider_seconds = 0.0
+                outcome = 'error'
+                stream = self.client.chat_stream(**request).__aiter__()
+                try:
+                    while True:
+                        # The slot is held per chunk, so a slow consumer doesn't keep other requests waiting
+                        async with self._semaphore:
+                            started = time.perf_counter()
+                            try:
+                                # The timeout bounds the gap between chunks rather than the whole reply
+                                event = await asyncio.wait_for(stream.__anext__(), timeout=self.timeout)
+                            except StopAsyncIteration:
+                                break
+                            finally:
+                                provider_seconds += time.perf_counter() - started
+                        if event.event_type == "text-generation":
+                            yield event.text
+                        elif event.event_type == "tool-calls-generation":
+                            tool_calls = event.tool_calls
+                        elif event.event_type == "stream-end":
+                            end = event.response
+                    outcome = 'ok'
+                except GeneratorExit:
+                    outcome = 'cancelled'
+                    raise
+                finally:
+                    self.request_latency.observe(provider_seconds, provider='cohere',
+                                                 method='chat_stream' if not steps else 'chat_tools', outcome=outcome)
+                    if outcome != 'ok' and hasattr(stream, 'aclose'):
+                        # Abandoned mid-reply; close the HTTP response now instead of at garbage collection
+                        await stream.aclose()
+                if not tools or not tool_calls or end is None or steps >= tools.max_steps:
+                    break
+                steps += 1
+                # Tools run outside the semaphore so they don't hold a request slot
+                request = self._follow_up(request, end.chat_history, await self._run_tools(tools, tool_calls))
+            self.monitor.log_info("Chat stream completed successfully")
+        except Exception as e:
+            self.monitor.log_error(f"Error in chat_stream method: {type(e).__name__}: {str(e)}")
+            raise
@@ -0,0 +1,160 @@
+import asyncio
+import hashlib
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional
+import numpy as np
+import redis.asyncio as redis
+from src.utils.monitor import Monitor
+
+EmbedFunction = Callable[[List[str]], Awaitable[List[List[float]]]]
+
+
+class EmbeddingService:
+    """Micro-batching, deduplicating front end for an embedding API.
+
+    Texts requested by concurrent callers are collected and sent as one request when
+    `max_batch_size` texts are pending or `max_wait` seconds have passed. Identical
+    texts share one pending request. Results are cached by content hash in a bounded
+    in-process LRU and, optionally, in Redis as float32 bytes, so a text is only ever
+    embedded once per cache lifetime.
+    """
+
+    def __init__(self, embed_fn: EmbedFunction, model: str = '', max_batch_size: int = 96,
+                 max_wait: float = 0.02, cache_size: int = 10000,
+                 redis_client: Optional[redis.Redis] = None, redis_ttl: int = 7 * 24 * 3600):
+        self.embed_fn = embed_fn
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.cache_size = cache_size
+        self.redis = redis_client
+        self.redis_ttl = redis_ttl
+        self.monitor = Monitor(__name__)
+        self._cache: 'OrderedDict[str, List[float]]' = OrderedDict()
+        self._queue: Dict[str, str] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._batches: set = set()
+        self.lookups = self.monitor.counter(
+            'embedding_lookups_total', 'Embedding lookups by where they were served from', ['source'])
+        self.batch_size = self.monitor.histogram(
+            'embedding_batch_size', 'Texts sent per embedding request', buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+
+    def _key(self, text: str) -> str:
+        return 'embedding:' + hashlib.sha256(f'{self.model}\0{text}'.encode('utf-8')).hexdigest()
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts, in order, sharing requests and cache with every other caller."""
+        loop = asyncio.get_running_loop()
+        futures = []
+        for text in texts:
+            key = self._key(text)
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.lookups.inc(source='memory')
+                future = loop.create_future()
+                future.set_result(cached)
+            elif key in self._inflight:
+                self.lookups.inc(source='shared')
+                future = self._inflight[key]
+            else:
+                future = self._inflight[key] = loop.create_future()
+                self._queue[key] = text
+            futures.append(future)
+
+        if len(self._queue) >= self.max_batch_size:
+            self._flush()
+        elif self._queue and self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        # Other callers may be waiting on the same futures; cancelling this caller must not cancel them
+        return list(await asyncio.gather(*(asyncio.shield(future) for future in futures)))
+
+    def cache_hit_rate(self) -> float:
+        hits = sum(self.lookups.value(source=source) for source in ('memory', 'shared', 'redis'))
+        total = hits + self.lookups.value(source='api')
+        return hits / total if total else 0.0
+
+    async def close(self):
+        """Send anything still queued and wait for in-progress batches."""
+        self._flush()
+        if self._batches:
+            await asyncio.gather(*self._batches, return_exceptions=True)
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._queue:
+            keys = list(self._queue)[:self.max_batch_size]
+            batch = {key: self._queue.pop(key) for key in keys}
+            task = asyncio.create_task(self._run_batch(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _run_batch(self, batch: Dict[str, str]):
+        keys = list(batch)
+        try:
+            missing = keys
+            if self.redis is not None:
+                missing = await self._resolve_from_redis(keys)
+
+            if missing:
+                self.batch_size.observe(len(missing))
+                self.lookups.inc(len(missing), source='api')
+                vectors = await self.embed_fn([batch[key] for key in missing])
+                if len(vectors) != len(missing):
+                    # Can't tell which text a vector belongs to; fail the batch rather than leave callers waiting
+                    raise ValueError(f"Embedding API returned {len(vectors)} vectors for {len(missing)} texts")
+                for key, vector in zip(missing, vectors):
+                    self._remember(key, vector)
+                    self._resolve(key, vector)
+                if self.redis is not None:
+                    await self._store_in_redis(missing, vectors)
+        except Exception as e:
+            self.monitor.log_error(f"Error embedding batch of {len(keys)} texts: {e}")
+            for key in keys:
+                future = self._inflight.get(key)
+                if future is not None and not future.done():
+                    future.set_exception(e)
+        finally:
+            for key in keys:
+                self._inflight.pop(key, None)
+
+    async def _resolve_from_redis(self, keys: List[str]) -> List[str]:
+        """Resolve keys found in Redis and return the ones that still need embedding."""
+        try:
+            values = await self.redis.mget(keys)
+        except Exception as e:
+            self.monitor.log_error(f"Error reading embedding cache: {e}")
+            return keys
+        missing = []
+        for key, value in zip(keys, values):
+            if value is None:
+                missing.append(key)
+                continue
+            vector = np.frombuffer(value, dtype=np.float32).tolist()
+            self.lookups.inc(source='redis')
+            self._remember(key, vector)
+            self._resolve(key, vector)
+        return missing
+
+    async def _store_in_redis(self, keys: List[str], vectors: List[List[float]]):
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key, vector in zip(keys, vectors):
+                    pipe.set(key, np.asarray(vector, dtype=np.float32).tobytes(), ex=self.redis_ttl)
+                await pipe.execute()
+        except Exception as e:
+            self.monitor.log_error(f"Error writing embedding cache: {e}")
+
+    def _resolve(self, key: str, vector: List[float]):
+        future = self._inflight.get(key)
+        if future is not None and not future.done():
+            future.set_result(vector)
+
+    def _remember(self, key: str, vector: List[float]):
+        self._cache[key] = vector
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
@@ -1,67 +1,221 @@
-from typing import List, Any
-import openai
+import json
+import time
+from typing import List, Any, AsyncIterator, Dict, Optional, Tuple
 from .base import BaseAIClient
+from .tools import ToolRegistry
 from src.core.config import Config
 from src.utils.monitor import Monitor
 
+# Cohere-style roles used throughout the bot mapped onto OpenAI chat roles
+ROLE_MAP = {"System": "system", "User": "user", "Chatbot": "assistant"}
+
 class OpenAIClient(BaseAIClient):
+    provider = "openai"
+
     def __init__(self):
         self.config = Config()
         self.monitor = Monitor(__name__)
-        openai.api_key = self.config.openai.api_key
+        self._client = None
+        self.request_latency = self.monitor.histogram(
+            'llm_request_seconds', 'Latency of LLM provider requests', ['provider', 'method', 'outcome'])
         self.monitor.log_info("OpenAIClient initialized")
 
+    @property
+    def client(self):
+        # The SDK takes most of a second to import; defer it until the first request
+        if self._client is None:
+            import openai
+            self._client = openai.AsyncOpenAI(api_key=self.config.openai.api_key)
+        return self._client
+
+    def _to_openai_messages(self, messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        return [
+            {"role": ROLE_MAP.get(msg["role"], msg["role"].lower()), "content": msg.get("message", msg.get("content", ""))}
+            for msg in messages
+        ]
+
     async def generate_response(self, prompt: str) -> str:
         try:
-            response = await openai.ChatCompletion.create(
-                model=self.config.openai.model,
-                messages=[{"role": "user", "content": prompt}]
-            )
+            with self.request_latency.time(provider='openai', method='generate'):
+                response = await self.client.chat.completions.create(
+                    model=self.config.openai.model,
+                    messages=[{"role": "user", "content": prompt}]
+                )
             self.monitor.log_info("Generated response successfully")
-            return response['choices'][0]['message']['content']
+            return response.choices[0].message.content
         except Exception as e:
             self.monitor.log_error(e)
             raise
 
+    @staticmethod
+    def _options(tools: Optional[ToolRegistry], max_tokens: Optional[int],
+                 temperature: Optional[float]) -> Dict[str, Any]:
+        """Optional request parameters; unset ones are left to the API defaults."""
+        options: Dict[str, Any] = {"tools": tools.schemas('openai')} if tools else {}
+        if max_tokens is not None:
+            options["max_tokens"] = max_tokens
+        if temperature is not None:
+            options["temperature"] = temperature
+        return options
+
+    async def _tool_messages(self, tools: ToolRegistry, tool_calls: List[Tuple[str, str, str]],
+                             content: Optional[str]) -> List[Dict[str, Any]]:
+        """Run (id, name, arguments) tool calls concurrently; returns the assistant turn plus one tool message each."""
+        outputs = await tools.execute([(name, arguments) for _, name, arguments in tool_calls])
+        assistant = {"role": "assistant", "content": content or None, "tool_calls": [
+            {"id": call_id, "type": "function", "function": {"name": name, "arguments": arguments}}
+            for call_id, name, arguments in tool_calls
+        ]}
+        return [assistant] + [
+            {"role": "tool", "tool_call_id": call_id, "content": json.dumps(output, default=str)}
+            for (call_id, _, _), output in zip(tool_calls, outputs)
+        ]
+
+    async def chat(self, model: str, messages: List[Dict[str, str]], tools: Optional[ToolRegistry] = None,
+                   max_tokens: Optional[int] = None, temperature: Optional[float] = None) -> Dict[str, Any]:
+        try:
+            openai_messages = self._to_openai_messages(messages)
+            options = self._options(tools, max_tokens, temperature)
+            with self.request_latency.time(provider='openai', method='chat'):
+                response = await self.client.chat.completions.create(
+                    model=model,
+                    messages=openai_messages,
+                    **options
+                )
+            message = response.choices[0].message
+            steps = 0
+            while tools and message.tool_calls and steps < tools.max_steps:
+                steps += 1
+                openai_messages += await self._tool_messages(
+                    tools, [(call.id, call.function.name, call.function.arguments) for call in message.tool_calls],
+                    message.content)
+                with self.request_latency.time(provider='openai', method='chat_tools'):
+                    response = await self.client.chat.completions.create(
+                        model=model,
+                        messages=openai_messages,
+                        **options
+                    )
+                message = response.choices[0].message
+            self.monitor.log_info("Chat response generated successfully")
+            return {"content": message.content or ""}
+        except Exception as e:
+            self.monitor.log_error(f"Error in chat method: {type(e).__name__}: {str(e)}")
+            raise
+
+    async def chat_stream(self, model: str, messages: List[Dict[str, str]], tools: Optional[ToolRegistry] = None,
+                          max_tokens: Optional[int] = None, temperature: Optional[float] = None) -> AsyncIterator[str]:
+        try:
+            openai_messages = self._to_openai_messages(messages)
+            options = self._options(tools, max_tokens, temperature)
+            steps = 0
+            while True:
+                content = []
+                # Tool calls arrive in fragments keyed by index: id and name first, then pieces of arguments
+                tool_calls: Dict[int, List[str]] = {}
+                # Only time spent waiting on OpenAI counts; the consumer's time between chunks doesn't
+                started = time.perf_counter()
+                provider_seconds = 0.0
+                outcome = 'error'
+                stream = None
+                try:
+                    stream = await self.client.chat.completions.create(
+                        model=model,
+                        messages=openai_messages,
+                        stream=True,
+                        **options
+                    )
+                    chunks = stream.__aiter__()
+                    while True:
+                        try:
+                            chunk = await chunks.__anext__()
+                        except StopAsyncIteration:
+                            break
+                        finally:
+                            provider_seconds += time.perf_counter() - started
+                        if chunk.choices:
+                            delta = chunk.choices[0].delta
+                            if delta.content:
+                                content.append(delta.content)
+                                yield delta.content
+                            for fragment in delta.tool_calls or ():
+                                call = tool_calls.setdefault(fragment.index, ["", "", ""])
+                                call[0] = fragment.id or call[0]
+                                if fragment.function is not None:
+                                    call[1] += fragment.function.name or ""
+                                    call[2] += fragment.function.arguments or ""
+                        started = time.perf_counter()
+                    outcome = 'ok'
+                except GeneratorExit:
+                    outcome = 'cancelled'
+                    raise
+                finally:
+                    if stream is None:
+                        provider_seconds = time.perf_counter() - started
+                    self.request_latency.observe(provider_seconds, provider='openai',
+                                                 method='chat_stream' if not steps else 'chat_tools', outcome=outcome)
+                    if outcome != 'ok' and stream is not None:
+                        # Abandoned mid-reply; close the HTTP response now instead of at garbage collection
+                        await stream.close()
+                if not tools or not tool_calls or steps >= tools.max_steps:
+                    break
+                steps += 1
+                openai_messages += await self._tool_messages(
+                    tools, [tuple(tool_calls[index]) for index in sorted(tool_calls)], "".join(content))
+            self.monitor.log_info("Chat stream completed successfully")
+        except Exception as e:
+            self.monitor.log_error(f"Error in chat_stream method: {type(e).__name__}: {str(e)}")
+            raise
+
     async def embed_texts(self, texts: List[str]) -> List[List[float]]:
         try:
-            response = await openai.Embedding.create(
-                model=self.config.openai.embedding_model,
-                input=texts
-            )
+            with self.request_latency.time(provider='openai', method='embed'):
+                response = await self.client.embeddings.create(
+                    model=self.config.openai.embedding_model,
+                    input=texts
+                )
             self.monitor.log_info(f"Embedded {len(texts)} texts successfully")
-            return [embedding['embedding'] for embedding in response['data']]
+            return [embedding.embedding for embedding in response.data]
         except Exception as e:
             self.monitor.log_error(e)
             raise
 
     async def generate_image(self, prompt: str) -> str:
         try:
-            response = await openai.Image.create(
+            response = await self.client.images.generate(
                 prompt=prompt,
                 n=1,
                 size="1024x1024"
             )
             self.monitor.log_info("Generated image successfully")
-            return response['data'][0]['url']
+            return response.data[0].url
         except Exception as e:
             self.monitor.log_error(e)
             raise
 
     async def analyze_image(self, image_url: str) -> Any:
         try:
-            response = await openai.Image.create(
-                url=image_url,
-                model="vision-model"
+            response = await self.client.chat.completions.create(
+                model=self.config.openai.model,
+                messages=[{
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": "Describe this image."},
+                        {"type": "image_url", "image_url": {"url": image_url}}
+                    ]
+                }]
             )
             self.monitor.log_info("Analyzed image successfully")
-            return response['data']
+            return response.choices[0].message.content
         except Exception as e:
             self.monitor.log_error(e)
             raise
 
+    async def close(self):
+        if self._client is not None:
+            await self._client.close()
+
 # Example usage
-# openai_client = OpenAIClient(api_key='your_api_key')
+# openai_client = OpenAIClient()
 # response = await openai_client.generate_response("What is AI?")
 # embeddings = await openai_client.embed_texts(["Hello", "World"])
 # image_url = await openai_client.generate_image("A beautiful sunset")
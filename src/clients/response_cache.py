@@ -0,0 +1,95 @@
+import hashlib
+import json
+import re
+import time
+from typing import Dict, Iterable, List, Optional
+import redis.asyncio as redis
+from src.utils.monitor import Monitor
+
+_WHITESPACE = re.compile(r'\s+')
+_TRAILING_PUNCTUATION = re.compile(r'[\s?!.,;:]+$')
+
+
+class ResponseCache:
+    """Redis-backed cache of completions for repeated prompts.
+
+    Entries are keyed by a hash of the model, system prompt, the last few history
+    turns and the normalized current message. Every entry expires after `ttl`
+    seconds, and an index sorted set keeps the cache to `max_entries`, evicting the
+    oldest entries first.
+    """
+
+    INDEX_KEY = 'llm_cache:index'
+
+    def __init__(self, redis_client: redis.Redis, ttl: int = 3600, max_entries: int = 10000,
+                 history_turns: int = 2, disabled_guilds: Iterable[int] = ()):
+        self.redis = redis_client
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.history_turns = history_turns
+        self.disabled_guilds = {int(guild_id) for guild_id in disabled_guilds}
+        self.monitor = Monitor(__name__)
+        self.requests = self.monitor.counter('llm_cache_requests_total', 'Response cache lookups', ['result'])
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        text = _WHITESPACE.sub(' ', text.strip().lower())
+        return _TRAILING_PUNCTUATION.sub('', text)
+
+    def enabled_for(self, guild_id: Optional[int]) -> bool:
+        """Only guild traffic is cached, and guilds can opt out."""
+        return guild_id is not None and guild_id not in self.disabled_guilds
+
+    def make_key(self, model: str, conversation_history: List[Dict[str, str]]) -> str:
+        """Hash model, system prompt, trimmed history and the current message (the last entry)."""
+        system_prompt = ''
+        turns = []
+        for msg in conversation_history[:-1]:
+            if msg['role'] == 'System':
+                system_prompt = msg['message']
+            else:
+                turns.append([msg['role'], self.normalize(msg['message'])])
+        trimmed = turns[-2 * self.history_turns:] if self.history_turns > 0 else []
+        payload = json.dumps(
+            [model, system_prompt, trimmed, self.normalize(conversation_history[-1]['message'])],
+            separators=(',', ':')
+        )
+        return f"llm_cache:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+    async def get(self, key: str) -> Optional[str]:
+        try:
+            value = await self.redis.get(key)
+        except Exception as e:
+            self.monitor.log_error(f"Error reading response cache: {e}")
+            value = None
+        self.requests.inc(result='hit' if value is not None else 'miss')
+        return value.decode('utf-8') if value is not None else None
+
+    async def set(self, key: str, content: str):
+        if not content:
+            return
+        try:
+            now = time.time()
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.set(key, content, ex=self.ttl)
+                pipe.zadd(self.INDEX_KEY, {key: now})
+                # Index entries older than the TTL point at keys Redis has already expired
+                pipe.zremrangebyscore(self.INDEX_KEY, '-inf', now - self.ttl)
+                pipe.zcard(self.INDEX_KEY)
+                results = await pipe.execute()
+
+            overflow = results[-1] - self.max_entries
+            if overflow > 0:
+                oldest = await self.redis.zrange(self.INDEX_KEY, 0, overflow - 1)
+                if oldest:
+                    async with self.redis.pipeline(transaction=True) as pipe:
+                        pipe.delete(*oldest)
+                        pipe.zrem(self.INDEX_KEY, *oldest)
+                        await pipe.execute()
+        except Exception as e:
+            self.monitor.log_error(f"Error writing response cache: {e}")
+
+    def hit_rate(self) -> float:
+        hits = self.requests.value(result='hit')
+        total = hits + self.requests.value(result='miss')
+        return hits / total if total else 0.0
@@ -0,0 +1,353 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import AsyncExitStack
+from typing import TYPE_CHECKING, Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+from src.clients.base import BaseAIClient, normalize_messages
+from src.clients.scheduler import SchedulerBusy, provider_slot
+from src.utils.monitor import Monitor
+
+if TYPE_CHECKING:
+    from src.clients.tools import ToolRegistry
+
+METHODS = ('chat', 'stream')
+
+
+class RollingStats:
+    """Latencies of the last `window` successful requests and outcomes of the last `window` requests."""
+
+    def __init__(self, window: int = 100):
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.outcomes: Deque[bool] = deque(maxlen=window)
+
+    def record(self, ok: bool, latency: Optional[float] = None):
+        self.outcomes.append(ok)
+        if ok and latency is not None:
+            self.latencies.append(latency)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    @property
+    def error_rate(self) -> float:
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+
+class CircuitBreaker:
+    """Stop sending requests to a provider after `failure_threshold` failures in a row.
+
+    Once open, the breaker lets a single trial request through after
+    `reset_timeout` seconds (half-open); it closes again if that succeeds and
+    reopens if it fails.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_running = False
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def available(self) -> bool:
+        if self.opened_at is None:
+            return True
+        return not self._trial_running and time.monotonic() - self.opened_at >= self.reset_timeout
+
+    def acquire(self):
+        """Called when a request is sent; marks the half-open trial as running."""
+        if self.opened_at is not None:
+            self._trial_running = True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    def record_failure(self) -> bool:
+        """Count a failure; returns True if this opened (or reopened) the breaker."""
+        self.failures += 1
+        self._trial_running = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            return True
+        return False
+
+    def release(self):
+        """Called when a request was abandoned without an outcome (e.g. it lost a hedge race)."""
+        self._trial_running = False
+
+
+class Route:
+    def __init__(self, name: str, client: BaseAIClient, model: Optional[str], window: int,
+                 failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.client = client
+        self.model = model
+        self.stats = {method: RollingStats(window) for method in METHODS}
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+
+
+class RoutingAIClient(BaseAIClient):
+    """Spread requests over several providers, preferring the fastest healthy one.
+
+    Each provider's recent latencies (full reply for chat, first chunk for
+    streams) and error rate are tracked over a rolling window. Requests go to the
+    provider with the lowest median latency, inflated by its error rate; providers
+    whose circuit breaker is open are skipped. If the chosen provider has not
+    answered after its own p95 latency (once it has `min_samples` of history), a
+    hedged request is sent to the next provider and whichever answers first wins.
+    A provider that fails before producing any output is replaced by the next one.
+    A provider with `<name>.model` configured always uses that model; the model
+    passed by the caller only applies to providers without one.
+
+    Under LLMScheduler.request, each provider call (including hedges and
+    failovers) takes its own scheduler slot charged to that provider; a
+    streamed reply keeps its slot until the stream is closed.
+    """
+
+    schedules_itself = True
+
+    def __init__(self, routes: List[Route], hedge: bool = True, hedge_quantile: float = 0.95,
+                 hedge_min_delay: float = 0.5, min_samples: int = 20, error_penalty: float = 4.0):
+        if not routes:
+            raise ValueError("RoutingAIClient needs at least one provider")
+        self.routes = routes
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_delay = hedge_min_delay
+        self.min_samples = min_samples
+        self.error_penalty = error_penalty
+        self.monitor = Monitor(__name__)
+        self.requests = self.monitor.counter(
+            'llm_router_requests_total', 'Requests sent by the router', ['provider', 'method', 'outcome'])
+        self.hedges = self.monitor.counter(
+            'llm_router_hedges_total', 'Hedged requests sent because the first provider was slow', ['method'])
+        self.failovers = self.monitor.counter(
+            'llm_router_failovers_total', 'Requests retried on another provider after a failure', ['method'])
+        self.breaker_open = self.monitor.gauge(
+            'llm_router_breaker_open', 'Whether a provider\'s circuit breaker is open', ['provider'])
+        self.monitor.log_info(f"RoutingAIClient initialized with providers: {', '.join(route.name for route in routes)}")
+
+    @classmethod
+    def from_config(cls, config) -> 'RoutingAIClient':
+        from src.clients.cohere import CohereAIClient
+        from src.clients.openai import OpenAIClient
+        factories = {'cohere': CohereAIClient, 'openai': OpenAIClient}
+
+        window = config.get('router.window', 100)
+        failure_threshold = config.get('router.failure_threshold', 5)
+        reset_timeout = config.get('router.reset_timeout', 30.0)
+        routes = []
+        for name in config.get('router.providers', ['cohere', 'openai']):
+            if name not in factories:
+                raise ValueError(f"Unknown router provider: {name}")
+            routes.append(Route(name, factories[name](), config.get(f'{name}.model'),
+                                window, failure_threshold, reset_timeout))
+        return cls(
+            routes,
+            hedge=config.get('router.hedge', True),
+            hedge_quantile=config.get('router.hedge_quantile', 0.95),
+            hedge_min_delay=config.get('router.hedge_min_delay', 0.5),
+            min_samples=config.get('router.min_samples', 20),
+            error_penalty=config.get('router.error_penalty', 4.0)
+        )
+
+    @property
+    def provider(self) -> str:
+        """The provider the next chat request would most likely go to."""
+        return self.ranked('stream')[0].name
+
+    def _score(self, route: Route, method: str) -> float:
+        stats = route.stats[method]
+        median = stats.quantile(0.5)
+        if median is None:
+            # No successful requests yet: keep trying it so it gets measured (or its breaker opens)
+            return 0.0
+        return median * (1 + self.error_penalty * stats.error_rate)
+
+    def ranked(self, method: str) -> List[Route]:
+        """Providers to try, best first; configuration order breaks ties.
+
+        A provider whose breaker is half-open goes first, so its trial request happens.
+        """
+        available = [route for route in self.routes if route.breaker.available()]
+        if not available:
+            # Everything is failing; rather than refusing outright, try whichever opened longest ago
+            return sorted(self.routes, key=lambda route: route.breaker.opened_at)
+        return sorted(available, key=lambda route: (not route.breaker.is_open, self._score(route, method)))
+
+    def _hedge_delay(self, route: Route, method: str) -> Optional[float]:
+        stats = route.stats[method]
+        if not self.hedge or len(stats.latencies) < self.min_samples:
+            return None
+        return max(self.hedge_min_delay, stats.quantile(self.hedge_quantile))
+
+    def _record(self, route: Route, method: str, ok: bool, latency: Optional[float] = None):
+        if ok and route.breaker.is_open:
+            # Recovered; don't let errors from before the outage keep it ranked down
+            for stats in route.stats.values():
+                stats.outcomes.clear()
+            self.monitor.log_info(f"Circuit breaker for {route.name} closed")
+        route.stats[method].record(ok, latency)
+        self.requests.inc(provider=route.name, method=method, outcome='ok' if ok else 'error')
+        if ok:
+            route.breaker.record_success()
+        elif route.breaker.record_failure():
+            self.monitor.log_warning(f"Circuit breaker for {route.name} opened after {route.breaker.failures} failure(s)")
+        self.breaker_open.set(int(route.breaker.is_open), provider=route.name)
+
+    async def _attempt(self, route: Route, method: str, request: Callable[[Route], Awaitable[Any]],
+                       hold: bool = False) -> Any:
+        """Run request on route inside a scheduler slot for that provider.
+
+        With hold, returns (result, slot) and the slot stays taken until the caller closes it.
+        """
+        slot = AsyncExitStack()
+        # Waiting for the slot is not the provider's latency, and being shed is not its failure
+        await slot.enter_async_context(provider_slot(route.name))
+        route.breaker.acquire()
+        started = time.perf_counter()
+        try:
+            result = await request(route)
+        except asyncio.CancelledError:
+            await slot.aclose()
+            route.breaker.release()
+            self.requests.inc(provider=route.name, method=method, outcome='cancelled')
+            raise
+        except Exception as e:
+            await slot.aclose()
+            self.monitor.log_error(f"{route.name} {method} request failed: {type(e).__name__}: {str(e)}")
+            self._record(route, method, False)
+            raise
+        self._record(route, method, True, time.perf_counter() - started)
+        if hold:
+            return result, slot
+        await slot.aclose()
+        return result
+
+    async def _race(self, method: str, request: Callable[[Route], Awaitable[Any]],
+                    discard: Optional[Callable[[Any], Awaitable[None]]] = None,
+                    hedge: bool = True, hold: bool = False) -> Tuple[Route, Any]:
+        """Run request on the best provider, hedging and failing over as needed; first success wins.
+
+        discard cleans up the result of every request that succeeded besides the winner.
+        Requests that may run tools pass hedge=False so no tool runs twice at once. With hold,
+        results are (result, slot) as returned by _attempt.
+        """
+        candidates = self.ranked(method)
+        running: Dict[asyncio.Task, Route] = {}
+        last_error: Optional[BaseException] = None
+
+        def launch() -> Optional[float]:
+            route = candidates.pop(0)
+            running[asyncio.ensure_future(self._attempt(route, method, request, hold))] = route
+            return self._hedge_delay(route, method) if candidates and hedge else None
+
+        async def release(result: Any):
+            if discard is not None:
+                await discard(result)
+            elif hold:
+                await result[1].aclose()
+
+        hedge_after = launch()
+        try:
+            while running:
+                done, _ = await asyncio.wait(running, timeout=hedge_after, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    self.hedges.inc(method=method)
+                    self.monitor.log_info(f"No {method} reply after {hedge_after:.2f}s; hedging with {candidates[0].name}")
+                    hedge_after = launch()
+                    continue
+                winner = None
+                for task in done:
+                    route = running.pop(task)
+                    if task.exception() is not None:
+                        last_error = task.exception()
+                    elif winner is None:
+                        winner = route, task.result()
+                    else:
+                        await release(task.result())
+                if winner is not None:
+                    return winner
+                if isinstance(last_error, SchedulerBusy) and not running:
+                    # Shed by the scheduler; other providers would only add to the backlog
+                    raise last_error
+                if not running and candidates:
+                    self.failovers.inc(method=method)
+                    hedge_after = launch()
+            raise last_error
+        finally:
+            for task in running:
+                task.cancel()
+            # A request can finish before its cancel lands (e.g. while a discard above was awaited);
+            # wait for all of them so no result or slot is left behind
+            for result in await asyncio.gather(*running, return_exceptions=True):
+                if not isinstance(result, BaseException):
+                    await release(result)
+
+    async def generate_response(self, prompt: str) -> str:
+        _, response = await self._race('chat', lambda route: route.client.generate_response(prompt))
+        return response
+
+    async def chat(self, model: str, messages: List[Dict[str, str]], tools: Optional['ToolRegistry'] = None,
+                   max_tokens: Optional[int] = None, temperature: Optional[float] = None) -> Dict[str, Any]:
+        messages = normalize_messages(messages)
+        route, response = await self._race(
+            'chat', lambda route: route.client.chat(model=route.model or model, messages=messages, tools=tools,
+                                                    max_tokens=max_tokens, temperature=temperature),
+            hedge=not tools)
+        self.monitor.log_debug("Chat answered by %s", route.name)
+        return response
+
+    async def chat_stream(self, model: str, messages: List[Dict[str, str]], tools: Optional['ToolRegistry'] = None,
+                          max_tokens: Optional[int] = None, temperature: Optional[float] = None) -> AsyncIterator[str]:
+        messages = normalize_messages(messages)
+
+        async def first_chunk(route: Route) -> Tuple[AsyncIterator[str], str]:
+            # The race is decided by the first non-empty chunk; the rest is streamed from the winner
+            stream = route.client.chat_stream(model=route.model or model, messages=messages, tools=tools,
+                                              max_tokens=max_tokens, temperature=temperature)
+            try:
+                async for chunk in stream:
+                    if chunk:
+                        return stream, chunk
+                return stream, ""
+            except BaseException:
+                await stream.aclose()
+                raise
+
+        async def discard(result: Tuple[Tuple[AsyncIterator[str], str], AsyncExitStack]):
+            (stream, _), slot = result
+            try:
+                await stream.aclose()
+            finally:
+                await slot.aclose()
+
+        route, ((stream, chunk), slot) = await self._race(
+            'stream', first_chunk, discard=discard, hedge=not tools, hold=True)
+        try:
+            if chunk:
+                yield chunk
+            async for chunk in stream:
+                yield chunk
+        except Exception as e:
+            # Too late to switch providers once text has been shown; count it against this one
+            self.monitor.log_error(f"{route.name} stream failed mid-reply: {type(e).__name__}: {str(e)}")
+            self._record(route, 'stream', False)
+            raise
+        finally:
+            try:
+                await stream.aclose()
+            finally:
+                await slot.aclose()
+
+    async def close(self):
+        for route in self.routes:
+            await route.client.close()
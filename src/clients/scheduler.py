@@ -0,0 +1,221 @@
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager, nullcontext
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, AsyncContextManager, Dict, List, Optional, Tuple
+from src.utils.monitor import Monitor
+
+if TYPE_CHECKING:
+    from src.clients.base import BaseAIClient
+
+PRIORITY_HIGH = 0  # DMs and direct replies to the bot
+PRIORITY_NORMAL = 1  # Guild mentions
+PRIORITY_LOW = 2  # Background work such as summarization
+PRIORITY_NAMES = {PRIORITY_HIGH: 'high', PRIORITY_NORMAL: 'normal', PRIORITY_LOW: 'low'}
+
+# (scheduler, priority, tokens) of the request being made, for clients that take a slot per provider call
+_admission: ContextVar[Optional[Tuple['LLMScheduler', int, int]]] = ContextVar('llm_admission', default=None)
+
+
+class SchedulerBusy(Exception):
+    """Raised when a request is shed because it would wait longer than the queue SLA."""
+
+
+class TokenBucket:
+    """Refilling budget expressed per minute (requests or tokens)."""
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self.tokens = self.capacity
+        self._last = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def delay_for(self, amount: float) -> float:
+        """Seconds until `amount` can be consumed (0 if available now)."""
+        self._refill()
+        # A request larger than the whole bucket waits for a full bucket rather than forever
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+
+class LLMScheduler:
+    """Admission control in front of the LLM clients.
+
+    Requests wait in a priority queue for one of `max_concurrency` slots, subject to
+    per-provider requests/min and tokens/min buckets. A request whose expected wait
+    exceeds `max_queue_wait` is rejected up front with SchedulerBusy, and one that
+    actually waits that long is rejected when the deadline passes.
+    """
+
+    def __init__(self, max_concurrency: int = 8, max_queue_wait: float = 10.0,
+                 limits: Optional[Dict[str, Tuple[Optional[float], Optional[float]]]] = None):
+        self.max_concurrency = max_concurrency
+        self.max_queue_wait = max_queue_wait
+        self.monitor = Monitor(__name__)
+        self._request_buckets: Dict[str, TokenBucket] = {}
+        self._token_buckets: Dict[str, TokenBucket] = {}
+        for provider, (requests_per_minute, tokens_per_minute) in (limits or {}).items():
+            if requests_per_minute:
+                self._request_buckets[provider] = TokenBucket(requests_per_minute)
+            if tokens_per_minute:
+                self._token_buckets[provider] = TokenBucket(tokens_per_minute)
+
+        self._queue: List[tuple] = []
+        self._sequence = itertools.count()
+        self._in_flight = 0
+        self._retry_handle: Optional[asyncio.TimerHandle] = None
+        # Exponentially weighted mean of how long a slot is held, used for wait estimates
+        self._avg_service_time = 0.0
+
+        self.queue_depth = self.monitor.gauge('llm_scheduler_queue_depth', 'Requests waiting for an LLM slot')
+        self.in_flight = self.monitor.gauge('llm_scheduler_in_flight', 'LLM requests currently running')
+        self.wait_time = self.monitor.histogram(
+            'llm_scheduler_wait_seconds', 'Time spent queued before an LLM slot was granted', ['provider', 'priority'])
+        self.shed = self.monitor.counter(
+            'llm_scheduler_shed_total', 'Requests rejected because the queue wait exceeded the SLA', ['provider', 'priority'])
+
+    @classmethod
+    def from_config(cls, config) -> 'LLMScheduler':
+        limits = {}
+        providers = config.get('scheduler.providers')
+        for provider, settings in (vars(providers).items() if providers is not None else []):
+            limits[provider] = (getattr(settings, 'requests_per_minute', None), getattr(settings, 'tokens_per_minute', None))
+        return cls(
+            max_concurrency=config.get('scheduler.max_concurrency', 8),
+            max_queue_wait=config.get('scheduler.max_queue_wait', 10.0),
+            limits=limits
+        )
+
+    def estimated_wait(self, provider: str, priority: int, tokens: int = 0) -> float:
+        """Rough wait for a new request: slots ahead of it plus any rate-limit delay."""
+        ahead = sum(1 for entry in self._queue if entry[0] <= priority and not entry[3].done())
+        slots_wait = 0.0
+        if self._in_flight + ahead >= self.max_concurrency:
+            slots_wait = (ahead + 1) / self.max_concurrency * self._avg_service_time
+        return max(slots_wait, self._rate_delay(provider, tokens))
+
+    @asynccontextmanager
+    async def request(self, client: 'BaseAIClient', priority: int = PRIORITY_NORMAL, tokens: int = 0):
+        """Admit one request to client for the duration of the block.
+
+        Most clients call a single provider, so this holds one slot charged to
+        client.provider. Clients with `schedules_itself` set may call several
+        providers for one request; they take a slot for each call they make
+        through provider_slot, so every provider is charged for what it serves.
+        """
+        if getattr(client, 'schedules_itself', False):
+            token = _admission.set((self, priority, tokens))
+            try:
+                yield
+            finally:
+                _admission.reset(token)
+        else:
+            async with self.slot(client.provider, priority, tokens):
+                yield
+
+    @asynccontextmanager
+    async def slot(self, provider: str, priority: int = PRIORITY_NORMAL, tokens: int = 0):
+        """Hold one LLM slot for the duration of the block."""
+        labels = {'provider': provider, 'priority': PRIORITY_NAMES.get(priority, 'normal')}
+        if self.estimated_wait(provider, priority, tokens) > self.max_queue_wait:
+            self.shed.inc(**labels)
+            raise SchedulerBusy(f"{provider} queue wait exceeds {self.max_queue_wait}s")
+
+        enqueued = time.monotonic()
+        granted = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._sequence), provider, granted, tokens))
+        self.queue_depth.set(len(self._queue))
+        self._dispatch()
+        try:
+            await asyncio.wait_for(granted, timeout=self.max_queue_wait)
+        except BaseException as e:
+            if granted.done() and not granted.cancelled():
+                # The slot was granted just as we gave up on it; hand it back
+                self._in_flight -= 1
+            self._dispatch()
+            if isinstance(e, asyncio.TimeoutError):
+                self.shed.inc(**labels)
+                raise SchedulerBusy(f"{provider} request waited longer than {self.max_queue_wait}s") from None
+            raise
+
+        started = time.monotonic()
+        self.wait_time.observe(started - enqueued, **labels)
+        try:
+            yield
+        finally:
+            self._in_flight -= 1
+            self.in_flight.set(self._in_flight)
+            self._avg_service_time = 0.8 * self._avg_service_time + 0.2 * (time.monotonic() - started)
+            self._dispatch()
+
+    def _rate_delay(self, provider: str, tokens: int) -> float:
+        delay = 0.0
+        if provider in self._request_buckets:
+            delay = self._request_buckets[provider].delay_for(1)
+        if provider in self._token_buckets and tokens:
+            delay = max(delay, self._token_buckets[provider].delay_for(tokens))
+        return delay
+
+    def _dispatch(self):
+        """Grant slots to queued requests in priority order while capacity and rate budgets allow.
+
+        Requests for a provider that is out of budget are passed over, so they don't
+        hold up requests for other providers; within a provider, order is kept.
+        """
+        # Provider -> seconds until its first waiting request fits its budget
+        limited: Dict[str, float] = {}
+        passed_over = []
+        while self._queue and self._in_flight < self.max_concurrency:
+            entry = heapq.heappop(self._queue)
+            priority, _, provider, granted, tokens = entry
+            if granted.done():
+                # Timed out or cancelled while queued
+                continue
+            if provider in limited:
+                passed_over.append(entry)
+                continue
+            delay = self._rate_delay(provider, tokens)
+            if delay > 0:
+                limited[provider] = delay
+                passed_over.append(entry)
+                continue
+            if provider in self._request_buckets:
+                self._request_buckets[provider].consume(1)
+            if provider in self._token_buckets and tokens:
+                self._token_buckets[provider].consume(tokens)
+            self._in_flight += 1
+            granted.set_result(None)
+        for entry in passed_over:
+            heapq.heappush(self._queue, entry)
+        if limited:
+            if self._retry_handle is not None:
+                self._retry_handle.cancel()
+            self._retry_handle = asyncio.get_running_loop().call_later(min(limited.values()), self._retry_dispatch)
+        self.queue_depth.set(len(self._queue))
+        self.in_flight.set(self._in_flight)
+
+    def _retry_dispatch(self):
+        self._retry_handle = None
+        self._dispatch()
+
+
+def provider_slot(provider: str) -> AsyncContextManager:
+    """Slot for one provider call made inside LLMScheduler.request; does nothing outside one."""
+    admission = _admission.get()
+    if admission is None:
+        return nullcontext()
+    scheduler, priority, tokens = admission
+    return scheduler.slot(provider, priority, tokens)
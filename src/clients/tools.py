@@ -0,0 +1,151 @@
+import asyncio
+import copy
+import inspect
+import json
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple, Union
+from src.core.config import Config, config
+from src.utils.monitor import Monitor
+
+# Takes the model's arguments as keyword arguments; sync handlers run in a worker thread
+ToolHandler = Callable[..., Union[Any, Awaitable[Any]]]
+
+# JSON schema types mapped onto the Python type names Cohere's parameter_definitions use
+COHERE_TYPES = {'string': 'str', 'integer': 'int', 'number': 'float', 'boolean': 'bool', 'array': 'list', 'object': 'dict'}
+
+TOOL_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def cohere_tool(name: str, description: str, parameters: Dict[str, Any],
+                required: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+    """Cohere (v1) tool definition for a function described by a JSON schema object; parameters is not modified."""
+    required = set(parameters.get('required', ()) if required is None else required)
+    definitions = {}
+    for param, schema in parameters.get('properties', {}).items():
+        kind = COHERE_TYPES.get(schema.get('type'), 'str')
+        item_kind = COHERE_TYPES.get((schema.get('items') or {}).get('type'))
+        if kind == 'list' and item_kind:
+            kind = f'List[{item_kind}]'
+        definitions[param] = {
+            'description': schema.get('description', ''),
+            'type': kind,
+            'required': param in required,
+        }
+    return {'name': name, 'description': description, 'parameter_definitions': definitions}
+
+
+def openai_tool(name: str, description: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
+    """OpenAI function tool definition; parameters is copied, not shared."""
+    return {'type': 'function', 'function': {
+        'name': name, 'description': description, 'parameters': copy.deepcopy(parameters)}}
+
+
+class Tool:
+    def __init__(self, name: str, description: str, parameters: Dict[str, Any], handler: ToolHandler,
+                 timeout: float):
+        self.name = name
+        self.description = description
+        self.parameters = parameters
+        self.handler = handler
+        self.timeout = timeout
+
+
+class ToolRegistry:
+    """Tools the model may call, registered once by the modules that provide them.
+
+    Parameters are given as a JSON schema object. The provider-specific tool
+    list is compiled on first use and cached until the set of tools changes, so
+    requests only pass a reference to it. `execute` runs every tool call from
+    one model turn concurrently, each bounded by its own timeout; a failing or
+    slow tool produces an error output for the model instead of failing the turn.
+    """
+
+    compilers = {
+        'cohere': lambda tool: cohere_tool(tool.name, tool.description, tool.parameters),
+        'openai': lambda tool: openai_tool(tool.name, tool.description, tool.parameters),
+    }
+
+    def __init__(self, config: Config):
+        self.monitor = Monitor(__name__)
+        self.default_timeout = config.get('tools.timeout', 10.0)
+        # Model round trips allowed after the first one before the reply must be text
+        self.max_steps = config.get('tools.max_steps', 3)
+        self._tools: Dict[str, Tool] = {}
+        self._compiled: Dict[str, List[Dict[str, Any]]] = {}
+        self.latency = self.monitor.histogram(
+            'llm_tool_seconds', 'Time to run a tool called by the model', ['tool', 'outcome'], buckets=TOOL_BUCKETS)
+
+    def __len__(self) -> int:
+        return len(self._tools)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._tools
+
+    def register(self, name: str, description: str, parameters: Dict[str, Any], handler: ToolHandler,
+                 timeout: Optional[float] = None):
+        """Add a tool, replacing any earlier one with the same name.
+
+        A sync handler runs in a worker thread; if it times out the model gets an
+        error, but the thread can't be stopped and runs to completion.
+        """
+        self._tools[name] = Tool(name, description, parameters, handler, timeout or self.default_timeout)
+        self._compiled.clear()
+        self.monitor.log_info(f"Registered tool {name}")
+
+    def unregister(self, name: str):
+        if self._tools.pop(name, None) is not None:
+            self._compiled.clear()
+
+    def schemas(self, provider: str) -> List[Dict[str, Any]]:
+        """The tool list in the provider's format; shared between requests, so don't modify it."""
+        compiled = self._compiled.get(provider)
+        if compiled is None:
+            if provider not in self.compilers:
+                raise ValueError(f"No tool schema format for provider: {provider}")
+            compile_tool = self.compilers[provider]
+            compiled = self._compiled[provider] = [compile_tool(tool) for tool in self._tools.values()]
+        return compiled
+
+    async def execute(self, calls: Sequence[Tuple[str, Union[Dict[str, Any], str, None]]]) -> List[Dict[str, Any]]:
+        """Run (name, arguments) tool calls concurrently; returns one output dict per call, in order.
+
+        Arguments may be a dict or a JSON object string, as the providers return them.
+        """
+        if len(calls) > 1:
+            self.monitor.log_debug("Running %d tool calls concurrently", len(calls))
+        return list(await asyncio.gather(*(self._run(name, arguments) for name, arguments in calls)))
+
+    async def _run(self, name: str, arguments: Union[Dict[str, Any], str, None]) -> Dict[str, Any]:
+        tool = self._tools.get(name)
+        if tool is None:
+            self.monitor.log_warning(f"Model called unknown tool {name}")
+            return {'error': f"Unknown tool: {name}"}
+        started = time.perf_counter()
+        outcome = 'error'
+        try:
+            if isinstance(arguments, str):
+                arguments = json.loads(arguments) if arguments.strip() else {}
+            arguments = arguments or {}
+            if inspect.iscoroutinefunction(tool.handler):
+                call = tool.handler(**arguments)
+            else:
+                # Plain functions may block; keep them off the loop so they run alongside the others
+                call = asyncio.to_thread(tool.handler, **arguments)
+            result = await asyncio.wait_for(call, timeout=tool.timeout)
+            if inspect.isawaitable(result):
+                result = await asyncio.wait_for(result, timeout=tool.timeout)
+            outcome = 'ok'
+            return result if isinstance(result, dict) else {'result': result}
+        except asyncio.TimeoutError:
+            outcome = 'timeout'
+            self.monitor.log_warning(f"Tool {name} timed out after {tool.timeout}s")
+            return {'error': f"Tool {name} timed out"}
+        except Exception as e:
+            self.monitor.log_error(f"Error running tool {name}: {type(e).__name__}: {e}")
+            return {'error': f"{type(e).__name__}: {e}"}
+        finally:
+            self.latency.observe(time.perf_counter() - started, tool=name, outcome=outcome)
+
+
+# Shared registry: modules register their tools in setup and the chat module offers them to the model
+tool_registry = ToolRegistry(config)
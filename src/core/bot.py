@@ -1,13 +1,19 @@
 import asyncio
+import time
 from discord.ext import commands
 import discord
 from src.core.config import Config
 from src.utils.module_loader import ModuleLoader
-from src.utils.monitor import Monitor
+from src.utils.metrics import MetricsServer
+from src.utils.monitor import Monitor, configure_logging
+from src.utils.redis_pool import close_all as close_redis_pools
 import aiohttp
+import os
+from typing import List, Optional
 
-class Bot(commands.Bot):
-    def __init__(self):
+class Bot(commands.AutoShardedBot):
+    def __init__(self, shard_ids: Optional[List[int]] = None, shard_count: Optional[int] = None,
+                 worker_id: Optional[int] = None):
         intents = discord.Intents.default()
         intents.message_content = True
         intents.dm_messages = True
@@ -17,24 +23,70 @@ class Bot(commands.Bot):
         intents.guild_reactions = True
         intents.guild_typing = True
         self.config = Config()
+        # Cluster workers are started by the coordinator and get their own log directory
+        self.worker_id = worker_id
+        log_dir = self.config.get('logging.dir', 'data/logs')
+        if worker_id is not None:
+            log_dir = os.path.join(log_dir, f'worker-{worker_id}')
+        configure_logging(
+            level=self.config.get('logging.level', 'INFO'),
+            log_dir=log_dir,
+            max_bytes=self.config.get('logging.max_bytes', 10 * 1024 * 1024),
+            backup_count=self.config.get('logging.backup_count', 5),
+            json_logs=self.config.get('logging.json', True)
+        )
         super().__init__(
             command_prefix=commands.when_mentioned_or(self.config.bot.prefix),
             intents=intents,
-            dm_permission=True
+            dm_permission=True,
+            shard_ids=shard_ids,
+            shard_count=shard_count
         )
         self.monitor = Monitor(__name__)
+        self._configure_log_sampling()
         self.module_loader = ModuleLoader(self, 'src/modules')
         self.session = None
+        self.metrics_server = None
+        self.cluster_link = None
+        self.started_at = time.monotonic()
+        self.startup_seconds = self.monitor.gauge(
+            'bot_startup_seconds', 'Seconds from process start to each startup milestone', ['phase'])
+
+    def _configure_log_sampling(self):
+        """Apply [logging.rate_limits] (records/sec) and [logging.sample_rates] keyed by logger name."""
+        rate_limits = self.config.get('logging.rate_limits')
+        sample_rates = self.config.get('logging.sample_rates')
+        rate_limits = vars(rate_limits) if rate_limits is not None else {}
+        sample_rates = vars(sample_rates) if sample_rates is not None else {}
+        for name in set(rate_limits) | set(sample_rates):
+            Monitor(name).set_sampling(sample_rate=sample_rates.get(name, 1.0), rate_limit=rate_limits.get(name))
 
     async def setup_hook(self):
         self.session = aiohttp.ClientSession()
+        # In a cluster the coordinator serves every worker's metrics
+        if self.config.get('metrics.enabled', False) and self.worker_id is None:
+            try:
+                self.metrics_server = MetricsServer(
+                    host=self.config.get('metrics.host', '127.0.0.1'),
+                    port=self.config.get('metrics.port', 9108)
+                )
+                await self.metrics_server.start()
+                self.monitor.log_info(f"Metrics endpoint listening on {self.metrics_server.host}:{self.metrics_server.port}/metrics")
+            except Exception as e:
+                self.monitor.log_error(f"Error starting metrics endpoint: {e}")
         try:
+            await self.add_cog(self.module_loader)
             await self.module_loader.load_modules()
+            self.startup_seconds.set(time.monotonic() - self.started_at, phase='modules_loaded')
             self.monitor.log_info("Modules loaded successfully")
         except Exception as e:
             self.monitor.log_error(f"Error during setup: {e}")
 
     async def on_ready(self):
+        if self.startup_seconds.value(phase='ready') == 0:
+            elapsed = time.monotonic() - self.started_at
+            self.startup_seconds.set(elapsed, phase='ready')
+            self.monitor.log_info(f'Ready {elapsed:.2f}s after start')
         self.monitor.log_info(f'Logged in as {self.user.name} (ID: {self.user.id})')
         self.monitor.log_info('------')
 
@@ -46,7 +98,10 @@ class Bot(commands.Bot):
         if not self.is_closed():
             if self.session:
                 await self.session.close()
+            if self.metrics_server:
+                await self.metrics_server.stop()
             await super().close()
+            await close_redis_pools()
         # Add any other cleanup tasks specific to your bot here
 
     async def start_bot(self):
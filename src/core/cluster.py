@@ -0,0 +1,322 @@
+import asyncio
+import math
+import multiprocessing
+import os
+import signal
+import time
+from multiprocessing.connection import Connection
+from typing import Dict, List, Optional
+import aiohttp
+from src.core.config import Config
+from src.utils.metrics import MetricsServer, merge_rendered, registry
+from src.utils.monitor import Monitor
+
+
+def shard_ranges(shard_count: int, workers: int) -> List[List[int]]:
+    """Split shard IDs into contiguous, evenly sized ranges, one per worker."""
+    workers = max(1, min(workers, shard_count))
+    base, extra = divmod(shard_count, workers)
+    ranges, start = [], 0
+    for index in range(workers):
+        size = base + (1 if index < extra else 0)
+        ranges.append(list(range(start, start + size)))
+        start += size
+    return ranges
+
+
+class WorkerLink:
+    """Worker side of the coordinator pipe: periodic health reports in, stop requests out."""
+
+    def __init__(self, bot, conn: Connection, worker_id: int, interval: float = 5.0):
+        self.bot = bot
+        self.conn = conn
+        self.worker_id = worker_id
+        self.interval = interval
+        self.monitor = Monitor(__name__)
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        loop.add_reader(self.conn.fileno(), self._on_command)
+        self._task = asyncio.create_task(self._report())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        try:
+            asyncio.get_running_loop().remove_reader(self.conn.fileno())
+        except (OSError, ValueError):
+            pass
+
+    def _on_command(self):
+        try:
+            command = self.conn.recv()
+        except (EOFError, OSError):
+            # Coordinator is gone; don't outlive it
+            command = 'stop'
+        if command == 'stop':
+            self.stop()
+            self.monitor.log_info(f"Worker {self.worker_id} stopping at coordinator request")
+            asyncio.create_task(self.bot.close())
+
+    def health(self) -> Dict:
+        latencies = {shard_id: latency for shard_id, latency in getattr(self.bot, 'latencies', [])}
+        return {
+            'type': 'health',
+            'worker': self.worker_id,
+            'pid': os.getpid(),
+            'ready': self.bot.is_ready(),
+            'guilds': len(self.bot.guilds),
+            'shard_latencies': {shard_id: (None if math.isnan(latency) or math.isinf(latency) else latency)
+                                for shard_id, latency in latencies.items()},
+            'metrics': registry.render(),
+        }
+
+    async def _report(self):
+        while True:
+            try:
+                self.conn.send(self.health())
+            except (BrokenPipeError, OSError):
+                return
+            except Exception as e:
+                self.monitor.log_error(f"Error reporting worker health: {e}")
+            await asyncio.sleep(self.interval)
+
+
+async def _worker_main(worker_id: int, shard_ids: List[int], shard_count: int, conn: Connection):
+    from src.core.bot import Bot
+
+    bot = Bot(shard_ids=shard_ids, shard_count=shard_count, worker_id=worker_id)
+    link = WorkerLink(bot, conn, worker_id, bot.config.get('cluster.health_interval', 5.0))
+    bot.cluster_link = link
+    loop = asyncio.get_running_loop()
+    loop.add_signal_handler(signal.SIGTERM, lambda: asyncio.create_task(bot.close()))
+    link.start()
+    try:
+        await bot.start_bot()
+    finally:
+        link.stop()
+
+
+def run_worker(worker_id: int, shard_ids: List[int], shard_count: int, conn: Connection):
+    """Process entry point for one worker running `shard_ids` of `shard_count` shards."""
+    # Ctrl-C reaches the whole process group; the coordinator decides how workers stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(_worker_main(worker_id, shard_ids, shard_count, conn))
+
+
+class WorkerHandle:
+    def __init__(self, worker_id: int, shard_ids: List[int]):
+        self.worker_id = worker_id
+        self.shard_ids = shard_ids
+        self.process: Optional[multiprocessing.process.BaseProcess] = None
+        self.conn: Optional[Connection] = None
+        self.started_at = 0.0
+        self.last_seen = 0.0
+        self.health: Dict = {}
+        self.ready = asyncio.Event()
+        self.failures = 0
+        self.restart_at: Optional[float] = None
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.is_alive()
+
+
+class ClusterMetrics:
+    """Coordinator metrics plus every worker's latest report, labelled by worker."""
+
+    def __init__(self, workers: List[WorkerHandle]):
+        self.workers = workers
+
+    def render(self) -> str:
+        sources = {'coordinator': registry.render()}
+        for handle in self.workers:
+            if handle.health.get('metrics'):
+                sources[str(handle.worker_id)] = handle.health['metrics']
+        return merge_rendered(sources, 'worker')
+
+
+class ClusterCoordinator:
+    """Run the bot's gateway shards across worker processes and keep them running.
+
+    Shards are split into contiguous ranges (cluster.workers processes, at most
+    one per shard). Each worker runs an AutoShardedBot for its range. Workers are
+    started one after another, each once the previous one is ready, so shard
+    identifies don't pile up against Discord's rate limit. A worker that exits
+    or stops reporting health for cluster.heartbeat_timeout seconds is restarted
+    with exponential backoff. Worker metrics are merged into the coordinator's
+    /metrics endpoint.
+    """
+
+    def __init__(self, config: Config):
+        self.config = config
+        self.monitor = Monitor(__name__)
+        self.worker_count = config.get('cluster.workers', os.cpu_count() or 1)
+        self.shard_count = config.get('cluster.shard_count')
+        self.start_timeout = config.get('cluster.start_timeout', 120.0)
+        self.heartbeat_timeout = config.get('cluster.heartbeat_timeout', 90.0)
+        self.restart_delay = config.get('cluster.restart_delay', 5.0)
+        self.max_restart_delay = config.get('cluster.max_restart_delay', 300.0)
+        self.shutdown_timeout = config.get('cluster.shutdown_timeout', 30.0)
+        self.workers: List[WorkerHandle] = []
+        self.metrics_server: Optional[MetricsServer] = None
+        self._context = multiprocessing.get_context('spawn')
+        self._stopping: Optional[asyncio.Event] = None
+        self.workers_alive = self.monitor.gauge('cluster_workers_alive', 'Worker processes currently running')
+        self.workers_ready = self.monitor.gauge('cluster_workers_ready', 'Worker processes connected to the gateway')
+        self.restarts = self.monitor.counter('cluster_worker_restarts_total', 'Worker restarts by reason', ['reason'])
+
+    def stop(self):
+        """Ask the cluster to shut down; safe to call from a signal handler."""
+        if self._stopping is not None:
+            self._stopping.set()
+
+    async def run(self):
+        self._stopping = asyncio.Event()
+        shard_count = self.shard_count or await self._recommended_shards()
+        self.workers = [WorkerHandle(index, shard_ids)
+                        for index, shard_ids in enumerate(shard_ranges(shard_count, self.worker_count))]
+        self.monitor.log_info(f"Starting cluster: {shard_count} shards across {len(self.workers)} workers")
+
+        if self.config.get('metrics.enabled', False):
+            try:
+                self.metrics_server = MetricsServer(
+                    ClusterMetrics(self.workers),
+                    host=self.config.get('metrics.host', '127.0.0.1'),
+                    port=self.config.get('metrics.port', 9108)
+                )
+                await self.metrics_server.start()
+            except Exception as e:
+                self.metrics_server = None
+                self.monitor.log_error(f"Error starting cluster metrics endpoint: {e}")
+
+        try:
+            for handle in self.workers:
+                if self._stopping.is_set():
+                    break
+                self._spawn(handle, shard_count)
+                await self._wait_ready(handle)
+            while not self._stopping.is_set():
+                self._supervise(shard_count)
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=1.0)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            await self._shutdown()
+
+    async def _recommended_shards(self) -> int:
+        """Shard count Discord recommends for this bot token."""
+        headers = {'Authorization': f'Bot {self.config.bot.token}'}
+        async with aiohttp.ClientSession() as session:
+            async with session.get('https://discord.com/api/v10/gateway/bot', headers=headers) as response:
+                response.raise_for_status()
+                data = await response.json()
+        return int(data['shards'])
+
+    async def _wait_ready(self, handle: WorkerHandle):
+        ready = asyncio.ensure_future(handle.ready.wait())
+        stopping = asyncio.ensure_future(self._stopping.wait())
+        done, pending = await asyncio.wait({ready, stopping}, timeout=self.start_timeout,
+                                           return_when=asyncio.FIRST_COMPLETED)
+        for future in pending:
+            future.cancel()
+        if not done:
+            self.monitor.log_warning(f"Worker {handle.worker_id} not ready after {self.start_timeout}s; starting the next one anyway")
+
+    def _spawn(self, handle: WorkerHandle, shard_count: int):
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=run_worker,
+            args=(handle.worker_id, handle.shard_ids, shard_count, child_conn),
+            name=f'oracle-worker-{handle.worker_id}'
+        )
+        process.start()
+        child_conn.close()
+        handle.process = process
+        handle.conn = parent_conn
+        handle.started_at = handle.last_seen = time.monotonic()
+        handle.health = {}
+        handle.ready.clear()
+        handle.restart_at = None
+        asyncio.get_running_loop().add_reader(parent_conn.fileno(), self._on_report, handle)
+        self.monitor.log_info(f"Started worker {handle.worker_id} (pid {process.pid}) for shards {handle.shard_ids}")
+
+    def _on_report(self, handle: WorkerHandle):
+        try:
+            while handle.conn.poll():
+                report = handle.conn.recv()
+                if report.get('type') == 'health':
+                    handle.health = report
+                    handle.last_seen = time.monotonic()
+                    if report.get('ready'):
+                        handle.ready.set()
+                        # A worker that made it to ready has recovered; reset its backoff
+                        handle.failures = 0
+        except (EOFError, OSError):
+            self._detach(handle)
+
+    def _detach(self, handle: WorkerHandle):
+        if handle.conn is not None:
+            try:
+                asyncio.get_running_loop().remove_reader(handle.conn.fileno())
+            except (OSError, ValueError):
+                pass
+            handle.conn.close()
+            handle.conn = None
+
+    def _supervise(self, shard_count: int):
+        now = time.monotonic()
+        for handle in self.workers:
+            if handle.restart_at is not None:
+                if now >= handle.restart_at:
+                    self._spawn(handle, shard_count)
+                continue
+            if not handle.alive:
+                self._schedule_restart(handle, f"exited with code {handle.process.exitcode}", 'exited')
+            elif now - handle.last_seen > self.heartbeat_timeout:
+                self.monitor.log_error(f"Worker {handle.worker_id} sent no health report for {now - handle.last_seen:.0f}s; killing it")
+                handle.process.kill()
+                handle.process.join(timeout=5)
+                self._schedule_restart(handle, "stopped reporting health", 'unresponsive')
+        self.workers_alive.set(sum(handle.alive for handle in self.workers))
+        self.workers_ready.set(sum(bool(handle.health.get('ready')) for handle in self.workers if handle.alive))
+
+    def _schedule_restart(self, handle: WorkerHandle, why: str, reason: str):
+        self._detach(handle)
+        delay = min(self.max_restart_delay, self.restart_delay * 2 ** handle.failures)
+        handle.failures += 1
+        handle.restart_at = time.monotonic() + delay
+        handle.health = {}
+        self.restarts.inc(reason=reason)
+        self.monitor.log_error(f"Worker {handle.worker_id} {why}; restarting in {delay:.1f}s")
+
+    async def _shutdown(self):
+        self.monitor.log_info("Stopping cluster workers...")
+        for handle in self.workers:
+            if handle.alive and handle.conn is not None:
+                try:
+                    handle.conn.send('stop')
+                except (BrokenPipeError, OSError):
+                    handle.process.terminate()
+            elif handle.alive:
+                handle.process.terminate()
+
+        deadline = time.monotonic() + self.shutdown_timeout
+        for handle in self.workers:
+            if handle.process is None:
+                continue
+            await asyncio.to_thread(handle.process.join, max(0.0, deadline - time.monotonic()))
+            if handle.process.is_alive():
+                self.monitor.log_warning(f"Worker {handle.worker_id} did not stop in time; terminating")
+                handle.process.terminate()
+                await asyncio.to_thread(handle.process.join, 5)
+                if handle.process.is_alive():
+                    handle.process.kill()
+            self._detach(handle)
+
+        if self.metrics_server is not None:
+            await self.metrics_server.stop()
+        self.monitor.log_info("Cluster stopped")
@@ -1,11 +1,10 @@
 import toml
 from types import SimpleNamespace
 from src.utils.monitor import Monitor
-from jinja2 import Environment, FileSystemLoader
-import os
 
 class Config:
     _instance = None
+    version = 0
 
     def __new__(cls):
         if cls._instance is None:
@@ -18,11 +17,17 @@ class Config:
         try:
             config_dict = toml.load('settings.toml')
             self.config = self._dict_to_namespace(config_dict)
+            # Bumped on every (re)load so caches derived from config can tell they are stale
+            self.version += 1
             self.monitor.log_info("Configuration loaded successfully")
         except Exception as e:
             self.monitor.log_error(f"Error loading configuration: {e}")
             raise
 
+    def reload(self):
+        """Re-read settings.toml in place."""
+        self._load_config()
+
     def _dict_to_namespace(self, d):
         """Recursively convert a dictionary to a SimpleNamespace."""
         for key, value in d.items():
@@ -33,16 +38,18 @@ class Config:
     def __getattr__(self, item):
         return getattr(self.config, item)
 
-    def get_system_prompt(self):
-        try:
-            template_dir = os.path.join(os.getcwd(), 'data', 'templates')
-            env = Environment(loader=FileSystemLoader(template_dir))
-            template = env.get_template('system_prompt.j2')
-            rendered_prompt = template.render(config=self.config)
-            return rendered_prompt
-        except Exception as e:
-            self.monitor.log_error(f"Error loading system prompt template: {e}")
-            return "You're a helpful assistant."
+    def get(self, path: str, default=None):
+        """Look up an optional dotted setting such as 'cohere.timeout', falling back to default."""
+        node = self.config
+        for part in path.split('.'):
+            node = getattr(node, part, None)
+            if node is None:
+                return default
+        return node
+
+    def get_system_prompt(self, is_dm: bool = False, guild_id=None):
+        from src.core.prompt_cache import prompt_cache
+        return prompt_cache.get(is_dm=is_dm, guild_id=guild_id)
 
 # Create a single instance of Config
 config = Config()
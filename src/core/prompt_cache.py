@@ -0,0 +1,110 @@
+import os
+import time
+from typing import TYPE_CHECKING, Dict, Optional
+from src.core.config import Config, config
+from src.utils.monitor import Monitor
+
+if TYPE_CHECKING:
+    from jinja2 import Environment, Template
+
+DEFAULT_PROMPT = "You're a helpful assistant."
+
+class PromptCache:
+    """Compiled system prompt template with rendered output cached per variant.
+
+    The template is compiled once and each variant (DMs, guilds, and guilds with
+    overrides under [prompt.guild_overrides]) is rendered once. Everything is
+    dropped when the template file's mtime or the config version changes.
+    """
+
+    def __init__(self, config: Config, template_dir: str = 'data/templates',
+                 template_name: str = 'system_prompt.j2', check_interval: float = 1.0):
+        self.config = config
+        self.monitor = Monitor(__name__)
+        self.template_name = template_name
+        self.template_path = os.path.join(template_dir, template_name)
+        self.check_interval = check_interval
+        self.template_dir = template_dir
+        self._env: Optional['Environment'] = None
+        self._template: Optional['Template'] = None
+        self._mtime: Optional[float] = None
+        self._config_version: Optional[int] = None
+        self._last_check = 0.0
+        self._rendered: Dict[str, str] = {}
+        self.requests = self.monitor.counter('prompt_cache_requests_total', 'System prompt cache lookups', ['result'])
+
+    @property
+    def env(self) -> 'Environment':
+        # jinja2 is imported when the template is first compiled, not when this module is
+        if self._env is None:
+            from jinja2 import Environment, FileSystemLoader
+            self._env = Environment(loader=FileSystemLoader(self.template_dir), auto_reload=False)
+        return self._env
+
+    def load(self):
+        """Compile the template now rather than on the first message."""
+        self._refresh(force=True)
+
+    def invalidate(self):
+        """Drop the compiled template and every rendered variant."""
+        self._template = None
+        self._rendered.clear()
+        if self._env is not None and self._env.cache is not None:
+            self._env.cache.clear()
+
+    def get(self, is_dm: bool = False, guild_id: Optional[int] = None) -> str:
+        """Return the system prompt for a DM or for the given guild."""
+        self._refresh()
+        override = None if is_dm else self._guild_override(guild_id)
+        variant = 'dm' if is_dm else (f'guild:{guild_id}' if override is not None else 'guild')
+
+        rendered = self._rendered.get(variant)
+        if rendered is not None:
+            self.requests.inc(result='hit')
+            return rendered
+
+        self.requests.inc(result='miss')
+        try:
+            if self._template is None:
+                self._template = self.env.get_template(self.template_name)
+            # The shared 'guild' variant is served to every guild, so it must not see any one guild's ID
+            rendered = self._template.render(config=self.config, is_dm=is_dm,
+                                             guild_id=guild_id if override is not None else None, override=override)
+        except Exception as e:
+            self.monitor.log_error(f"Error loading system prompt template: {e}")
+            # Kept until the template or config changes rather than failing again on every message
+            rendered = DEFAULT_PROMPT
+        self._rendered[variant] = rendered
+        return rendered
+
+    def _guild_override(self, guild_id: Optional[int]):
+        if guild_id is None:
+            return None
+        return self.config.get(f'prompt.guild_overrides.{guild_id}')
+
+    def _refresh(self, force: bool = False):
+        """Invalidate when the template file or the config has changed since the last render."""
+        now = time.monotonic()
+        if not force and now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+
+        try:
+            mtime = os.stat(self.template_path).st_mtime
+        except OSError:
+            mtime = None
+        version = self.config.version
+
+        if force or mtime != self._mtime or version != self._config_version:
+            if self._mtime is not None or self._config_version is not None:
+                self.monitor.log_info("System prompt template or config changed, recompiling")
+            self.invalidate()
+            self._mtime = mtime
+            self._config_version = version
+            try:
+                self._template = self.env.get_template(self.template_name)
+            except Exception as e:
+                self.monitor.log_error(f"Error loading system prompt template: {e}")
+
+# Shared instance used by Config.get_system_prompt and the chat module
+prompt_cache = PromptCache(config)
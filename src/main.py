@@ -1,11 +1,16 @@
 import asyncio
 import signal
 from src.core.bot import Bot
+from src.core.config import config
 from src.utils.monitor import Monitor
 
 monitor = Monitor(__name__)
 
 async def main():
+    if config.get('cluster.enabled', False):
+        await run_cluster()
+        return
+
     bot = Bot()
     
     # Set up signal handlers for graceful shutdown
@@ -20,6 +25,16 @@ async def main():
     finally:
         await cleanup(bot)
 
+async def run_cluster():
+    from src.core.cluster import ClusterCoordinator
+
+    coordinator = ClusterCoordinator(config)
+    # The coordinator tells every worker to shut down cleanly before exiting
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, coordinator.stop)
+    await coordinator.run()
+
 async def shutdown(bot: Bot, loop: asyncio.AbstractEventLoop):
     monitor.log_info("Received signal to shut down. Cleaning up...")
     tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
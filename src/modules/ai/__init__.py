@@ -1,6 +1,6 @@
-import discord
 from discord.ext import commands
-from .chat import setup as setup_chat
 
 async def setup(bot: commands.Bot):
+    # Imported on use so loading any one submodule doesn't pull in the whole package
+    from .chat import setup as setup_chat
     await setup_chat(bot)
@@ -0,0 +1,69 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, List
+from src.utils.monitor import Monitor
+
+
+class ChannelWorkQueue:
+    """Run work strictly in order per channel, merging items that arrive close together.
+
+    Each channel with pending work gets one worker task. The worker waits until no new
+    item has arrived for `window` seconds (but never longer than `max_delay` after it
+    started waiting), then hands the whole batch to `handler`. Items submitted while the
+    handler runs form the next batch, so turns for one channel never overlap or reorder,
+    while different channels proceed in parallel.
+    """
+
+    def __init__(self, handler: Callable[[Hashable, List[Any]], Awaitable[None]],
+                 window: float = 0.5, max_delay: float = 3.0):
+        self.handler = handler
+        self.window = window
+        self.max_delay = max_delay
+        self.monitor = Monitor(__name__)
+        self._pending: Dict[Hashable, List[Any]] = {}
+        self._last_arrival: Dict[Hashable, float] = {}
+        self._workers: Dict[Hashable, asyncio.Task] = {}
+        self.active_channels = self.monitor.gauge(
+            'chat_queue_active_channels', 'Channels with queued or running chat turns')
+        self.batch_size = self.monitor.histogram(
+            'chat_queue_batch_size', 'Messages merged into one batch', buckets=(1, 2, 3, 5, 8, 13))
+
+    def submit(self, key: Hashable, item: Any):
+        """Queue an item for its channel; returns immediately."""
+        self._pending.setdefault(key, []).append(item)
+        self._last_arrival[key] = time.monotonic()
+        if key not in self._workers:
+            self._workers[key] = asyncio.create_task(self._run(key))
+            self.active_channels.set(len(self._workers))
+
+    async def _run(self, key: Hashable):
+        try:
+            while self._pending.get(key):
+                started = time.monotonic()
+                while True:
+                    now = time.monotonic()
+                    remaining = min(self._last_arrival[key] + self.window, started + self.max_delay) - now
+                    if remaining <= 0:
+                        break
+                    await asyncio.sleep(remaining)
+
+                batch = self._pending.pop(key)
+                self.batch_size.observe(len(batch))
+                try:
+                    await self.handler(key, batch)
+                except Exception as e:
+                    self.monitor.log_error(f"Error handling queued work for {key}: {type(e).__name__}: {e}")
+        finally:
+            # No await between the emptiness check above and this cleanup, so submit() cannot
+            # add an item that no worker will pick up
+            self._workers.pop(key, None)
+            self._last_arrival.pop(key, None)
+            self.active_channels.set(len(self._workers))
+
+    async def close(self):
+        """Cancel all workers and drop anything still queued."""
+        workers = list(self._workers.values())
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        self._pending.clear()
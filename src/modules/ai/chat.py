@@ -1,126 +1,377 @@
+import asyncio
+import time
 import discord
 from discord.ext import commands
 from src.modules.base import BaseModule
+from src.modules.ai.channel_queue import ChannelWorkQueue
+from src.modules.ai.context import ContextBuilder
+from src.modules.ai.gate import MessageGate
+from src.modules.ai.policy import Decision, ReplyPolicy
+from src.modules.ai.short_term import ShortTermMemory, setup as setup_short_term
+from src.modules.ai.streaming import StreamingReply, split_message
+from src.modules.ai.summary import ConversationSummarizer
+from src.modules.ai.warmup import HistoryWarmer
 from src.clients.base import BaseAIClient
+from src.clients.response_cache import ResponseCache
+from src.clients.scheduler import LLMScheduler, SchedulerBusy, PRIORITY_HIGH, PRIORITY_LOW, PRIORITY_NORMAL
+from src.clients.tools import tool_registry
 from src.core.config import config
-from src.utils.monitor import Monitor
-import redis.asyncio as redis
-import json
-import time
-from typing import List, Dict, Optional
-from jinja2 import Environment, FileSystemLoader
+from src.core.prompt_cache import prompt_cache
+from src.utils.leases import ChannelLeases
+from src.utils.module_loader import prewarm
+from src.utils.monitor import LazyJSON, Monitor
+from typing import TYPE_CHECKING, AsyncContextManager, List, Dict, Optional, Tuple
+
+if TYPE_CHECKING:
+    from src.modules.ai.long_term import LongTermMemory
+
+DEPENDS = ('ai.short_term', 'ai.long_term')
+
+ERROR_MESSAGE = "I apologize, but I encountered an error while processing your request."
 
 class AIChatModule(BaseModule):
-    def __init__(self, bot: commands.Bot, ai_client: BaseAIClient):
+    def __init__(self, bot: commands.Bot, ai_client: BaseAIClient, memory: ShortTermMemory,
+                 long_term_memory: Optional['LongTermMemory'] = None):
         super().__init__(bot)
         self.monitor = Monitor(__name__)
         self.ai_client = ai_client
-        self.redis: Optional[redis.Redis] = None
+        self.memory = memory
+        self.long_term_memory = long_term_memory
         self.short_term_limit = config.memory.short_term_limit
-        self.server_ttl = 600  # 10 minutes in seconds
-        self.dm_ttl = 5400  # 1.5 hours in seconds
-        self.jinja_env = Environment(loader=FileSystemLoader('data/templates'))
+        self.prompt_cache = prompt_cache
+        # Modules register their tools here; offered to the model once any exist
+        self.tools = tool_registry
+        self.context_builder = ContextBuilder(config)
+        self.gate = MessageGate(max_sent=config.get('chat.sent_message_cache', 10000))
+        # Picks the model tier and output cap for each turn
+        self.policy = ReplyPolicy(config)
+        self.streaming = config.get('chat.streaming', True)
+        self.stream_edit_interval = config.get('chat.stream_edit_interval', 1.0)
+        self.stage_latency = self.monitor.histogram(
+            'chat_stage_seconds', 'Latency of each stage of a chat turn', ['stage', 'channel_type', 'outcome'])
+        self.turn_latency = self.monitor.histogram(
+            'chat_turn_seconds', 'End-to-end latency of a chat turn', ['channel_type', 'outcome'])
+        self.first_token_latency = self.monitor.histogram(
+            'chat_first_token_seconds', 'Time from sending the LLM request to the first streamed text', ['channel_type'])
+        self.coalesced_messages = self.monitor.counter(
+            'chat_messages_coalesced_total', 'Messages merged into an earlier turn instead of getting their own LLM call')
+        self.response_cache: Optional[ResponseCache] = None
+        # Set in setup when several workers may see the same channel
+        self.leases: Optional[ChannelLeases] = None
+        self.scheduler = LLMScheduler.from_config(config)
+        # Set in setup; rebuilds a channel's history from Discord when memory has none
+        self.warmer: Optional[HistoryWarmer] = None
+        self._startup_warmup: Optional[asyncio.Task] = None
+        # Set in setup when memory.summary.enabled; compacts older turns into a summary
+        self.summarizer: Optional[ConversationSummarizer] = None
+        self.busy_message = config.get('scheduler.busy_message', "I'm a bit overloaded right now, please try again in a moment.")
+        self.turn_queue = ChannelWorkQueue(
+            self._process_batch,
+            window=config.get('chat.coalesce_window', 0.5),
+            max_delay=config.get('chat.coalesce_max_delay', 3.0)
+        )
 
     async def setup(self):
         try:
-            self.redis = await redis.from_url(config.redis.url)
+            await self.memory.setup()
+            self.prompt_cache.load()
+            if config.get('cache.enabled', False) and self.response_cache is None and self.memory.redis is not None:
+                self.response_cache = ResponseCache(
+                    self.memory.redis,
+                    ttl=config.get('cache.ttl', 3600),
+                    max_entries=config.get('cache.max_entries', 10000),
+                    history_turns=config.get('cache.history_turns', 2),
+                    disabled_guilds=config.get('cache.disabled_guilds', [])
+                )
+            if self.leases is None and self.memory.redis is not None and \
+               (config.get('cluster.enabled', False) or config.get('cluster.leases', False)):
+                self.leases = ChannelLeases(
+                    self.memory.redis,
+                    ttl=config.get('cluster.lease_ttl', 30.0),
+                    owner=config.get('cluster.lease_owner'),
+                    worker_id=getattr(self.bot, 'worker_id', None)
+                )
+            if self.warmer is None and config.get('memory.warmup.enabled', True):
+                self.warmer = HistoryWarmer(self.bot, self.memory, self.gate,
+                                            ignored_replies=(ERROR_MESSAGE, self.busy_message))
+            if self.summarizer is None and config.get('memory.summary.enabled', False):
+                self.summarizer = ConversationSummarizer(config, self.monitor, self.memory, self._complete_summary)
+                if config.get('router.enabled', False) and config.get('memory.summary.model') is not None:
+                    self.monitor.log_warning(
+                        "memory.summary.model only applies to router providers without their own model set")
             self.monitor.log_info(f"AIChatModule setup completed. Short-term limit: {self.short_term_limit}")
         except Exception as e:
             self.monitor.log_error(f"Error setting up Redis connection: {e}")
             raise
 
+    async def cog_unload(self):
+        if self._startup_warmup is not None:
+            self._startup_warmup.cancel()
+        await self.turn_queue.close()
+        if self.leases is not None:
+            await self.leases.release_all()
+        if self.summarizer is not None:
+            await self.summarizer.close()
+        await self.memory.close()
+        if self.long_term_memory is not None:
+            await self.long_term_memory.close()
+        embedding_service = getattr(self.bot, 'embedding_service', None)
+        if embedding_service is not None:
+            await embedding_service.close()
+        await self.ai_client.close()
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        if self.warmer is not None and self.warmer.startup_channels and self._startup_warmup is None:
+            self._startup_warmup = asyncio.create_task(self.warmer.warm_active_channels())
+
     @commands.Cog.listener()
     async def on_message(self, message: discord.Message):
-        if message.author.bot:
+        if self.bot.user is None or self.gate.classify(message, self.bot.user.id) is None:
             return
 
+        # Only build the context for messages we are going to answer
         ctx = await self.bot.get_context(message)
+        self.turn_queue.submit(self._get_channel_id(ctx), (ctx, message.content))
+
+    async def _process_batch(self, channel_id: str, batch: List[Tuple[commands.Context, str]]):
+        """Answer one channel's queued messages in order, merging consecutive lines from the same author."""
+        if self.leases is not None:
+            # A worker that is shutting down or restarting releases its leases; wait for that rather than drop the batch
+            wait = config.get('cluster.lease_wait', 10.0)
+            if not await self.leases.acquire(channel_id, wait):
+                self.monitor.log_warning(
+                    f"Channel {channel_id} stayed leased by another worker for {wait}s; leaving {len(batch)} message(s) to it")
+                return
+        try:
+            await self._answer_batch(batch)
+        finally:
+            if self.leases is not None:
+                await self.leases.release(channel_id)
 
-        if isinstance(message.channel, discord.DMChannel) or \
-           self.bot.user in message.mentions or \
-           (message.reference and message.reference.resolved.author == self.bot.user):
-            await self._process_chat(ctx, message.content)
+    async def _answer_batch(self, batch: List[Tuple[commands.Context, str]]):
+        turns: List[Tuple[commands.Context, str]] = []
+        for ctx, content in batch:
+            if turns and turns[-1][0].author.id == ctx.author.id:
+                # Reply in the context of the latest message of the run
+                turns[-1] = (ctx, f"{turns[-1][1]}\n{content}")
+            else:
+                turns.append((ctx, content))
+
+        if len(batch) > len(turns):
+            self.coalesced_messages.inc(len(batch) - len(turns))
+        for ctx, content in turns:
+            await self._process_chat(ctx, content)
 
     async def _process_chat(self, ctx: commands.Context, message: str):
+        started = time.perf_counter()
+        is_dm = isinstance(ctx.channel, discord.DMChannel)
+        channel_type = 'dm' if is_dm else 'guild'
+        outcome = 'ok'
         try:
             channel_id = self._get_channel_id(ctx)
-            is_dm = isinstance(ctx.channel, discord.DMChannel)
-            
-            conversation_history = await self._get_conversation_history(channel_id, message)
-            
-            self.monitor.log_info(f"Sending chat request with history: {json.dumps(conversation_history, indent=2)}")
-            
-            response = await self.ai_client.chat(
-                model=config.cohere.model,
-                messages=conversation_history
-            )
+            if self.warmer is not None:
+                await self.warmer.ensure_warm(channel_id, is_dm, before=ctx.message)
+
+            guild_id = ctx.guild.id if ctx.guild else None
+            conversation_history, decision = await self._get_conversation_history(
+                channel_id, message, is_dm, guild_id, attachments=len(getattr(ctx.message, 'attachments', None) or ()))
             
-            self.monitor.log_info(f"Received response: {json.dumps(response, indent=2)}")
+            content = None
+            cache_key = None
+            if self.response_cache is not None and self.response_cache.enabled_for(guild_id):
+                cache_key = self.response_cache.make_key(decision.model, conversation_history)
+                content = await self.response_cache.get(cache_key)
 
-            await ctx.send(response["content"])
+            if content is not None:
+                with self.stage_latency.time(stage='send', channel_type=channel_type):
+                    await self._send(ctx, content)
+            else:
+                content = await self._generate_reply(ctx, conversation_history, decision, is_dm, channel_type)
+                if not content.strip():
+                    # Nothing was shown, so there is nothing to cache or remember
+                    outcome = 'empty'
+                    self.monitor.log_warning(f"Empty completion from {decision.model} in {channel_id}")
+                    await ctx.send(ERROR_MESSAGE)
+                    return
+                if cache_key is not None:
+                    await self.response_cache.set(cache_key, content)
 
-            await self._store_interaction(channel_id, message, response["content"], is_dm)
+            with self.stage_latency.time(stage='memory_write', channel_type=channel_type):
+                await self._store_interaction(channel_id, message, content, is_dm)
+        except SchedulerBusy as e:
+            outcome = 'shed'
+            self.monitor.log_warning(f"Shedding chat turn: {e}")
+            await ctx.send(self.busy_message)
         except Exception as e:
+            outcome = 'error'
             self.monitor.log_error(f"Error in _process_chat: {type(e).__name__}: {str(e)}")
             await self._handle_error(ctx, e)
+        finally:
+            self.turn_latency.observe(time.perf_counter() - started, channel_type=channel_type, outcome=outcome)
 
-    async def _get_conversation_history(self, channel_id: str, current_message: str) -> List[Dict]:
-        recent_interactions = await self._get_recent_interactions(channel_id)
-        
-        # Load and render the system prompt template
-        template = self.jinja_env.get_template('system_prompt.j2')
-        system_prompt = template.render(config=config)
+    async def _generate_reply(self, ctx: commands.Context, conversation_history: List[Dict], decision: Decision,
+                              is_dm: bool, channel_type: str) -> str:
+        """Get a completion through the scheduler and deliver it to the channel."""
+        self.monitor.log_debug("Sending chat request with history: %s", LazyJSON(conversation_history, indent=2))
+
+        # DMs and direct replies jump ahead of casual mentions when the scheduler is backed up
+        priority = PRIORITY_HIGH if is_dm or getattr(ctx.message, 'reference', None) else PRIORITY_NORMAL
+        slot = self.scheduler.request(
+            self.ai_client, priority, self._estimate_request_tokens(conversation_history, decision.max_tokens))
+
+        if self.streaming:
+            content = await self._stream_reply(ctx, conversation_history, decision, slot, channel_type)
+            self.policy.observe_reply(decision, content)
+            return content
+
+        async with slot:
+            with self.stage_latency.time(stage='llm', channel_type=channel_type), \
+                 self.policy.latency.time(tier=decision.tier, model=decision.model):
+                response = await self.ai_client.chat(
+                    model=decision.model,
+                    messages=conversation_history,
+                    tools=self.tools or None,
+                    max_tokens=decision.max_tokens,
+                    temperature=decision.temperature
+                )
+
+        self.monitor.log_debug("Received response: %s", LazyJSON(response, indent=2))
+
+        content = response["content"]
+        self.policy.observe_reply(decision, content)
+        with self.stage_latency.time(stage='send', channel_type=channel_type):
+            await self._send(ctx, content)
+        return content
+
+    async def _send(self, ctx: commands.Context, content: str):
+        for part in split_message(content):
+            sent = await ctx.send(part)
+            self.gate.record_sent(sent.id)
+
+    @staticmethod
+    def _estimate_request_tokens(conversation_history: List[Dict], max_tokens: int = 150) -> int:
+        """Cheap prompt-plus-completion token estimate for rate limiting (~4 characters per token)."""
+        return sum(len(msg["message"]) for msg in conversation_history) // 4 + max_tokens
+
+    async def _stream_reply(self, ctx: commands.Context, conversation_history: List[Dict], decision: Decision,
+                            slot: AsyncContextManager, channel_type: str = 'guild') -> str:
+        """Post a placeholder right away and fill it in as the completion streams.
+
+        The placeholder goes out before the turn waits for a scheduler slot, and the
+        slot is held only while the provider stream is read; Discord edits happen
+        in the background. If the turn fails, the placeholder and any partial reply
+        are removed so the caller's busy or error notice is the only message left.
+        """
+        reply = StreamingReply(ctx, edit_interval=self.stream_edit_interval)
+        await reply.start()
+        try:
+            async with slot:
+                with self.stage_latency.time(stage='llm_stream', channel_type=channel_type), \
+                     self.policy.latency.time(tier=decision.tier, model=decision.model):
+                    requested = time.perf_counter()
+                    first_chunk = True
+                    async for chunk in self.ai_client.chat_stream(
+                        model=decision.model,
+                        messages=conversation_history,
+                        tools=self.tools or None,
+                        max_tokens=decision.max_tokens,
+                        temperature=decision.temperature
+                    ):
+                        if first_chunk and chunk:
+                            self.first_token_latency.observe(time.perf_counter() - requested, channel_type=channel_type)
+                            first_chunk = False
+                        await reply.feed(chunk)
+            content = await reply.finish()
+        except BaseException:
+            await reply.abort()
+            raise
+        for sent in reply.messages:
+            self.gate.record_sent(sent.id)
+        return content
+
+    async def _get_conversation_history(self, channel_id: str, current_message: str, is_dm: bool = False,
+                                        guild_id: Optional[int] = None,
+                                        attachments: int = 0) -> Tuple[List[Dict], Decision]:
+        """Build the request for this turn, sized for the model and output cap the reply policy picks."""
+        channel_type = 'dm' if is_dm else 'guild'
+        with self.stage_latency.time(stage='history', channel_type=channel_type):
+            lookups = {'recent': self._get_recent_interactions(channel_id)}
+            if self.summarizer is not None:
+                lookups['summary'] = self.memory.get_summary(channel_id)
+            if self.long_term_memory is not None:
+                lookups['memories'] = self.long_term_memory.retrieve(channel_id, current_message)
+            values = await asyncio.gather(*lookups.values()) if len(lookups) > 1 else [await lookups['recent']]
+            results = dict(zip(lookups, values))
+        recent_interactions = results['recent']
+        decision = self.policy.decide(current_message, len(recent_interactions), is_dm, guild_id, attachments)
+        summary = results.get('summary')
+        memories = results.get('memories', [])
+        if memories:
+            # Turns are archived when stored, so skip the ones still in the recent history
+            recent_timestamps = {interaction.get('timestamp') for interaction in recent_interactions}
+            memories = [memory for memory in memories if memory.get('timestamp') not in recent_timestamps]
         
-        conversation_history = [
-            {"role": "System", "message": system_prompt}
-        ]
-        for interaction in recent_interactions:
-            conversation_history.append({"role": "User", "message": interaction['content']})
-            conversation_history.append({"role": "Chatbot", "message": interaction['response']})
+        # Rendered once per variant and reused until the template or config changes
+        with self.stage_latency.time(stage='prompt', channel_type=channel_type):
+            system_prompt = self.prompt_cache.get(is_dm=is_dm, guild_id=guild_id)
+        if memories:
+            system_prompt += "\n\nRelevant earlier conversation:\n" + "\n".join(
+                f"- User: {memory['content']}\n  You: {memory['response']}" for memory in memories
+            )
+        if summary:
+            # The summary stands in for the turns it covers
+            system_prompt += "\n\nSummary of the conversation so far:\n" + summary['text']
+            recent_interactions = ConversationSummarizer.uncovered(recent_interactions, summary)
         
-        conversation_history.append({"role": "User", "message": current_message})
-        return conversation_history
+        # Newest interactions that fit the model's token budget, in chronological order
+        conversation_history = self.context_builder.build(
+            decision.model, system_prompt, recent_interactions, current_message, decision.max_tokens)
+        return conversation_history, decision
+
+    async def _complete_summary(self, messages: List[Dict[str, str]], max_tokens: int) -> str:
+        # With router.enabled, providers with their own <name>.model configured send that model instead
+        model = config.get('memory.summary.model', config.cohere.model)
+        async with self.scheduler.request(self.ai_client, PRIORITY_LOW,
+                                          self._estimate_request_tokens(messages, max_tokens)):
+            response = await self.ai_client.chat(model=model, messages=messages, max_tokens=max_tokens)
+        return response["content"]
 
     async def _store_interaction(self, channel_id: str, user_message: str, ai_response: str, is_dm: bool):
-        try:
-            interaction = {
-                'user': 'User',
-                'content': user_message,
-                'response': ai_response,
-                'timestamp': time.time()
-            }
-            key = f'channel:{channel_id}:interactions'
-            await self.redis.lpush(key, json.dumps(interaction))
-            await self.redis.ltrim(key, 0, self.short_term_limit - 1)
-            
-            ttl = self.dm_ttl if is_dm else self.server_ttl
-            await self.redis.expire(key, ttl)
-            
-            self.monitor.log_info(f"Stored interaction for channel {channel_id} with TTL {ttl} seconds")
-        except Exception as e:
-            self.monitor.log_error(f"Error storing interaction: {e}")
+        interaction = ShortTermMemory.make_interaction(user_message, ai_response)
+        await self.memory.store_interactions(channel_id, [interaction], is_dm)
+        if self.long_term_memory is not None:
+            # Archived right away: most guild history expires by TTL rather than being trimmed
+            self.long_term_memory.archive(channel_id, [interaction])
+        if self.summarizer is not None:
+            self.summarizer.schedule(channel_id, is_dm)
 
     async def _get_recent_interactions(self, channel_id: str) -> List[Dict]:
-        try:
-            key = f'channel:{channel_id}:interactions'
-            interactions = await self.redis.lrange(key, 0, self.short_term_limit - 1)
-            return [json.loads(interaction.decode('utf-8')) for interaction in interactions]
-        except Exception as e:
-            self.monitor.log_error(f"Error retrieving interactions: {e}")
-            return []
+        return await self.memory.get_recent_interactions(channel_id, self.short_term_limit)
 
     async def _handle_error(self, ctx: commands.Context, error: Exception):
         self.monitor.log_error(f"Error in chat command: {error}")
-        error_message = "I apologize, but I encountered an error while processing your request."
-        await ctx.send(error_message)
+        await ctx.send(ERROR_MESSAGE)
 
     def _get_channel_id(self, ctx: commands.Context) -> str:
         return f"dm_{ctx.author.id}" if isinstance(ctx.channel, discord.DMChannel) else str(ctx.channel.id)
 
 async def setup(bot: commands.Bot):
-    from src.clients.cohere import CohereAIClient
-    
-    ai_client = CohereAIClient()
-    chat_module = AIChatModule(bot, ai_client)
-    await chat_module.setup()
+    from src.modules.ai.long_term import setup as setup_long_term
+
+    if bot.get_cog(AIChatModule.__cog_name__) is not None:
+        return
+    # The SDKs are only needed once the first message arrives; load them while the gateway connects
+    if config.get('router.enabled', False):
+        from src.clients.router import RoutingAIClient
+        ai_client = RoutingAIClient.from_config(config)
+        prewarm(*(route.name for route in ai_client.routes))
+    else:
+        from src.clients.cohere import CohereAIClient
+        ai_client = CohereAIClient()
+        prewarm('cohere')
+    memory = await setup_short_term(bot)
+    long_term_memory = await setup_long_term(bot)
+    chat_module = AIChatModule(bot, ai_client, memory, long_term_memory)
+    await chat_module.ensure_setup()
     await bot.add_cog(chat_module)
@@ -0,0 +1,69 @@
+import math
+from typing import Dict, List, Optional
+from src.core.config import Config
+from src.utils.monitor import Monitor
+
+# Per-message framing the providers add around each turn
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token) that needs no tokenizer round trip."""
+    return math.ceil(len(text) / 4) + MESSAGE_OVERHEAD_TOKENS
+
+
+def interaction_tokens(interaction: Dict) -> int:
+    """Token count stored with the record, or an estimate for records written before counts were kept."""
+    tokens = interaction.get('tokens')
+    if tokens is None:
+        tokens = estimate_tokens(interaction['content']) + estimate_tokens(interaction['response'])
+    return tokens
+
+
+class ContextBuilder:
+    """Pack the newest interactions that fit a per-model prompt token budget.
+
+    Budgets come from memory.context_budgets.<model>, falling back to
+    memory.context_budget. Room for the completion is held back from the budget:
+    the turn's max_tokens when given, otherwise memory.completion_reserve.
+    """
+
+    def __init__(self, config: Config):
+        self.config = config
+        self.default_budget = config.get('memory.context_budget', 2000)
+        self.completion_reserve = config.get('memory.completion_reserve', 150)
+        self.monitor = Monitor(__name__)
+        self.prompt_tokens = self.monitor.histogram(
+            'chat_prompt_tokens', 'Estimated prompt tokens per chat turn',
+            buckets=(128, 256, 512, 1024, 2048, 4096, 8192, 16384))
+        self.dropped = self.monitor.counter(
+            'chat_context_dropped_total', 'Stored interactions left out of the prompt to stay within budget')
+
+    def budget_for(self, model: str) -> int:
+        return self.config.get(f'memory.context_budgets.{model}', self.default_budget)
+
+    def build(self, model: str, system_prompt: str, interactions: List[Dict], current_message: str,
+              max_tokens: Optional[int] = None) -> List[Dict]:
+        """Build the role/message list; interactions are newest first, as stored."""
+        used = estimate_tokens(system_prompt) + estimate_tokens(current_message)
+        reserve = self.completion_reserve if max_tokens is None else max_tokens
+        remaining = self.budget_for(model) - reserve - used
+
+        selected = []
+        for interaction in interactions:
+            tokens = interaction_tokens(interaction)
+            if tokens > remaining:
+                break
+            selected.append(interaction)
+            remaining -= tokens
+            used += tokens
+        if len(selected) < len(interactions):
+            self.dropped.inc(len(interactions) - len(selected))
+        self.prompt_tokens.observe(used)
+
+        conversation_history = [{"role": "System", "message": system_prompt}]
+        for interaction in reversed(selected):
+            conversation_history.append({"role": "User", "message": interaction['content']})
+            conversation_history.append({"role": "Chatbot", "message": interaction['response']})
+        conversation_history.append({"role": "User", "message": current_message})
+        return conversation_history
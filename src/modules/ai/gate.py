@@ -0,0 +1,66 @@
+from collections import OrderedDict
+from typing import Optional
+import discord
+from src.utils.monitor import Monitor
+
+
+class MessageGate:
+    """Decide from raw message fields whether a message is addressed to the bot.
+
+    Runs on every message the bot can see, so it never calls the API: replies are
+    recognised through a bounded record of the IDs of messages the bot sent, with
+    the referenced message delivered in the gateway payload as a fallback. Only
+    messages that pass the gate are worth building a command context for.
+    """
+
+    def __init__(self, max_sent: int = 10000):
+        self.max_sent = max_sent
+        self.monitor = Monitor(__name__)
+        self._sent: 'OrderedDict[int, None]' = OrderedDict()
+        self.decisions = self.monitor.counter(
+            'chat_gate_messages_total', 'Incoming messages by gate decision', ['decision'])
+        self.reply_lookups = self.monitor.counter(
+            'chat_gate_reply_lookups_total', 'How replies were matched to the bot\'s messages', ['result'])
+
+    def __len__(self) -> int:
+        return len(self._sent)
+
+    def record_sent(self, message_id: int):
+        """Remember a message the bot sent, dropping the oldest once max_sent are held."""
+        self._sent[message_id] = None
+        if len(self._sent) > self.max_sent:
+            self._sent.popitem(last=False)
+
+    def is_own(self, message_id: Optional[int]) -> bool:
+        return message_id is not None and message_id in self._sent
+
+    def classify(self, message: discord.Message, bot_id: int) -> Optional[str]:
+        """Why the bot should answer message ('dm', 'mention' or 'reply'), or None to ignore it."""
+        if message.author.bot:
+            if message.author.id == bot_id:
+                self.record_sent(message.id)
+            self.decisions.inc(decision='bot')
+            return None
+
+        if message.guild is None:
+            decision = 'dm'
+        elif any(user.id == bot_id for user in message.mentions):
+            decision = 'mention'
+        elif message.reference is not None and self._replies_to(message, bot_id):
+            decision = 'reply'
+        else:
+            decision = None
+        self.decisions.inc(decision=decision or 'ignored')
+        return decision
+
+    def _replies_to(self, message: discord.Message, bot_id: int) -> bool:
+        if self.is_own(message.reference.message_id):
+            self.reply_lookups.inc(result='sent_cache')
+            return True
+        # Sent before this process started (or evicted); use the copy in the payload if there is one
+        resolved = message.reference.resolved
+        if isinstance(resolved, discord.Message):
+            self.reply_lookups.inc(result='payload')
+            return resolved.author.id == bot_id
+        self.reply_lookups.inc(result='unknown')
+        return False
@@ -0,0 +1,97 @@
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+from src.utils.monitor import Monitor
+
+
+class _Entry:
+    __slots__ = ('interactions', 'expires_at')
+
+    def __init__(self, interactions: List[Dict], expires_at: float):
+        self.interactions = interactions
+        self.expires_at = expires_at
+
+
+class HistoryCache:
+    """Bounded in-process copy of recent channel histories, newest interaction first.
+
+    Entries expire `ttl` seconds after the last write, mirroring the Redis key's
+    TTL, and the least recently used channel is dropped once `max_channels` are
+    held. Each entry holds at most `limit` interactions, like the trimmed Redis list.
+    """
+
+    def __init__(self, limit: int, max_channels: int = 1024):
+        self.limit = limit
+        self.max_channels = max_channels
+        self.monitor = Monitor(__name__)
+        self._entries: 'OrderedDict[str, _Entry]' = OrderedDict()
+        self.lookups = self.monitor.counter(
+            'memory_l1_lookups_total', 'In-process history cache lookups', ['result'])
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _live(self, channel_id: str) -> Optional[_Entry]:
+        entry = self._entries.get(channel_id)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            del self._entries[channel_id]
+            return None
+        self._entries.move_to_end(channel_id)
+        return entry
+
+    def get(self, channel_id: str, limit: Optional[int] = None) -> Optional[List[Dict]]:
+        """Cached interactions for a channel, or None when it is not cached."""
+        entry = self._live(str(channel_id))
+        if entry is None:
+            self.lookups.inc(result='miss')
+            return None
+        self.lookups.inc(result='hit')
+        return entry.interactions[:limit if limit is not None else self.limit]
+
+    def __contains__(self, channel_id: str) -> bool:
+        return self._live(str(channel_id)) is not None
+
+    def length(self, channel_id: str) -> int:
+        entry = self._live(str(channel_id))
+        return len(entry.interactions) if entry is not None else 0
+
+    def put(self, channel_id: str, interactions: List[Dict], ttl: float):
+        """Replace a channel's history (newest first) with the authoritative copy."""
+        channel_id = str(channel_id)
+        self._entries[channel_id] = _Entry(list(interactions[:self.limit]), time.monotonic() + ttl)
+        self._entries.move_to_end(channel_id)
+        while len(self._entries) > self.max_channels:
+            self._entries.popitem(last=False)
+
+    def push(self, channel_id: str, interactions: Iterable[Dict], ttl: float, create: bool = False) -> Optional[List[Dict]]:
+        """Apply a write (interactions oldest first) to a cached channel and refresh its TTL.
+
+        Returns the interactions trimmed off the end, oldest first, or None when the
+        channel is not cached and `create` is false.
+        """
+        channel_id = str(channel_id)
+        entry = self._live(channel_id)
+        if entry is None:
+            if not create:
+                return None
+            self.put(channel_id, [], ttl)
+            entry = self._entries[channel_id]
+        entry.interactions[:0] = reversed(list(interactions))
+        evicted = entry.interactions[self.limit:]
+        del entry.interactions[self.limit:]
+        entry.expires_at = time.monotonic() + ttl
+        evicted.reverse()
+        return evicted
+
+    def touch(self, channel_id: str, ttl: float):
+        entry = self._live(str(channel_id))
+        if entry is not None:
+            entry.expires_at = time.monotonic() + ttl
+
+    def invalidate(self, channel_id: str):
+        self._entries.pop(str(channel_id), None)
+
+    def clear(self):
+        self._entries.clear()
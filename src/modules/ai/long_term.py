@@ -0,0 +1,405 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+import numpy as np
+from discord.ext import commands
+from src.core.config import Config
+from src.utils.monitor import Monitor
+
+DEPENDS = ('ai.short_term',)
+
+Embedder = Callable[[List[str]], Awaitable[List[List[float]]]]
+
+
+class VectorIndex:
+    """Append-only store of unit-length float32 vectors with per-row metadata.
+
+    Vectors live in a memory-mapped `<path>.f32` file that grows by doubling, and
+    metadata is appended to `<path>.jsonl`, so a restart reopens both without
+    re-embedding anything. Search is a matrix-vector product over the candidate
+    rows. Once the store passes `ivf_threshold` rows, a coarse k-means partition
+    (IVF) limits large scans to the `nprobe` partitions nearest the query.
+    `add` only updates the mapping and in-memory state; `reserve` (growing the
+    file) and `persist` (writing the new rows out) do the disk work and are meant
+    to run in a worker thread around it.
+    """
+
+    def __init__(self, path: str, initial_capacity: int = 1024, ivf_threshold: int = 50000,
+                 nprobe: int = 8, brute_force_limit: int = 20000):
+        self.path = path
+        self.initial_capacity = initial_capacity
+        self.ivf_threshold = ivf_threshold
+        self.nprobe = nprobe
+        self.brute_force_limit = brute_force_limit
+        self.dim: Optional[int] = None
+        self.count = 0
+        self.metadata: List[Dict] = []
+        self._vectors: Optional[np.memmap] = None
+        self._channel_codes: Dict[str, int] = {}
+        self._row_channels = np.zeros(0, dtype=np.int32)
+        self._channel_rows: Dict[int, List[int]] = {}
+        self._channel_rows_cache: Dict[int, np.ndarray] = {}
+        self._centroids: Optional[np.ndarray] = None
+        self._ivf_lists: List[List[int]] = []
+        self._ivf_built_at = 0
+        self._persisted = 0
+        # Held while the mapping is flushed or replaced, so a resize never races a flush
+        self._file_lock = threading.Lock()
+
+    @property
+    def _vector_path(self) -> str:
+        return f'{self.path}.f32'
+
+    @property
+    def _metadata_path(self) -> str:
+        return f'{self.path}.jsonl'
+
+    def load(self):
+        """Reopen a previously persisted index, if there is one."""
+        if not os.path.exists(self._metadata_path) or not os.path.exists(self._vector_path):
+            return
+        with open(self._metadata_path, 'r', encoding='utf-8') as f:
+            metadata = [json.loads(line) for line in f if line.strip()]
+        if not metadata:
+            return
+        self.dim = metadata[0]['dim']
+        capacity = os.path.getsize(self._vector_path) // (self.dim * 4)
+        # Metadata is written after its vectors, so it is the authoritative row count
+        self.count = min(len(metadata), capacity)
+        self.metadata = metadata[:self.count]
+        self._vectors = np.memmap(self._vector_path, dtype=np.float32, mode='r+', shape=(capacity, self.dim))
+        self._persisted = self.count
+        self._row_channels = np.zeros(capacity, dtype=np.int32)
+        for row, entry in enumerate(self.metadata):
+            self._track_channel(row, entry['channel_id'])
+        if self.needs_ivf_rebuild:
+            self.build_ivf()
+
+    def add(self, vectors: np.ndarray, metadata: List[Dict]):
+        """Append normalized vectors and their metadata; call persist to write them to disk."""
+        if len(vectors) == 0:
+            return
+        vectors = self._normalize(np.asarray(vectors, dtype=np.float32))
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        # A no-op when reserve already made room
+        self._ensure_capacity(self.count + len(vectors))
+        if len(self._row_channels) < self._vectors.shape[0]:
+            row_channels = np.zeros(self._vectors.shape[0], dtype=np.int32)
+            row_channels[:self.count] = self._row_channels[:self.count]
+            self._row_channels = row_channels
+
+        start = self.count
+        self._vectors[start:start + len(vectors)] = vectors
+        for offset, entry in enumerate(metadata):
+            row = start + offset
+            self.metadata.append(entry)
+            self._track_channel(row, entry['channel_id'])
+            if self._centroids is not None:
+                self._ivf_lists[int(np.argmax(self._centroids @ vectors[offset]))].append(row)
+        self.count += len(vectors)
+
+    def reserve(self, rows: int, dim: int):
+        """Grow the vector file to fit `rows` more rows; safe to run in a worker thread before add."""
+        if self.dim is None:
+            self.dim = dim
+        self._ensure_capacity(self.count + rows)
+
+    def persist(self):
+        """Flush rows added since the last call, vectors before their metadata; safe to run in a worker thread."""
+        with self._file_lock:
+            end = self.count
+            if end <= self._persisted:
+                return
+            self._vectors.flush()
+            with open(self._metadata_path, 'a', encoding='utf-8') as f:
+                for entry in self.metadata[self._persisted:end]:
+                    f.write(json.dumps({**entry, 'dim': self.dim}) + '\n')
+            self._persisted = end
+
+    def has_channel(self, channel_id: str) -> bool:
+        return channel_id in self._channel_codes
+
+    def search(self, query: np.ndarray, k: int = 5, channel_id: Optional[str] = None) -> List[Tuple[float, Dict]]:
+        """Return up to k (cosine similarity, metadata) pairs, best first."""
+        if self.count == 0 or k <= 0:
+            return []
+        query = self._normalize(np.asarray(query, dtype=np.float32).reshape(1, -1))[0]
+
+        if channel_id is not None:
+            code = self._channel_codes.get(channel_id)
+            if code is None:
+                return []
+            rows = self._rows_for_channel(code)
+            if len(rows) > self.brute_force_limit and self._centroids is not None:
+                candidates = self._probe(query)
+                rows = candidates[self._row_channels[candidates] == code]
+        elif self._centroids is not None:
+            rows = self._probe(query)
+        else:
+            rows = None
+
+        if rows is None:
+            scores = self._vectors[:self.count] @ query
+            row_ids = None
+        else:
+            if len(rows) == 0:
+                return []
+            scores = self._vectors[rows] @ query
+            row_ids = rows
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            (float(scores[i]), self.metadata[int(row_ids[i]) if row_ids is not None else int(i)])
+            for i in top
+        ]
+
+    @property
+    def needs_ivf_rebuild(self) -> bool:
+        """True once the store passes the threshold, and again each time it doubles."""
+        return self.count >= self.ivf_threshold and self.count >= 2 * max(self._ivf_built_at, self.ivf_threshold // 2)
+
+    def build_ivf(self):
+        """Build and install the coarse partition synchronously."""
+        n = self.count
+        centroids, lists = self.compute_ivf(n)
+        self.install_ivf(centroids, lists, n)
+
+    def compute_ivf(self, n: int, iterations: int = 10, points_per_list: int = 64):
+        """Spherical k-means over a sample of the first n vectors; safe to run in a worker thread."""
+        vectors = self._vectors
+        nlist = max(1, int(np.sqrt(n)))
+        rng = np.random.default_rng(0)
+        sample_size = min(n, nlist * points_per_list)
+        sample = np.asarray(vectors[np.sort(rng.choice(n, size=sample_size, replace=False))])
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            # Sum members per cluster in one sorted pass instead of masking the sample per cluster
+            order = np.argsort(assignment, kind='stable')
+            counts = np.bincount(assignment, minlength=nlist)
+            occupied = np.flatnonzero(counts)
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[occupied]
+            centroids[occupied] = np.add.reduceat(sample[order], starts, axis=0)
+            centroids = self._normalize(centroids)
+
+        chunk = 65536
+        assignment = np.concatenate([
+            np.argmax(vectors[start:min(n, start + chunk)] @ centroids.T, axis=1)
+            for start in range(0, n, chunk)
+        ])
+        order = np.argsort(assignment, kind='stable')
+        boundaries = np.cumsum(np.bincount(assignment, minlength=nlist))[:-1]
+        lists: List[List[int]] = [rows.tolist() for rows in np.split(order, boundaries)]
+        return centroids, lists
+
+    def install_ivf(self, centroids: np.ndarray, lists: List[List[int]], built_at: int):
+        """Swap in a computed partition, assigning rows appended since it was computed."""
+        for row in range(built_at, self.count):
+            lists[int(np.argmax(centroids @ self._vectors[row]))].append(row)
+        self._centroids = centroids
+        self._ivf_lists = lists
+        self._ivf_built_at = built_at
+
+    def _probe(self, query: np.ndarray) -> np.ndarray:
+        nprobe = min(self.nprobe, len(self._centroids))
+        nearest = np.argpartition(-(self._centroids @ query), nprobe - 1)[:nprobe]
+        return np.fromiter((row for cluster in nearest for row in self._ivf_lists[cluster]), dtype=np.int64)
+
+    def _track_channel(self, row: int, channel_id: str):
+        code = self._channel_codes.setdefault(channel_id, len(self._channel_codes))
+        self._row_channels[row] = code
+        self._channel_rows.setdefault(code, []).append(row)
+        self._channel_rows_cache.pop(code, None)
+
+    def _rows_for_channel(self, code: int) -> np.ndarray:
+        rows = self._channel_rows_cache.get(code)
+        if rows is None:
+            rows = self._channel_rows_cache[code] = np.asarray(self._channel_rows.get(code, []), dtype=np.int64)
+        return rows
+
+    def _ensure_capacity(self, needed: int):
+        capacity = 0 if self._vectors is None else self._vectors.shape[0]
+        if needed <= capacity:
+            return
+        new_capacity = max(self.initial_capacity, capacity)
+        while new_capacity < needed:
+            new_capacity *= 2
+
+        os.makedirs(os.path.dirname(self._vector_path) or '.', exist_ok=True)
+        with self._file_lock:
+            if self._vectors is not None:
+                self._vectors.flush()
+                del self._vectors
+            with open(self._vector_path, 'ab') as f:
+                f.truncate(new_capacity * self.dim * 4)
+            # Searches that already hold the old mapping keep reading it; it maps the same file
+            self._vectors = np.memmap(self._vector_path, dtype=np.float32, mode='r+', shape=(new_capacity, self.dim))
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+
+class LongTermMemory:
+    """Embeds interactions as they are stored and retrieves the relevant ones later.
+
+    Archived interactions are queued and embedded in batches of up to `batch_size`,
+    flushed at the latest `flush_interval` seconds after the first one was queued.
+    A batch that fails to embed goes back on the queue, which holds at most
+    `max_pending` interactions.
+    """
+
+    def __init__(self, config: Config, monitor: Monitor, embedder: Embedder):
+        self.config = config
+        self.monitor = monitor
+        self.embedder = embedder
+        self.batch_size = config.get('memory.long_term.batch_size', 64)
+        self.flush_interval = config.get('memory.long_term.flush_interval', 5.0)
+        self.top_k = config.get('memory.long_term.top_k', 3)
+        self.min_score = config.get('memory.long_term.min_score', 0.3)
+        self.max_pending = config.get('memory.long_term.max_pending', 10 * self.batch_size)
+        self.index = VectorIndex(
+            config.get('memory.long_term.path', 'data/memory/long_term'),
+            ivf_threshold=config.get('memory.long_term.ivf_threshold', 50000),
+            nprobe=config.get('memory.long_term.nprobe', 8)
+        )
+        self._pending: List[Tuple[str, Dict]] = []
+        self._flush_now = asyncio.Event()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._rebuilding = False
+        self.search_latency = self.monitor.histogram(
+            'memory_long_term_search_seconds', 'Vector search latency for long-term memory retrieval')
+        self.archived = self.monitor.counter(
+            'memory_long_term_archived_total', 'Interactions embedded into long-term memory')
+
+    async def setup(self):
+        """Load the persisted index off the event loop."""
+        if self.index.dim is None:
+            await asyncio.to_thread(self.index.load)
+            self.monitor.log_info(f"Long-term memory loaded with {self.index.count} vectors")
+
+    def archive(self, channel_id: str, interactions: List[Dict]):
+        """Queue interactions for embedding; returns immediately."""
+        if not interactions:
+            return
+        self._pending.extend((channel_id, interaction) for interaction in interactions)
+        self._trim_pending()
+        if len(self._pending) >= self.batch_size:
+            self._flush_now.set()
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_when_ready())
+
+    async def retrieve(self, channel_id: str, query: str, k: Optional[int] = None) -> List[Dict]:
+        """Return the stored interactions most similar to query, limited to this channel."""
+        if not self.index.has_channel(channel_id):
+            # Nothing to find, so don't pay for embedding the query
+            return []
+        try:
+            [vector] = await self.embedder([query])
+            with self.search_latency.time():
+                results = self.index.search(np.asarray(vector, dtype=np.float32), k or self.top_k, channel_id)
+            return [entry for score, entry in results if score >= self.min_score]
+        except Exception as e:
+            self.monitor.log_error(f"Error retrieving long-term memories: {e}")
+            return []
+
+    async def flush(self):
+        """Embed and store everything queued so far."""
+        while self._pending:
+            batch, self._pending = self._pending[:self.batch_size], self._pending[self.batch_size:]
+            texts = [f"User: {interaction['content']}\nAssistant: {interaction['response']}" for _, interaction in batch]
+            try:
+                vectors = await self.embedder(texts)
+            except Exception as e:
+                self.monitor.log_error(f"Error embedding interactions for long-term memory: {e}")
+                # Retried on the next flush
+                self._pending[:0] = batch
+                self._trim_pending()
+                return
+            metadata = [
+                {
+                    'channel_id': channel_id,
+                    'content': interaction['content'],
+                    'response': interaction['response'],
+                    'timestamp': interaction.get('timestamp', time.time())
+                }
+                for channel_id, interaction in batch
+            ]
+            # Appends are small and stay on the loop so searches never see a half-grown index;
+            # the disk work around them doesn't
+            await asyncio.to_thread(self.index.reserve, len(vectors), len(vectors[0]))
+            self.index.add(np.asarray(vectors, dtype=np.float32), metadata)
+            await asyncio.to_thread(self.index.persist)
+            self.archived.inc(len(batch))
+
+    def _trim_pending(self):
+        dropped = len(self._pending) - self.max_pending
+        if dropped > 0:
+            del self._pending[:dropped]
+            self.monitor.log_warning(f"Long-term memory queue full; dropped {dropped} oldest interaction(s)")
+
+    async def close(self):
+        """Embed whatever is still queued before shutting down."""
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_now.set()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+        await self.flush()
+
+    async def _flush_when_ready(self):
+        try:
+            await asyncio.wait_for(self._flush_now.wait(), timeout=self.flush_interval)
+        except asyncio.TimeoutError:
+            pass
+        self._flush_now.clear()
+        await self.flush()
+        if self.index.needs_ivf_rebuild and not self._rebuilding:
+            self._rebuilding = True
+            try:
+                n = self.index.count
+                centroids, lists = await asyncio.to_thread(self.index.compute_ivf, n)
+                self.index.install_ivf(centroids, lists, n)
+                self.monitor.log_info(f"Rebuilt long-term memory partitions over {n} vectors")
+            finally:
+                self._rebuilding = False
+
+async def setup(bot: commands.Bot):
+    """Create the shared LongTermMemory and attach it to the bot; None unless memory.long_term.enabled."""
+    existing = getattr(bot, 'long_term_memory', None)
+    if existing is not None:
+        return existing
+    config = bot.config
+    if not config.get('memory.long_term.enabled', False):
+        return None
+    from src.clients.embeddings import EmbeddingService
+    from src.clients.openai import OpenAIClient
+    from src.utils.module_loader import prewarm
+
+    # The OpenAI SDK is slow to import and only needed for the first embedding
+    prewarm('openai')
+    embedding_service = getattr(bot, 'embedding_service', None)
+    if embedding_service is None:
+        short_term_memory = getattr(bot, 'short_term_memory', None)
+        embedding_client = OpenAIClient()
+        embedding_service = EmbeddingService(
+            embedding_client.embed_texts,
+            model=config.openai.embedding_model,
+            max_batch_size=config.get('embeddings.max_batch_size', 96),
+            max_wait=config.get('embeddings.max_wait', 0.02),
+            cache_size=config.get('embeddings.cache_size', 10000),
+            redis_client=short_term_memory.redis if short_term_memory and config.get('embeddings.redis_cache', True) else None,
+            redis_ttl=config.get('embeddings.redis_ttl', 7 * 24 * 3600)
+        )
+        # Shared so every embedding caller batches and caches together
+        bot.embedding_service = embedding_service
+    long_term_memory = LongTermMemory(config, Monitor(__name__), embedding_service.embed)
+    await long_term_memory.setup()
+    bot.long_term_memory = long_term_memory
+    return long_term_memory
@@ -0,0 +1,129 @@
+import re
+from typing import Any, Dict, Optional, Tuple
+from src.core.config import Config
+from src.utils.monitor import Monitor
+
+TIERS = ('light', 'standard', 'heavy')
+
+# Output caps per tier; 'standard' matches what every turn used before tiers existed
+DEFAULT_MAX_TOKENS = {'light': 100, 'standard': 150, 'heavy': 400}
+
+# Fenced or inline code, or lines that look like source code
+CODE_PATTERN = re.compile(
+    r"```|`[^`\n]+`|[{};]\s*$|^\s*(def|class|import|from|function|const|let|var|return|#include)\b", re.MULTILINE)
+
+REPLY_CHAR_BUCKETS = (50, 100, 200, 400, 800, 1200, 1600, 2000, 3000, 4000)
+
+
+class Decision:
+    def __init__(self, tier: str, reason: str, model: str, max_tokens: int, temperature: float):
+        self.tier = tier
+        self.reason = reason
+        self.model = model
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+
+    def __repr__(self) -> str:
+        return (f"Decision(tier={self.tier!r}, reason={self.reason!r}, model={self.model!r}, "
+                f"max_tokens={self.max_tokens}, temperature={self.temperature})")
+
+
+class ReplyPolicy:
+    """Pick a model tier and output cap for each chat turn from cheap features of the turn.
+
+    Attachments, code and long messages go to the 'heavy' tier; short one-line
+    messages in shallow conversations go to 'light'; everything else is
+    'standard'. Each tier has its own model, max_tokens and temperature under
+    [policy.tiers.<tier>], and [policy.guild_overrides.<guild_id>] can clamp a
+    guild with min_tier/max_tier or change its tiers' settings. Resolved tier
+    settings are cached until the config is reloaded. Decisions, LLM latency and
+    reply length are exported per tier, so the thresholds can be tuned against
+    real traffic.
+    """
+
+    def __init__(self, config: Config, monitor: Optional[Monitor] = None):
+        self.config = config
+        self.monitor = monitor or Monitor(__name__)
+        self.enabled = config.get('policy.enabled', True)
+        self.light_chars = config.get('policy.light_chars', 60)
+        self.heavy_chars = config.get('policy.heavy_chars', 400)
+        # Past this many turns of history a short message is usually a follow-up that needs context
+        self.deep_history = config.get('policy.deep_history', 8)
+        self.dm_min_tier = config.get('policy.dm_min_tier', 'light')
+        self._settings: Dict[Tuple[str, Optional[int]], Tuple[str, int, float]] = {}
+        self._config_version: Optional[int] = None
+        self.decisions = self.monitor.counter(
+            'chat_policy_decisions_total', 'Reply policy decisions by tier and the rule that chose it',
+            ['tier', 'reason', 'channel_type'])
+        self.latency = self.monitor.histogram(
+            'chat_policy_llm_seconds', 'LLM time per chat turn by reply policy tier', ['tier', 'model', 'outcome'])
+        self.reply_chars = self.monitor.histogram(
+            'chat_policy_reply_chars', 'Reply length per chat turn by reply policy tier', ['tier'],
+            buckets=REPLY_CHAR_BUCKETS)
+
+    def classify(self, message: str, history_turns: int = 0, attachments: int = 0) -> Tuple[str, str]:
+        """(tier, reason) for a turn, before DM and guild clamping."""
+        if attachments:
+            return 'heavy', 'attachments'
+        if CODE_PATTERN.search(message):
+            return 'heavy', 'code'
+        if len(message) >= self.heavy_chars:
+            return 'heavy', 'long'
+        if len(message) <= self.light_chars and '\n' not in message.strip():
+            if history_turns >= self.deep_history:
+                return 'standard', 'deep_history'
+            return 'light', 'short'
+        return 'standard', 'default'
+
+    def decide(self, message: str, history_turns: int = 0, is_dm: bool = False,
+               guild_id: Optional[int] = None, attachments: int = 0) -> Decision:
+        override = None if is_dm else self._guild_override(guild_id)
+        if not self.enabled:
+            tier, reason = 'standard', 'disabled'
+        else:
+            tier, reason = self.classify(message, history_turns, attachments)
+            floor = self.dm_min_tier if is_dm else self._override_value(override, 'min_tier')
+            ceiling = None if is_dm else self._override_value(override, 'max_tier')
+            if floor in TIERS and TIERS.index(tier) < TIERS.index(floor):
+                tier, reason = floor, 'dm_min_tier' if is_dm else 'guild_min_tier'
+            if ceiling in TIERS and TIERS.index(tier) > TIERS.index(ceiling):
+                tier, reason = ceiling, 'guild_max_tier'
+        # Guilds without overrides share the default settings
+        model, max_tokens, temperature = self._tier_settings(tier, guild_id if override is not None else None)
+        self.decisions.inc(tier=tier, reason=reason, channel_type='dm' if is_dm else 'guild')
+        decision = Decision(tier, reason, model, max_tokens, temperature)
+        self.monitor.log_debug("Reply policy for %d-char message with %d turn(s) of history: %s",
+                               len(message), history_turns, decision)
+        return decision
+
+    def observe_reply(self, decision: Decision, content: str):
+        self.reply_chars.observe(len(content), tier=decision.tier)
+
+    def _guild_override(self, guild_id: Optional[int]) -> Any:
+        if guild_id is None:
+            return None
+        return self.config.get(f'policy.guild_overrides.{guild_id}')
+
+    @staticmethod
+    def _override_value(override: Any, name: str) -> Any:
+        return getattr(override, name, None) if override is not None else None
+
+    def _tier_settings(self, tier: str, guild_id: Optional[int]) -> Tuple[str, int, float]:
+        if self._config_version != self.config.version:
+            self._settings.clear()
+            self._config_version = self.config.version
+        key = (tier, guild_id)
+        settings = self._settings.get(key)
+        if settings is None:
+            defaults = (
+                self.config.get('cohere.model'),
+                self.config.get('cohere.max_tokens', 150) if tier == 'standard' else DEFAULT_MAX_TOKENS[tier],
+                self.config.get('cohere.temperature', 0.7),
+            )
+            names = ('model', 'max_tokens', 'temperature')
+            base = [self.config.get(f'policy.tiers.{tier}.{name}', default) for name, default in zip(names, defaults)]
+            if guild_id is not None:
+                base = [self.config.get(f'policy.guild_overrides.{guild_id}.tiers.{tier}.{name}', value)
+                        for name, value in zip(names, base)]
+            settings = self._settings[key] = (base[0], int(base[1]), float(base[2]))
+        return settings
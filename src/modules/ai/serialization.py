@@ -0,0 +1,102 @@
+import json
+import struct
+import time
+import zlib
+from abc import ABC, abstractmethod
+from typing import Dict
+
+# First byte of every binary record; JSON records always start with '{'
+BINARY_MAGIC = 0xC1
+SCHEMA_VERSION = 1
+FLAG_COMPRESSED = 0x01
+
+# timestamp, tokens, content length, response length
+_HEADER = struct.Struct('<dIII')
+_PREFIX = struct.Struct('<BBB')
+
+
+class InteractionSerializer(ABC):
+    """Encodes interaction records for Redis. decode() reads every format this module has written."""
+
+    @abstractmethod
+    def encode(self, interaction: Dict) -> bytes:
+        pass
+
+    def decode(self, raw: bytes) -> Dict:
+        if raw[:1] == b'{':
+            return _decode_json(raw)
+        return _decode_binary(raw)
+
+
+class JSONSerializer(InteractionSerializer):
+    """The original JSON format, minus the constant 'user' field."""
+
+    def encode(self, interaction: Dict) -> bytes:
+        return json.dumps({key: value for key, value in interaction.items() if key != 'user'}).encode('utf-8')
+
+
+class BinarySerializer(InteractionSerializer):
+    """Versioned binary layout: magic, version, flags, fixed header, then UTF-8 text.
+
+    Bodies of at least `compress_threshold` bytes are zlib-compressed when that
+    makes them smaller.
+    """
+
+    def __init__(self, compress_threshold: int = 512, compression_level: int = 6):
+        self.compress_threshold = compress_threshold
+        self.compression_level = compression_level
+
+    def encode(self, interaction: Dict) -> bytes:
+        content = interaction['content'].encode('utf-8')
+        response = interaction['response'].encode('utf-8')
+        body = _HEADER.pack(
+            float(interaction.get('timestamp', time.time())),
+            int(interaction.get('tokens') or 0),
+            len(content),
+            len(response)
+        ) + content + response
+
+        flags = 0
+        if len(body) >= self.compress_threshold:
+            compressed = zlib.compress(body, self.compression_level)
+            if len(compressed) < len(body):
+                body = compressed
+                flags |= FLAG_COMPRESSED
+        return _PREFIX.pack(BINARY_MAGIC, SCHEMA_VERSION, flags) + body
+
+
+def _decode_json(raw: bytes) -> Dict:
+    interaction = json.loads(raw.decode('utf-8'))
+    interaction.pop('user', None)
+    return interaction
+
+
+def _decode_binary(raw: bytes) -> Dict:
+    magic, version, flags = _PREFIX.unpack_from(raw)
+    if magic != BINARY_MAGIC:
+        raise ValueError(f"Unrecognized interaction record (first byte {magic:#x})")
+    if version != SCHEMA_VERSION:
+        raise ValueError(f"Unsupported interaction schema version {version}")
+
+    body = raw[_PREFIX.size:]
+    if flags & FLAG_COMPRESSED:
+        body = zlib.decompress(body)
+    timestamp, tokens, content_length, response_length = _HEADER.unpack_from(body)
+    offset = _HEADER.size
+    content = body[offset:offset + content_length].decode('utf-8')
+    offset += content_length
+    response = body[offset:offset + response_length].decode('utf-8')
+
+    interaction = {'content': content, 'response': response, 'timestamp': timestamp}
+    if tokens:
+        interaction['tokens'] = tokens
+    return interaction
+
+
+def get_serializer(name: str = 'binary', compress_threshold: int = 512) -> InteractionSerializer:
+    """Serializer for memory.serializer ('binary' or 'json')."""
+    if name == 'binary':
+        return BinarySerializer(compress_threshold)
+    if name == 'json':
+        return JSONSerializer()
+    raise ValueError(f"Unknown interaction serializer: {name}")
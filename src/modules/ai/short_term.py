@@ -1,51 +1,171 @@
+import asyncio
+import json
 import redis.asyncio as redis
 from discord.ext import commands
 from src.core.config import Config
+from src.modules.ai.context import estimate_tokens
+from src.modules.ai.history_cache import HistoryCache
+from src.modules.ai.serialization import get_serializer
 from src.utils.monitor import Monitor
-import json
+from src.utils.redis_pool import get_redis
 import time
-from typing import List, Dict, Optional
-import asyncio
+from typing import Awaitable, Callable, Iterable, List, Dict, Optional, Tuple
+
+DEPENDS = ()
+
+# Sorted set of recently written channels, scored by last write time
+ACTIVE_CHANNELS_KEY = 'channels:active'
 
 class ShortTermMemory:
-    """Class for managing short-term conversation state using Redis."""
+    """Class for managing short-term conversation state using Redis.
+
+    Recent histories are also kept in an in-process, write-through HistoryCache
+    that is read before Redis (memory.l1_cache). When other instances write to the
+    same channels, memory.l1_invalidation makes Redis keyspace notifications evict
+    entries those instances change; it is on by default with cluster.enabled, and
+    the cache is otherwise only safe for a single instance. With
+    memory.backend = "embedded", the in-process cache is the only store and no
+    Redis is used.
+    """
 
     def __init__(self, config: Config, monitor: Monitor):
         self.config = config
         self.monitor = monitor
         self.redis: Optional[redis.Redis] = None
         self.short_term_limit = self.config.memory.short_term_limit
+        self.embedded = self.config.get('memory.backend', 'redis') == 'embedded'
+        self.cache: Optional[HistoryCache] = None
+        if self.embedded or self.config.get('memory.l1_cache', True):
+            self.cache = HistoryCache(self.short_term_limit, self.config.get('memory.l1_max_channels', 1024))
+        self.clustered = self.config.get('cluster.enabled', False)
+        self.invalidation = not self.embedded and self.config.get('memory.l1_invalidation', self.clustered)
+        # LPUSH notifications still expected for our own writes, by key
+        self._own_writes: Dict[str, int] = {}
+        self._watcher: Optional[asyncio.Task] = None
+        # Channel ID -> (monotonic expiry, summary or None); kept alongside the history cache
+        self._summaries: Dict[str, Tuple[float, Optional[Dict]]] = {}
         self.server_ttl = 600  # 10 minutes in seconds
         self.dm_ttl = 5400  # 1.5 hours in seconds
+        # Writes use the configured format; reads accept binary and legacy JSON records alike
+        self.serializer = get_serializer(
+            self.config.get('memory.serializer', 'binary'),
+            compress_threshold=self.config.get('memory.compress_threshold', 512))
+        # Called with (channel_id, count, before) to backfill an empty history, oldest interaction first
+        self.history_source: Optional[Callable[[str, int, Optional[object]], Awaitable[List[Dict]]]] = None
+        # Remember the most recently written channels so they can be warmed after a restart
+        self.active_channels_max = self.config.get('memory.warmup.track_channels', 1000) \
+            if self.config.get('memory.warmup.startup_channels', 0) else 0
+        self.op_latency = self.monitor.histogram(
+            'memory_redis_seconds', 'Latency of short-term memory Redis operations', ['op', 'outcome'])
+        self.decode_errors = self.monitor.counter(
+            'memory_decode_errors_total', 'Short-term memory records skipped because they could not be decoded')
 
     async def setup(self):
         """Initialize the Redis connection."""
+        if self.embedded:
+            self.monitor.log_info(f"ShortTermMemory running embedded without Redis. Short-term limit: {self.short_term_limit}")
+            return
+        if self.redis is not None:
+            return
         try:
-            self.redis = await redis.from_url(self.config.redis.url)
+            self.redis = get_redis(self.config.redis.url, self.config.get('redis.max_connections', 32))
+            if self.invalidation and self.cache is not None:
+                await self._enable_keyspace_events()
+                self._watcher = asyncio.create_task(self._watch_invalidations())
+            elif self.cache is not None and self.clustered:
+                self.monitor.log_warning(
+                    "memory.l1_cache is on without memory.l1_invalidation in a cluster; "
+                    "other workers' writes won't evict cached histories, so replies may use stale history")
             self.monitor.log_info(f"ShortTermMemory Redis connection established successfully. Short-term limit: {self.short_term_limit}")
         except Exception as e:
+            self.redis = None
             self.monitor.log_error(f"Error setting up Redis connection: {e}")
             raise
 
+    async def close(self):
+        """Stop listening for invalidations."""
+        if self._watcher is not None:
+            self._watcher.cancel()
+            try:
+                await self._watcher
+            except asyncio.CancelledError:
+                pass
+            self._watcher = None
+
+    @staticmethod
+    def _key(channel_id: str) -> str:
+        return f'channel:{channel_id}:interactions'
+
+    @staticmethod
+    def _summary_key(channel_id: str) -> str:
+        return f'channel:{channel_id}:summary'
+
+    def _ttl(self, is_dm: bool) -> int:
+        return self.dm_ttl if is_dm else self.server_ttl
+
+    @staticmethod
+    def make_interaction(user_message: str, ai_response: str, timestamp: Optional[float] = None) -> Dict:
+        """Build an interaction record in the stored format, token count included."""
+        return {
+            'content': user_message,
+            'response': ai_response,
+            'timestamp': timestamp if timestamp is not None else time.time(),
+            'tokens': estimate_tokens(user_message) + estimate_tokens(ai_response)
+        }
+
     async def store_interaction(self, channel_id: str, user_message: str, ai_response: str, is_dm: bool):
         """Store a new interaction in the short-term memory."""
+        await self.store_interactions(channel_id, [self.make_interaction(user_message, ai_response)], is_dm)
+
+    async def store_interactions(self, channel_id: str, interactions: Iterable[Dict], is_dm: bool):
+        """Append interactions (oldest first), trim and refresh the TTL in a single atomic round trip."""
+        key = self._key(channel_id)
+        cache = self.cache
+        own_write = False
         try:
-            interaction = {
-                'user': 'User',
-                'content': user_message,
-                'response': ai_response,
-                'timestamp': time.time()
-            }
-            key = f'channel:{channel_id}:interactions'
-            await self.redis.lpush(key, json.dumps(interaction))
-            await self.redis.ltrim(key, 0, self.short_term_limit - 1)
-            
+            interactions = list(interactions)
+            if not interactions:
+                return
             # Set TTL based on whether it's a DM or server channel
-            ttl = self.dm_ttl if is_dm else self.server_ttl
-            await self.redis.expire(key, ttl)
-            
-            self.monitor.log_info(f"Stored interaction for channel {channel_id} with TTL {ttl} seconds")
+            ttl = self._ttl(is_dm)
+            if self.embedded:
+                self.cache.push(channel_id, interactions, ttl, create=True)
+                self._touch_summary(channel_id, ttl)
+                return
+
+            encoded = [self.serializer.encode(interaction) for interaction in interactions]
+            # A cached channel is updated in place; otherwise read the list back to populate the cache
+            cached = cache is not None and channel_id in cache
+            if self._watcher is not None:
+                self._own_writes[key] = self._own_writes.get(key, 0) + 1
+                own_write = True
+            with self.op_latency.time(op='store'):
+                async with self.redis.pipeline(transaction=True) as pipe:
+                    pipe.lpush(key, *encoded)
+                    pipe.ltrim(key, 0, self.short_term_limit - 1)
+                    pipe.expire(key, ttl)
+                    # The summary lives as long as the turns it precedes
+                    pipe.expire(self._summary_key(channel_id), ttl)
+                    if self.active_channels_max:
+                        pipe.zadd(ACTIVE_CHANNELS_KEY, {channel_id: time.time()})
+                        pipe.zremrangebyrank(ACTIVE_CHANNELS_KEY, 0, -self.active_channels_max - 1)
+                    if cache is not None and not cached:
+                        pipe.lrange(key, 0, self.short_term_limit - 1)
+                    results = await pipe.execute()
+
+            self._touch_summary(channel_id, ttl)
+            if cache is not None:
+                if cached:
+                    cache.push(channel_id, interactions, ttl)
+                else:
+                    cache.put(channel_id, self._decode(channel_id, results[-1]), ttl)
+
+            self.monitor.log_info(f"Stored {len(encoded)} interaction(s) for channel {channel_id} with TTL {ttl} seconds")
         except Exception as e:
+            if cache is not None:
+                cache.invalidate(channel_id)
+            if own_write:
+                self._forget_own_write(key)
             self.monitor.log_error(f"Error storing interaction: {e}")
 
     async def get_recent_interactions(self, channel_id: str, limit: Optional[int] = None) -> List[Dict]:
@@ -53,50 +173,222 @@ class ShortTermMemory:
         try:
             if limit is None:
                 limit = self.short_term_limit
-            key = f'channel:{channel_id}:interactions'
-            interactions = await self.redis.lrange(key, 0, limit - 1)
-            return [json.loads(interaction.decode('utf-8')) for interaction in interactions]
+            cache = self.cache
+            if cache is not None:
+                cached = cache.get(channel_id, limit)
+                if cached is not None or self.embedded:
+                    return cached or []
+            with self.op_latency.time(op='get'):
+                interactions = await self.redis.lrange(self._key(channel_id), 0, max(limit, self.short_term_limit) - 1)
+            decoded = self._decode(channel_id, interactions)
+            self._cache_loaded(channel_id, decoded)
+            return decoded[:limit]
         except Exception as e:
             self.monitor.log_error(f"Error retrieving interactions: {e}")
             return []
 
-    async def fetch_and_fill_buffer(self, channel_id: str, is_dm: bool):
-        """Asynchronously fetch and fill the short-term buffer for a channel."""
+    async def get_recent_interactions_many(self, channel_ids: Iterable[str], limit: Optional[int] = None) -> Dict[str, List[Dict]]:
+        """Retrieve recent interactions for several channels in one round trip."""
+        channel_ids = list(channel_ids)
         try:
-            key = f'channel:{channel_id}:interactions'
-            current_size = await self.redis.llen(key)
+            if limit is None:
+                limit = self.short_term_limit
+            found = {}
+            cache = self.cache
+            if cache is not None:
+                for channel_id in channel_ids:
+                    cached = cache.get(channel_id, limit)
+                    if cached is not None or self.embedded:
+                        found[channel_id] = cached or []
+            missing = [channel_id for channel_id in channel_ids if channel_id not in found]
+            if missing:
+                with self.op_latency.time(op='get_many'):
+                    async with self.redis.pipeline(transaction=False) as pipe:
+                        for channel_id in missing:
+                            pipe.lrange(self._key(channel_id), 0, max(limit, self.short_term_limit) - 1)
+                        results = await pipe.execute()
+                for channel_id, interactions in zip(missing, results):
+                    decoded = self._decode(channel_id, interactions)
+                    self._cache_loaded(channel_id, decoded)
+                    found[channel_id] = decoded[:limit]
+            return {channel_id: found[channel_id] for channel_id in channel_ids}
+        except Exception as e:
+            self.monitor.log_error(f"Error retrieving interactions: {e}")
+            return {channel_id: [] for channel_id in channel_ids}
 
-            if current_size < self.short_term_limit:
-                # Fetch more interactions to fill the buffer
-                # This is a placeholder - you would implement the actual fetching logic here
-                new_interactions = await self._fetch_more_interactions(channel_id, self.short_term_limit - current_size)
+    def _decode(self, channel_id: str, records: Iterable[bytes]) -> List[Dict]:
+        """Decode records one at a time, so a corrupt one costs only itself and not the channel's history."""
+        decoded = []
+        for raw in records:
+            try:
+                decoded.append(self.serializer.decode(raw))
+            except Exception as e:
+                self.decode_errors.inc()
+                self.monitor.log_warning(f"Skipping undecodable interaction in channel {channel_id}: {e}")
+        return decoded
 
-                if new_interactions:
-                    # Add new interactions to the buffer
-                    for interaction in new_interactions:
-                        await self.store_interaction(channel_id, interaction['content'], interaction['response'], is_dm)
+    def _cache_loaded(self, channel_id: str, interactions: List[Dict]):
+        """Cache a full list read from Redis. The key's remaining TTL is unknown, so use the shorter one."""
+        cache = self.cache
+        if cache is not None and interactions:
+            cache.put(channel_id, interactions, min(self.server_ttl, self.dm_ttl))
 
-            # Refresh TTL
-            ttl = self.dm_ttl if is_dm else self.server_ttl
-            await self.redis.expire(key, ttl)
+    async def get_summary(self, channel_id: str) -> Optional[Dict]:
+        """The channel's conversation summary ({'text', 'until', 'turns'}), or None."""
+        entry = self._summaries.get(channel_id)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+        if self.embedded:
+            return None
+        try:
+            with self.op_latency.time(op='get_summary'):
+                raw = await self.redis.get(self._summary_key(channel_id))
+            summary = json.loads(raw) if raw else None
+            if self.cache is not None:
+                self._cache_summary(channel_id, summary, min(self.server_ttl, self.dm_ttl))
+            return summary
+        except Exception as e:
+            self.monitor.log_error(f"Error retrieving summary: {e}")
+            return None
 
-            self.monitor.log_info(f"Fetched and filled buffer for channel {channel_id}")
+    async def store_summary(self, channel_id: str, summary: Dict, is_dm: bool):
+        """Replace the channel's conversation summary."""
+        ttl = self._ttl(is_dm)
+        try:
+            if not self.embedded:
+                with self.op_latency.time(op='store_summary'):
+                    await self.redis.set(self._summary_key(channel_id), json.dumps(summary), ex=ttl)
+            if self.cache is not None:
+                self._cache_summary(channel_id, summary, ttl)
+        except Exception as e:
+            self._summaries.pop(channel_id, None)
+            self.monitor.log_error(f"Error storing summary: {e}")
+
+    def _cache_summary(self, channel_id: str, summary: Optional[Dict], ttl: float):
+        self._summaries.pop(channel_id, None)
+        if len(self._summaries) >= self.cache.max_channels:
+            del self._summaries[next(iter(self._summaries))]
+        self._summaries[channel_id] = (time.monotonic() + ttl, summary)
+
+    def _touch_summary(self, channel_id: str, ttl: float):
+        entry = self._summaries.get(channel_id)
+        if entry is not None and entry[1] is not None and entry[0] > time.monotonic():
+            self._summaries[channel_id] = (time.monotonic() + ttl, entry[1])
+
+    async def fetch_and_fill_buffer(self, channel_id: str, is_dm: bool, before: Optional[object] = None) -> int:
+        """Backfill an empty channel history from history_source; returns the number of interactions added.
+
+        Only empty histories are filled: a list that already has entries was written
+        within its TTL and older records could not be merged in without duplicates.
+        A marker key makes sure one instance does the backfill per TTL period.
+        """
+        try:
+            key = self._key(channel_id)
+            if self.embedded:
+                current_size = self.cache.length(channel_id)
+            else:
+                current_size = await self.redis.llen(key)
+
+            new_interactions = []
+            if current_size == 0 and await self._claim_backfill(channel_id, is_dm):
+                new_interactions = await self._fetch_more_interactions(channel_id, self.short_term_limit, before)
+
+            if new_interactions:
+                # Adds the whole batch and refreshes the TTL in one round trip
+                await self.store_interactions(channel_id, new_interactions, is_dm)
+            elif current_size:
+                if self.cache is not None:
+                    self.cache.touch(channel_id, self._ttl(is_dm))
+                if not self.embedded:
+                    await self.redis.expire(key, self._ttl(is_dm))
+
+            self.monitor.log_info(f"Fetched and filled buffer for channel {channel_id}: {len(new_interactions)} interaction(s) added")
+            return len(new_interactions)
         except Exception as e:
             self.monitor.log_error(f"Error fetching and filling buffer: {e}")
+            return 0
+
+    async def _claim_backfill(self, channel_id: str, is_dm: bool) -> bool:
+        if self.embedded:
+            return True
+        return bool(await self.redis.set(f'channel:{channel_id}:backfilled', 1, nx=True, ex=self._ttl(is_dm)))
 
-    async def _fetch_more_interactions(self, channel_id: str, count: int) -> List[Dict]:
-        """Fetch more interactions from the channel history."""
-        # This is a placeholder method. In a real implementation, you would:
-        # 1. Use the Discord API to fetch recent messages from the channel
-        # 2. Process these messages to create interaction objects
-        # 3. Return a list of these interaction objects
-        # For now, we'll return an empty list
-        return []
+    async def active_channels(self, limit: int) -> List[str]:
+        """The most recently written channels, newest first (requires memory.warmup.startup_channels)."""
+        if self.embedded or not self.active_channels_max:
+            return []
+        try:
+            members = await self.redis.zrange(ACTIVE_CHANNELS_KEY, 0, limit - 1, desc=True)
+            return [member.decode('utf-8') if isinstance(member, bytes) else member for member in members]
+        except Exception as e:
+            self.monitor.log_error(f"Error reading active channels: {e}")
+            return []
+
+    async def _enable_keyspace_events(self):
+        """Turn on the list and generic keyspace events the invalidation watcher needs."""
+        try:
+            current = (await self.redis.config_get('notify-keyspace-events')).get('notify-keyspace-events', '')
+            if isinstance(current, bytes):
+                current = current.decode('utf-8')
+            wanted = set(current) | set('Klgx')
+            if wanted != set(current):
+                await self.redis.config_set('notify-keyspace-events', ''.join(sorted(wanted)))
+        except Exception as e:
+            # Managed Redis often forbids CONFIG; notifications may already be enabled server side
+            self.monitor.log_warning(f"Could not enable keyspace notifications: {e}")
+
+    async def _watch_invalidations(self):
+        """Drop cached channels that another instance changed."""
+        db = self.redis.connection_pool.connection_kwargs.get('db', 0)
+        prefix = f'__keyspace@{db}__:'
+        pubsub = self.redis.pubsub()
+        try:
+            await pubsub.psubscribe(prefix + self._key('*'))
+            async for message in pubsub.listen():
+                if message['type'] != 'pmessage':
+                    continue
+                key = message['channel'].decode('utf-8')[len(prefix):]
+                event = message['data'].decode('utf-8')
+                if event in ('ltrim', 'expire'):
+                    # Always follow an LPUSH, which is what decides
+                    continue
+                if event == 'lpush' and self._own_writes.get(key):
+                    self._forget_own_write(key)
+                    continue
+                channel_id = key[len('channel:'):-len(':interactions')]
+                self.cache.invalidate(channel_id)
+                self._summaries.pop(channel_id, None)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Without notifications the cache could serve another instance's stale history
+            self.monitor.log_error(f"Keyspace notification listener failed, disabling the history cache: {e}")
+            self.cache = None
+        finally:
+            await pubsub.aclose()
+
+    def _forget_own_write(self, key: str):
+        count = self._own_writes.get(key, 0) - 1
+        if count > 0:
+            self._own_writes[key] = count
+        else:
+            self._own_writes.pop(key, None)
+
+    async def _fetch_more_interactions(self, channel_id: str, count: int, before: Optional[object] = None) -> List[Dict]:
+        """Fetch up to count interactions, oldest first, from the channel history."""
+        if self.history_source is None:
+            return []
+        interactions = await self.history_source(channel_id, count, before)
+        return interactions[-count:]
 
 async def setup(bot: commands.Bot):
-    """Setup function to return the ShortTermMemory class."""
+    """Create the shared ShortTermMemory and attach it to the bot."""
+    existing = getattr(bot, 'short_term_memory', None)
+    if existing is not None:
+        return existing
     config = bot.config
     monitor = Monitor(__name__)
     short_term_memory = ShortTermMemory(config, monitor)
     await short_term_memory.setup()
+    bot.short_term_memory = short_term_memory
     return short_term_memory
@@ -0,0 +1,122 @@
+import asyncio
+from typing import List, Optional
+import discord
+from discord.ext import commands
+
+DISCORD_MESSAGE_LIMIT = 2000
+
+
+def split_message(text: str) -> List[str]:
+    """Split text into Discord-sized messages, preferring newline and space boundaries."""
+    parts = []
+    while len(text) > DISCORD_MESSAGE_LIMIT:
+        head, text = StreamingReply._split(text)
+        parts.append(head)
+    if text:
+        parts.append(text)
+    return parts
+
+
+class StreamingReply:
+    """Render a streamed completion into Discord by editing a placeholder message.
+
+    `feed` only buffers text; a background task started by `start` writes it out
+    with at most one edit per `edit_interval` seconds, so a fast token stream
+    does not run into Discord's per-channel rate limits and whoever consumes the
+    stream never waits on Discord. When the text grows past the 2000 character
+    message limit, the current message is finalized and the remainder continues
+    in a new message.
+    """
+
+    def __init__(self, ctx: commands.Context, edit_interval: float = 1.0, placeholder: str = "…"):
+        self.ctx = ctx
+        self.edit_interval = edit_interval
+        self.placeholder = placeholder
+        self.messages: List[discord.Message] = []
+        self._current: Optional[discord.Message] = None
+        self._buffer = ""
+        self._chunks: List[str] = []
+        self._dirty = False
+        self._done = asyncio.Event()
+        self._renderer: Optional[asyncio.Task] = None
+
+    @property
+    def content(self) -> str:
+        """Full text received so far, across every message."""
+        return "".join(self._chunks)
+
+    async def start(self):
+        """Post the placeholder so the user sees activity immediately."""
+        self._current = await self.ctx.send(self.placeholder)
+        self.messages.append(self._current)
+        self._renderer = asyncio.create_task(self._render_loop())
+
+    async def feed(self, text: str):
+        """Append a chunk of streamed text; it is shown on the next edit."""
+        if not text:
+            return
+        self._chunks.append(text)
+        self._buffer += text
+        self._dirty = True
+
+    async def finish(self) -> str:
+        """Write out any pending text and return the complete reply."""
+        await self._stop()
+        await self._render()
+        if not self._buffer and self._current is not None:
+            # Nothing left for the last message; drop its placeholder instead of leaving it behind
+            await self._current.delete()
+            self.messages.remove(self._current)
+            self._current = None
+        return self.content
+
+    async def abort(self):
+        """Remove the placeholder and anything posted so far, e.g. when no reply is coming."""
+        try:
+            await self._stop()
+        except Exception:
+            pass
+        for message in self.messages:
+            try:
+                await message.delete()
+            except discord.HTTPException:
+                pass
+        self.messages.clear()
+        self._current = None
+
+    async def _stop(self):
+        """Stop the renderer, re-raising anything that went wrong while editing."""
+        self._done.set()
+        if self._renderer is not None:
+            renderer, self._renderer = self._renderer, None
+            await renderer
+
+    async def _render_loop(self):
+        while not self._done.is_set():
+            try:
+                await asyncio.wait_for(self._done.wait(), timeout=self.edit_interval)
+            except asyncio.TimeoutError:
+                await self._render()
+
+    async def _render(self):
+        while len(self._buffer) > DISCORD_MESSAGE_LIMIT:
+            head, self._buffer = self._split(self._buffer)
+            await self._current.edit(content=head)
+            shown = self._buffer[:DISCORD_MESSAGE_LIMIT]
+            self._current = await self.ctx.send(shown or self.placeholder)
+            self.messages.append(self._current)
+            self._dirty = self._buffer != shown
+        if self._dirty and self._buffer:
+            # Cleared first: text fed during the edit is picked up by the next one
+            self._dirty = False
+            await self._current.edit(content=self._buffer)
+
+    @staticmethod
+    def _split(text: str):
+        """Split at the last newline or space before the limit, or hard-split if there is none."""
+        cut = text.rfind("\n", 0, DISCORD_MESSAGE_LIMIT)
+        if cut <= 0:
+            cut = text.rfind(" ", 0, DISCORD_MESSAGE_LIMIT)
+        if cut <= 0:
+            cut = DISCORD_MESSAGE_LIMIT
+        return text[:cut], text[cut:].lstrip("\n")
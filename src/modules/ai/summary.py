@@ -0,0 +1,112 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional
+from src.clients.scheduler import SchedulerBusy
+from src.core.config import Config
+from src.modules.ai.short_term import ShortTermMemory
+from src.utils.monitor import Monitor
+
+# Takes the request messages and the output cap in tokens
+Completer = Callable[[List[Dict[str, str]], int], Awaitable[str]]
+
+DEFAULT_INSTRUCTIONS = (
+    "You maintain a running summary of a Discord conversation between users and an assistant. "
+    "Merge the new turns into the existing summary. Keep names, facts, decisions, open questions "
+    "and anything the assistant promised; drop small talk. Write at most {max_words} words of plain prose."
+)
+
+
+class ConversationSummarizer:
+    """Fold older turns of a channel's history into a running summary, off the request path.
+
+    Once a channel has `threshold` turns more than the `keep_recent` newest ones
+    that the summary does not cover yet, those older turns are merged into the
+    summary by a (cheaper) model. The summary records the timestamp of the last
+    turn it covers, so the chat module can send the summary plus only the newer
+    turns instead of the whole history.
+    """
+
+    def __init__(self, config: Config, monitor: Monitor, memory: ShortTermMemory, complete: Completer):
+        self.config = config
+        self.monitor = monitor
+        self.memory = memory
+        self.complete = complete
+        self.keep_recent = config.get('memory.summary.keep_recent', 4)
+        # Summarize before turns are trimmed off the list, or they'd be lost instead
+        self.threshold = max(1, min(config.get('memory.summary.threshold', 6),
+                                    memory.short_term_limit - self.keep_recent))
+        self.max_words = config.get('memory.summary.max_words', 150)
+        # Room for max_words of English (~1.3 tokens per word) so the summary isn't cut off mid-sentence
+        self.max_tokens = config.get('memory.summary.max_tokens', self.max_words * 2)
+        self.instructions = config.get('memory.summary.instructions', DEFAULT_INSTRUCTIONS)
+        self._semaphore = asyncio.Semaphore(config.get('memory.summary.concurrency', 1))
+        self._running: Dict[str, asyncio.Task] = {}
+        self.runs = self.monitor.counter(
+            'memory_summary_runs_total', 'Background summarization runs by outcome', ['outcome'])
+        self.folded = self.monitor.counter(
+            'memory_summary_turns_folded_total', 'Turns folded into channel summaries')
+        self.latency = self.monitor.histogram(
+            'memory_summary_seconds', 'Time to summarize a batch of turns')
+
+    def schedule(self, channel_id: str, is_dm: bool):
+        """Summarize the channel in the background if it is due; returns immediately."""
+        if channel_id in self._running:
+            return
+        task = asyncio.create_task(self._run(channel_id, is_dm))
+        self._running[channel_id] = task
+        task.add_done_callback(lambda _: self._running.pop(channel_id, None))
+
+    async def close(self):
+        for task in list(self._running.values()):
+            task.cancel()
+        await asyncio.gather(*self._running.values(), return_exceptions=True)
+
+    async def _run(self, channel_id: str, is_dm: bool):
+        try:
+            interactions, summary = await asyncio.gather(
+                self.memory.get_recent_interactions(channel_id),
+                self.memory.get_summary(channel_id)
+            )
+            uncovered = self.uncovered(interactions, summary)
+            if len(uncovered) < self.keep_recent + self.threshold:
+                return
+            # Oldest first, leaving the newest keep_recent turns verbatim
+            turns = list(reversed(uncovered[self.keep_recent:]))
+            async with self._semaphore:
+                with self.latency.time():
+                    text = await self.complete(self.build_request(summary, turns), self.max_tokens)
+            if not text.strip():
+                self.runs.inc(outcome='empty')
+                return
+            await self.memory.store_summary(channel_id, {
+                'text': text.strip(),
+                'until': turns[-1].get('timestamp', 0),
+                'turns': (summary or {}).get('turns', 0) + len(turns),
+            }, is_dm)
+            self.folded.inc(len(turns))
+            self.runs.inc(outcome='ok')
+            self.monitor.log_info(f"Summarized {len(turns)} turn(s) for channel {channel_id}")
+        except asyncio.CancelledError:
+            raise
+        except SchedulerBusy:
+            # Users come first; the next turn in the channel tries again
+            self.runs.inc(outcome='shed')
+        except Exception as e:
+            # Not urgent; the next turn in the channel tries again
+            self.runs.inc(outcome='error')
+            self.monitor.log_warning(f"Error summarizing channel {channel_id}: {type(e).__name__}: {e}")
+
+    @staticmethod
+    def uncovered(interactions: List[Dict], summary: Optional[Dict]) -> List[Dict]:
+        """Interactions (newest first) newer than the last turn the summary covers."""
+        if not summary:
+            return interactions
+        until = summary.get('until', 0)
+        return [interaction for interaction in interactions if interaction.get('timestamp', 0) > until]
+
+    def build_request(self, summary: Optional[Dict], turns: List[Dict]) -> List[Dict[str, str]]:
+        transcript = "\n".join(f"User: {turn['content']}\nAssistant: {turn['response']}" for turn in turns)
+        existing = summary['text'] if summary else "(none yet)"
+        return [
+            {"role": "System", "message": self.instructions.format(max_words=self.max_words)},
+            {"role": "User", "message": f"Existing summary:\n{existing}\n\nNew turns:\n{transcript}\n\nUpdated summary:"},
+        ]
@@ -0,0 +1,175 @@
+import asyncio
+import time
+from typing import Dict, Iterable, List, Optional
+import discord
+from discord.ext import commands
+from src.core.config import config
+from src.modules.ai.gate import MessageGate
+from src.modules.ai.short_term import ShortTermMemory
+from src.utils.monitor import Monitor
+
+
+def pair_interactions(messages: List[discord.Message], bot_id: int, is_dm: bool,
+                      ignored_replies: Iterable[str] = ()) -> List[Dict]:
+    """Turn channel history (oldest first) into interaction records, oldest first.
+
+    Only messages the bot would have answered count as prompts: anything in a DM,
+    otherwise mentions of the bot and replies to its messages. Consecutive prompts
+    from one author form a single turn, as in the chat module's batching, and the
+    bot's next run of messages is taken as the reply to the earliest open turn.
+    """
+    ignored_replies = set(ignored_replies)
+    bot_message_ids = {message.id for message in messages if message.author.id == bot_id}
+    pending: List[discord.Message] = []
+    reply: List[str] = []
+    interactions = []
+
+    def take_turn() -> List[discord.Message]:
+        turn = [pending.pop(0)]
+        while pending and pending[0].author.id == turn[0].author.id:
+            turn.append(pending.pop(0))
+        return turn
+
+    def close_turn():
+        turn = take_turn()
+        interactions.append(ShortTermMemory.make_interaction(
+            "\n".join(message.content for message in turn), "\n".join(reply),
+            timestamp=turn[-1].created_at.timestamp()))
+        reply.clear()
+
+    for message in messages:
+        if message.author.id == bot_id:
+            if not pending or not message.content:
+                continue
+            if message.content in ignored_replies:
+                # An error or busy notice answered the next turn; drop that turn rather than pair it later
+                if reply:
+                    close_turn()
+                if pending:
+                    take_turn()
+            else:
+                reply.append(message.content)
+            continue
+        if reply:
+            close_turn()
+        if message.author.bot:
+            continue
+        if is_dm or any(user.id == bot_id for user in message.mentions) or \
+           (message.reference is not None and message.reference.message_id in bot_message_ids):
+            pending.append(message)
+    if reply:
+        close_turn()
+    return interactions
+
+
+class HistoryWarmer:
+    """Backfill short-term memory from Discord when a channel's history is missing.
+
+    After a Redis flush, a TTL expiry or a fresh deploy the bot would otherwise
+    answer without context. The first message in such a channel pages back
+    through up to memory.warmup.max_messages of its history and stores the
+    reconstructed interactions in one write. Channels are remembered as fresh
+    for their TTL, so later messages skip the check entirely. At most
+    memory.warmup.concurrency backfills run at once; discord.py's HTTP client
+    takes care of the per-route rate limits.
+    """
+
+    def __init__(self, bot: commands.Bot, memory: ShortTermMemory, gate: Optional[MessageGate] = None,
+                 ignored_replies: Iterable[str] = ()):
+        self.bot = bot
+        self.memory = memory
+        self.gate = gate
+        self.ignored_replies = tuple(ignored_replies)
+        self.monitor = Monitor(__name__)
+        self.max_messages = config.get('memory.warmup.max_messages', 100)
+        self.timeout = config.get('memory.warmup.timeout', 3.0)
+        self.startup_channels = config.get('memory.warmup.startup_channels', 0)
+        self._semaphore = asyncio.Semaphore(config.get('memory.warmup.concurrency', 4))
+        # Channel ID -> monotonic time until which its history counts as fresh
+        self._fresh: Dict[str, float] = {}
+        self.warmups = self.monitor.counter(
+            'memory_warmup_total', 'History warmup checks by result', ['result'])
+        self.warmup_latency = self.monitor.histogram(
+            'memory_warmup_seconds', 'Time spent backfilling a channel history from Discord')
+        memory.history_source = self.fetch_interactions
+
+    def is_fresh(self, channel_id: str) -> bool:
+        return self._fresh.get(channel_id, 0.0) > time.monotonic()
+
+    def _mark_fresh(self, channel_id: str, is_dm: bool):
+        now = time.monotonic()
+        if len(self._fresh) > 10000:
+            self._fresh = {key: until for key, until in self._fresh.items() if until > now}
+        self._fresh[channel_id] = now + self.memory._ttl(is_dm)
+
+    async def ensure_warm(self, channel_id: str, is_dm: bool, before: Optional[discord.Message] = None):
+        """Backfill the channel's history if it is empty; cheap when it was checked recently."""
+        if self.is_fresh(channel_id):
+            return
+        cache = self.memory.cache
+        if cache is not None and channel_id in cache:
+            self.warmups.inc(result='cached')
+            self._mark_fresh(channel_id, is_dm)
+            return
+
+        started = time.perf_counter()
+        try:
+            added = await asyncio.wait_for(self._fill(channel_id, is_dm, before), timeout=self.timeout)
+            self.warmups.inc(result='filled' if added else 'not_needed')
+        except asyncio.TimeoutError:
+            self.warmups.inc(result='timeout')
+            self.monitor.log_warning(f"History warmup for channel {channel_id} timed out after {self.timeout}s")
+        except Exception as e:
+            self.warmups.inc(result='error')
+            self.monitor.log_error(f"Error warming history for channel {channel_id}: {e}")
+        finally:
+            self.warmup_latency.observe(time.perf_counter() - started)
+        # Don't retry until the history could have expired again, whatever happened
+        self._mark_fresh(channel_id, is_dm)
+
+    async def _fill(self, channel_id: str, is_dm: bool, before: Optional[discord.Message]) -> int:
+        async with self._semaphore:
+            return await self.memory.fetch_and_fill_buffer(channel_id, is_dm, before)
+
+    async def fetch_interactions(self, channel_id: str, count: int,
+                                 before: Optional[discord.Message] = None) -> List[Dict]:
+        """history_source for ShortTermMemory: the channel's last `count` interactions, oldest first."""
+        channel = before.channel if before is not None else await self._resolve_channel(channel_id)
+        if channel is None or self.bot.user is None:
+            return []
+        messages = [message async for message in channel.history(limit=self.max_messages, before=before)]
+        messages.reverse()
+        bot_id = self.bot.user.id
+        if self.gate is not None:
+            for message in messages:
+                if message.author.id == bot_id:
+                    self.gate.record_sent(message.id)
+        interactions = pair_interactions(messages, bot_id, channel_id.startswith('dm_'), self.ignored_replies)
+        self.monitor.log_info(f"Rebuilt {len(interactions)} interaction(s) from {len(messages)} message(s) in channel {channel_id}")
+        return interactions[-count:]
+
+    async def _resolve_channel(self, channel_id: str) -> Optional[discord.abc.Messageable]:
+        if channel_id.startswith('dm_'):
+            user = self.bot.get_user(int(channel_id[len('dm_'):]))
+            if user is None:
+                return None
+            return user.dm_channel or await user.create_dm()
+        # None when the channel belongs to a shard this process doesn't run
+        return self.bot.get_channel(int(channel_id))
+
+    def _is_local(self, channel_id: str) -> bool:
+        if channel_id.startswith('dm_'):
+            return self.bot.get_user(int(channel_id[len('dm_'):])) is not None
+        return self.bot.get_channel(int(channel_id)) is not None
+
+    async def warm_active_channels(self):
+        """Warm the most recently active channels, e.g. right after startup."""
+        if not self.startup_channels:
+            return
+        started = time.perf_counter()
+        # Other workers warm the channels on their own shards
+        channel_ids = [channel_id for channel_id in await self.memory.active_channels(self.startup_channels)
+                       if self._is_local(channel_id)]
+        await asyncio.gather(*(self.ensure_warm(channel_id, channel_id.startswith('dm_'))
+                               for channel_id in channel_ids))
+        self.monitor.log_info(f"Warmed {len(channel_ids)} active channel(s) in {time.perf_counter() - started:.1f}s")
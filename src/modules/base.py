@@ -1,16 +1,26 @@
 # modules/base_module.py
+import asyncio
 from abc import abstractmethod
 from discord.ext import commands
 
 class BaseModule(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
+        self._setup_done = False
+        self._setup_lock = asyncio.Lock()
 
     @abstractmethod
     async def setup(self):
         """Set up the module."""
         pass
 
+    async def ensure_setup(self):
+        """Run setup() until it succeeds once; later calls, e.g. on reconnect, do nothing."""
+        async with self._setup_lock:
+            if not self._setup_done:
+                await self.setup()
+                self._setup_done = True
+
 async def setup(bot: commands.Bot):
     # This is a base class, so we don't need to add it as a cog
     pass
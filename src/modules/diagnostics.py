@@ -0,0 +1,103 @@
+import asyncio
+import signal
+from typing import Optional, Tuple
+from discord.ext import commands
+from src.modules.base import BaseModule
+from src.core.config import config
+from src.utils.loop_watchdog import LoopWatchdog
+from src.utils.monitor import Monitor
+from src.utils.profiler import ProfilerBusy, SamplingProfiler
+
+DEPENDS = ()
+
+MAX_PROFILE_SECONDS = 300
+
+
+class DiagnosticsModule(BaseModule):
+    """Event loop watchdog plus an on-demand sampling profiler.
+
+    A profile is recorded by the owner-only `profile [seconds]` command or by
+    sending the process SIGUSR1, and written as collapsed stacks under
+    diagnostics.profile_dir. `lag` shows the current loop lag percentiles.
+    """
+
+    def __init__(self, bot: commands.Bot):
+        super().__init__(bot)
+        self.monitor = Monitor(__name__)
+        self.watchdog = LoopWatchdog(
+            interval=config.get('diagnostics.lag_interval', 0.1),
+            block_threshold=config.get('diagnostics.block_threshold', 0.5),
+            report_interval=config.get('diagnostics.report_interval', 60.0)
+        )
+        self.profiler = SamplingProfiler(
+            output_dir=config.get('diagnostics.profile_dir', 'data/profiles'),
+            interval=config.get('diagnostics.profile_interval', 0.01)
+        )
+        self.profile_seconds = config.get('diagnostics.profile_seconds', 30)
+        self._signal_installed = False
+        self._profile_task: Optional[asyncio.Task] = None
+
+    async def setup(self):
+        self.watchdog.start()
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGUSR1, self._on_signal)
+            self._signal_installed = True
+        except (NotImplementedError, RuntimeError, AttributeError) as e:
+            # No SIGUSR1 on Windows, and handlers can only be set from the main thread
+            self.monitor.log_warning(f"SIGUSR1 profiling trigger unavailable: {e}")
+        self.monitor.log_info("DiagnosticsModule setup completed")
+
+    async def cog_unload(self):
+        if self._signal_installed:
+            asyncio.get_running_loop().remove_signal_handler(signal.SIGUSR1)
+            self._signal_installed = False
+        await self.watchdog.stop()
+
+    def _on_signal(self):
+        if self.profiler.busy:
+            self.monitor.log_warning("SIGUSR1 received while a profile is already recording; ignoring")
+            return
+        self._profile_task = asyncio.create_task(self._profile_quietly(self.profile_seconds))
+
+    async def _profile_quietly(self, seconds: float):
+        try:
+            await self.record_profile(seconds)
+        except Exception as e:
+            self.monitor.log_error(f"Error recording profile: {e}")
+
+    async def record_profile(self, seconds: float) -> Tuple[str, int]:
+        """Sample the whole process for `seconds` without blocking the loop; returns (path, samples)."""
+        self.monitor.log_info(f"Recording a {seconds}s profile")
+        path, samples = await asyncio.to_thread(self.profiler.run, seconds)
+        self.monitor.log_info(f"Wrote profile with {samples} samples to {path}")
+        return path, samples
+
+    @commands.command(name='profile')
+    @commands.is_owner()
+    async def profile_command(self, ctx: commands.Context, seconds: int = 30):
+        """Record a sampling profile of the bot for the given number of seconds."""
+        seconds = max(1, min(seconds, MAX_PROFILE_SECONDS))
+        await ctx.send(f"Profiling for {seconds}s...")
+        try:
+            path, samples = await self.record_profile(seconds)
+        except ProfilerBusy:
+            await ctx.send("A profile is already being recorded.")
+            return
+        await ctx.send(f"Wrote {samples} samples to `{path}`.")
+
+    @commands.command(name='lag')
+    @commands.is_owner()
+    async def lag_command(self, ctx: commands.Context):
+        """Show event loop lag percentiles since the last periodic report."""
+        stats = self.watchdog.stats()
+        await ctx.send(
+            f"Loop lag over {stats['samples']} samples: p50 {stats['p50'] * 1000:.1f}ms, "
+            f"p90 {stats['p90'] * 1000:.1f}ms, p99 {stats['p99'] * 1000:.1f}ms, max {stats['max'] * 1000:.1f}ms")
+
+
+async def setup(bot: commands.Bot):
+    if not config.get('diagnostics.enabled', True) or bot.get_cog(DiagnosticsModule.__cog_name__) is not None:
+        return
+    diagnostics = DiagnosticsModule(bot)
+    await diagnostics.ensure_setup()
+    await bot.add_cog(diagnostics)
@@ -0,0 +1,123 @@
+import asyncio
+import socket
+import time
+from typing import Dict, Optional, Set
+import redis.asyncio as redis
+from src.utils.monitor import Monitor
+
+# Take the lease if it is free, or extend it if we already own it
+_CLAIM = """
+local owner = redis.call('GET', KEYS[1])
+if not owner then
+    redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+    return 1
+end
+if owner == ARGV[1] then
+    redis.call('PEXPIRE', KEYS[1], ARGV[2])
+    return 1
+end
+return 0
+"""
+
+# Extend the lease only if it is still ours
+_RENEW = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# Delete the lease only if it is still ours
+_RELEASE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class ChannelLeases:
+    """Per-channel ownership leases in Redis, so only one worker answers a channel at a time.
+
+    A worker claims a channel before handling a batch of its messages and releases
+    it afterwards. The lease lasts `ttl` seconds, so one held by a worker that
+    died runs out on its own; while a lease taken with `acquire` is held, it is
+    renewed in the background every ttl/3 seconds, so a long turn keeps it.
+    The owner ID is stable per host and worker index, so a restarted worker picks
+    up its own leases instead of waiting for them to expire. If Redis cannot be
+    reached, claims succeed so the bot keeps answering rather than going silent.
+    """
+
+    def __init__(self, redis_client: redis.Redis, ttl: float = 30.0, owner: Optional[str] = None,
+                 worker_id: Optional[int] = None, retry_interval: float = 0.5):
+        self.redis = redis_client
+        self.ttl_ms = int(ttl * 1000)
+        self.owner = owner or f"{socket.gethostname()}:worker-{worker_id or 0}"
+        self.retry_interval = retry_interval
+        self.monitor = Monitor(__name__)
+        self._held: Set[str] = set()
+        self._renewals: Dict[str, asyncio.Task] = {}
+        self._claim = self.redis.register_script(_CLAIM)
+        self._renew = self.redis.register_script(_RENEW)
+        self._release = self.redis.register_script(_RELEASE)
+        self.claims = self.monitor.counter(
+            'channel_lease_claims_total', 'Channel lease claims by result', ['result'])
+
+    @staticmethod
+    def _key(channel_id: str) -> str:
+        return f'lease:channel:{channel_id}'
+
+    async def claim(self, channel_id: str) -> bool:
+        try:
+            claimed = bool(await self._claim(keys=[self._key(channel_id)], args=[self.owner, self.ttl_ms]))
+        except Exception as e:
+            self.monitor.log_error(f"Error claiming lease for channel {channel_id}: {e}")
+            self.claims.inc(result='error')
+            return True
+        self.claims.inc(result='claimed' if claimed else 'held_elsewhere')
+        if claimed:
+            self._held.add(channel_id)
+        return claimed
+
+    async def acquire(self, channel_id: str, wait: float) -> bool:
+        """Claim the channel, retrying for up to `wait` seconds while another worker holds it.
+
+        The lease is then kept alive until `release`.
+        """
+        deadline = time.monotonic() + wait
+        while not await self.claim(channel_id):
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(self.retry_interval)
+        if channel_id not in self._renewals:
+            self._renewals[channel_id] = asyncio.create_task(self._keep_alive(channel_id))
+        return True
+
+    async def _keep_alive(self, channel_id: str):
+        interval = self.ttl_ms / 3000
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                renewed = await self._renew(keys=[self._key(channel_id)], args=[self.owner, self.ttl_ms])
+            except Exception as e:
+                # Try again next interval; two more misses still fit inside the TTL
+                self.monitor.log_error(f"Error renewing lease for channel {channel_id}: {e}")
+                continue
+            if not renewed:
+                self.claims.inc(result='lost')
+                self.monitor.log_warning(f"Lost lease for channel {channel_id} while answering it")
+                return
+
+    async def release(self, channel_id: str):
+        self._held.discard(channel_id)
+        renewal = self._renewals.pop(channel_id, None)
+        if renewal is not None:
+            renewal.cancel()
+        try:
+            await self._release(keys=[self._key(channel_id)], args=[self.owner])
+        except Exception as e:
+            self.monitor.log_error(f"Error releasing lease for channel {channel_id}: {e}")
+
+    async def release_all(self):
+        """Give up every lease this worker holds, e.g. on shutdown."""
+        await asyncio.gather(*(self.release(channel_id) for channel_id in list(self._held)))
@@ -0,0 +1,142 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Dict, List, Optional
+from src.utils.monitor import Monitor
+
+LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class LoopWatchdog:
+    """Measure event loop lag and catch whatever blocks the loop in the act.
+
+    A heartbeat task on the loop wakes every `interval` seconds and records how
+    late it woke up. A separate thread watches the heartbeat; when it stalls for
+    `block_threshold` seconds, the thread grabs the loop thread's current stack,
+    which points straight at the blocking call, and logs it. Lag percentiles are
+    logged every `report_interval` seconds and exported as event_loop_lag_seconds.
+    """
+
+    def __init__(self, interval: float = 0.1, block_threshold: float = 0.5, report_interval: float = 60.0,
+                 stack_depth: int = 12):
+        self.interval = interval
+        self.block_threshold = block_threshold
+        self.report_interval = report_interval
+        self.stack_depth = stack_depth
+        self.monitor = Monitor(__name__)
+        self.root = os.getcwd()
+        self._loop_thread_id: Optional[int] = None
+        self._beat = 0.0
+        self._reported_beat = 0.0
+        self._blocked_stack: Optional[List[traceback.FrameSummary]] = None
+        self._window: List[float] = []
+        self._last_report = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.lag = self.monitor.histogram(
+            'event_loop_lag_seconds', 'How late the event loop ran a timer scheduled every interval', buckets=LAG_BUCKETS)
+        self.blocks = self.monitor.counter(
+            'event_loop_blocks_total', 'Times the event loop was blocked for longer than the threshold')
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._beat = self._last_report = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name='loop-watchdog', daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._thread is not None:
+            await asyncio.to_thread(self._thread.join, 1.0)
+            self._thread = None
+
+    def stats(self) -> Dict[str, float]:
+        """Lag percentiles (seconds) since the last report."""
+        window = self._window
+        return {
+            'samples': len(window),
+            'p50': percentile(window, 0.5),
+            'p90': percentile(window, 0.9),
+            'p99': percentile(window, 0.99),
+            'max': max(window, default=0.0),
+        }
+
+    async def _heartbeat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            self._beat = now
+            self.lag.observe(lag)
+            self._window.append(lag)
+            if lag >= self.block_threshold:
+                self._report_block(lag)
+            if now - self._last_report >= self.report_interval:
+                self._report()
+
+    def _report(self):
+        stats = self.stats()
+        if stats['samples']:
+            self.monitor.log_info(
+                f"Event loop lag over {self.report_interval:.0f}s: p50 {stats['p50'] * 1000:.1f}ms, "
+                f"p90 {stats['p90'] * 1000:.1f}ms, p99 {stats['p99'] * 1000:.1f}ms, max {stats['max'] * 1000:.1f}ms")
+        self._window = []
+        self._last_report = time.monotonic()
+
+    def _report_block(self, lag: float):
+        """Runs on the loop once it is free again; the stack was captured while it was blocked."""
+        self.blocks.inc()
+        stack, self._blocked_stack = self._blocked_stack, None
+        where = f" in {self._describe(stack)}" if stack else ""
+        self.monitor.log_warning(f"Event loop was blocked for {lag:.2f}s{where}")
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            beat = self._beat
+            stalled = time.monotonic() - beat
+            if stalled < self.block_threshold or self._reported_beat == beat:
+                continue
+            self._reported_beat = beat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = traceback.extract_stack(frame)[-self.stack_depth:]
+            del frame
+            self._blocked_stack = stack
+            self.monitor.log_warning(
+                f"Event loop blocked for {stalled:.2f}s so far in {self._describe(stack)}\n"
+                + "".join(traceback.format_list(stack)).rstrip())
+
+    def _describe(self, stack: List[traceback.FrameSummary]) -> str:
+        """Innermost frame, plus the innermost frame in our own code when that is a library."""
+        innermost = stack[-1]
+        location = f"{innermost.name} ({innermost.filename}:{innermost.lineno})"
+        for frame in reversed(stack):
+            if frame.filename.startswith(self.root) and 'site-packages' not in frame.filename:
+                if frame is not innermost:
+                    location += f", called from {frame.name} ({os.path.relpath(frame.filename, self.root)}:{frame.lineno})"
+                break
+        return location
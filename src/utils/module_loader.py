@@ -1,80 +1,177 @@
 import os
 import importlib
-import importlib.util
-import inspect
-import logging
 import asyncio
+import threading
+import time
 from discord.ext import commands
 from src.modules.base import BaseModule
-from typing import List, Any
+from typing import Dict, Iterable, List, Optional
 from src.utils.monitor import Monitor
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+
+def prewarm(*module_names: str) -> threading.Thread:
+    """Import heavy modules on a background thread so first use doesn't pay for it.
+
+    Used for SDKs a module only needs once traffic arrives, so their import
+    overlaps the gateway connection instead of delaying it.
+    """
+    def run():
+        for name in module_names:
+            try:
+                importlib.import_module(name)
+            except Exception as e:
+                Monitor(__name__).log_warning(f"Prewarming {name} failed: {e}")
+
+    thread = threading.Thread(target=run, name=f"prewarm-{'-'.join(module_names)}", daemon=True)
+    thread.start()
+    return thread
+
 
 class ModuleLoader(commands.Cog):
-    """Cog for dynamically loading modules."""
+    """Cog for dynamically loading modules.
+
+    Every module under module_dir with a `setup(bot)` function is loaded. A module
+    can list the modules it needs in a DEPENDS tuple, e.g. DEPENDS = ('ai.short_term',).
+    Modules are set up in dependency order, and modules whose dependencies are
+    all done are set up concurrently.
+    """
 
     def __init__(self, bot: commands.Bot, module_dir: str):
         self.bot = bot
         self.module_dir = module_dir
+        self.package = module_dir.replace('/', '.').strip('.')
         self.monitor = Monitor(__name__)
+        self.loaded: Dict[str, float] = {}
+        self.timings: Dict[str, Dict[str, float]] = {}
+        self.startup_seconds = self.monitor.gauge(
+            'module_startup_seconds', 'Time spent importing and setting up each module', ['module', 'phase'])
 
-    async def load_modules(self):
-        """Load all modules in the specified directory."""
-        module_order = ['ai.short_term', 'ai.chat']  # Specify the order of modules to load
-        for module_name in module_order:
-            await self.load_file_module(module_name)
-
-        # Load remaining modules
-        for module_file in os.listdir(self.module_dir):
-            if module_file.endswith('.py') and not module_file.startswith('__'):
-                module_name = module_file[:-3]
-                if module_name not in [m.split('.')[-1] for m in module_order]:
-                    await self.load_file_module(module_name)
-
-    async def load_folder_module(self, folder_name: str):
-        """Load a module from a folder."""
-        try:
-            module = importlib.import_module(f'src.modules.{folder_name}')
-            if hasattr(module, 'setup'):
-                setup_func = getattr(module, 'setup')
-                if asyncio.iscoroutinefunction(setup_func):
-                    await setup_func(self.bot)
-                else:
-                    setup_func(self.bot)
-                self.monitor.log_info(f"Loaded folder module: {folder_name}")
-            else:
-                self.monitor.log_warning(f"Folder module {folder_name} has no setup function, skipping")
-        except ImportError as e:
-            self.monitor.log_error(f"Failed to import folder module {folder_name}: {str(e)}")
-        except Exception as e:
-            self.monitor.log_error(f"Failed to load folder module {folder_name}: {str(e)}")
+    def discover(self) -> List[str]:
+        """Dotted names (relative to module_dir) of every module file, package __init__ files excluded."""
+        names = []
+        for root, dirs, files in os.walk(self.module_dir):
+            dirs[:] = sorted(d for d in dirs if not d.startswith('__'))
+            relative = os.path.relpath(root, self.module_dir)
+            prefix = '' if relative == '.' else relative.replace(os.sep, '.') + '.'
+            names.extend(prefix + f[:-3] for f in sorted(files) if f.endswith('.py') and not f.startswith('__'))
+        return names
 
-    async def load_file_module(self, module_name: str):
-        """Load a module from a file."""
-        try:
-            module = importlib.import_module(f'src.modules.{module_name}')
+    def _import(self, module_name: str):
+        started = time.perf_counter()
+        module = importlib.import_module(f'{self.package}.{module_name}')
+        self._record(module_name, 'import', time.perf_counter() - started)
+        return module
+
+    def _record(self, module_name: str, phase: str, seconds: float):
+        self.timings.setdefault(module_name, {})[phase] = seconds
+        self.startup_seconds.set(seconds, module=module_name, phase=phase)
+
+    @staticmethod
+    def plan(dependencies: Dict[str, Iterable[str]]) -> List[List[str]]:
+        """Group modules into levels; each level only depends on earlier ones.
+
+        Dependencies on modules that are not being loaded are ignored. Modules in a
+        cycle are left out of the plan.
+        """
+        remaining = {name: {dep for dep in deps if dep in dependencies and dep != name}
+                     for name, deps in dependencies.items()}
+        levels = []
+        while remaining:
+            level = sorted(name for name, deps in remaining.items() if not deps)
+            if not level:
+                break
+            levels.append(level)
+            for name in level:
+                del remaining[name]
+            for deps in remaining.values():
+                deps.difference_update(level)
+        return levels
+
+    async def load_modules(self, module_names: Optional[List[str]] = None):
+        """Load all modules in the specified directory (or just module_names), concurrently where possible."""
+        started = time.perf_counter()
+        setups, dependencies = {}, {}
+        for module_name in module_names or self.discover():
+            if module_name in self.loaded:
+                continue
+            try:
+                module = self._import(module_name)
+            except Exception as e:
+                self.monitor.log_error(f"Failed to import module {module_name}: {str(e)}")
+                continue
             setup_func = getattr(module, 'setup', None)
-            if setup_func:
-                if asyncio.iscoroutinefunction(setup_func):
-                    await setup_func(self.bot)
+            if setup_func is None:
+                continue
+            setups[module_name] = setup_func
+            dependencies[module_name] = tuple(getattr(module, 'DEPENDS', ()))
+
+        if not setups:
+            return
+        levels = self.plan(dependencies)
+        planned = {name for level in levels for name in level}
+        for name in set(dependencies) - planned:
+            self.monitor.log_error(f"Not loading module {name}: circular dependency in {dependencies[name]}")
+
+        failed = set(dependencies) - planned
+        for level in levels:
+            runnable = []
+            for name in level:
+                blocked = [dep for dep in dependencies[name] if dep in failed]
+                if blocked:
+                    self.monitor.log_error(f"Not loading module {name}: dependencies failed to load: {', '.join(blocked)}")
+                    failed.add(name)
                 else:
-                    setup_func(self.bot)
-                self.monitor.log_info(f"Loaded file module: {module_name}")
+                    runnable.append(name)
+            results = await asyncio.gather(*(self._setup(name, setups[name]) for name in runnable))
+            failed.update(name for name, ok in zip(runnable, results) if not ok)
+
+        total = time.perf_counter() - started
+        self._record('all', 'total', total)
+        self.log_timings(total)
+
+    async def _setup(self, module_name: str, setup_func) -> bool:
+        started = time.perf_counter()
+        try:
+            if asyncio.iscoroutinefunction(setup_func):
+                await setup_func(self.bot)
             else:
-                self.monitor.log_warning(f"File module {module_name} has no setup function, skipping")
+                setup_func(self.bot)
         except Exception as e:
-            self.monitor.log_error(f"Failed to load file module {module_name}: {str(e)}")
+            self.monitor.log_error(f"Failed to load module {module_name}: {str(e)}")
+            return False
+        finally:
+            self._record(module_name, 'setup', time.perf_counter() - started)
+        self.loaded[module_name] = time.perf_counter()
+        self.monitor.log_info(f"Loaded module: {module_name}")
+        return True
+
+    def log_timings(self, total: float):
+        breakdown = ', '.join(
+            f"{name} {phases.get('import', 0) * 1000:.0f}+{phases.get('setup', 0) * 1000:.0f}ms"
+            for name, phases in sorted(self.timings.items(), key=lambda item: -sum(item[1].values()))
+            if name != 'all'
+        )
+        self.monitor.log_info(f"Modules loaded in {total * 1000:.0f}ms (import+setup): {breakdown}")
+
+    async def load_file_module(self, module_name: str):
+        """Load a single module (and any of its dependencies not yet loaded)."""
+        module = self._import(module_name)
+        pending = [module_name]
+        for dependency in getattr(module, 'DEPENDS', ()):
+            if dependency not in self.loaded:
+                pending.insert(0, dependency)
+        await self.load_modules(pending)
 
     @commands.Cog.listener()
     async def on_ready(self):
-        """Event listener for when the bot is ready."""
+        """Event listener for when the bot is ready; fires again after every reconnect."""
         for module in self.bot.cogs.values():
-            if isinstance(module, BaseModule) and hasattr(module, 'setup'):
-                await module.setup()
-                self.monitor.log_info(f"Set up module: {module.__class__.__name__}")
+            if isinstance(module, BaseModule):
+                # No-op once a module's setup has succeeded; retries ones that failed at startup
+                try:
+                    await module.ensure_setup()
+                except Exception as e:
+                    self.monitor.log_error(f"Failed to set up module {module.__class__.__name__}: {str(e)}")
 
 # Example usage
 def setup(bot: commands.Bot):
@@ -1,53 +1,207 @@
+import atexit
+import json
 import logging
-from rich.logging import RichHandler
-from rich.traceback import install as install_rich_traceback
-from rich.console import Console
+import logging.handlers
+import os
+import queue
+import random
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional, Sequence
+from src.utils.metrics import DEFAULT_BUCKETS, Counter, Gauge, Histogram, registry
 
-# Install Rich traceback handling
-install_rich_traceback()
 
-class Logger:
-    def __init__(self, name: str, log_file: str = 'data/logs/app.log'):
-        """Initialize the logger with a specified name and log file."""
-        # Create a Rich console for prettier output
-        self.console = Console()
-
-        # Configure logging with Rich handler
-        logging.basicConfig(
-            level="INFO",
-            format="%(message)s",
-            datefmt="[%X]",
-            handlers=[RichHandler(console=self.console, rich_tracebacks=True)]
-        )
+class LazyJSON:
+    """Defer json.dumps of a value until the log record is actually formatted.
+
+    Use as a %-style argument: monitor.log_debug("History: %s", LazyJSON(history)).
+    Records below the logger's level are never formatted. For enabled records the
+    value is serialized when the record is queued, while the caller still owns it,
+    so later changes to a live list or dict don't race the writer thread.
+    """
+
+    __slots__ = ('value', 'indent')
+
+    def __init__(self, value: Any, indent: Optional[int] = None):
+        self.value = value
+        self.indent = indent
+
+    def __str__(self):
+        return json.dumps(self.value, indent=self.indent, default=str)
+
+
+# Log arguments that are rendered when queued rather than on the writer thread
+_SNAPSHOT_TYPES = (LazyJSON, list, dict, set)
+
+
+class JSONLinesFormatter(logging.Formatter):
+    """Format each record as a single JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': record.created,
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Per-logger sampling and token-bucket rate limiting for noisy loggers.
+
+    Warnings and errors always pass; only records below WARNING are sampled or limited.
+    """
+
+    def __init__(self, sample_rate: float = 1.0, rate_limit: Optional[float] = None, burst: Optional[int] = None):
+        super().__init__()
+        self.sample_rate = sample_rate
+        self.rate_limit = rate_limit
+        self.burst = burst if burst is not None else max(1, int(rate_limit or 1))
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            self.dropped += 1
+            return False
+        if self.rate_limit is None:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate_limit)
+            self._last = now
+            if self._tokens < 1:
+                self.dropped += 1
+                return False
+            self._tokens -= 1
+            return True
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves most message formatting to the writer thread.
+
+    The stock handler formats in prepare() so records can be pickled; the queue here
+    never leaves the process, so only arguments that may still be mutated after the
+    call (LazyJSON values and plain containers) are turned into text up front.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if isinstance(record.args, tuple) and any(isinstance(arg, _SNAPSHOT_TYPES) for arg in record.args):
+            record.args = tuple(str(arg) if isinstance(arg, _SNAPSHOT_TYPES) else arg for arg in record.args)
+        return record
+
+
+class _LogPipeline:
+    """Process-wide logging pipeline: one queue, one background writer thread.
+
+    Every logger propagates to a single queue handler on the root logger, so creating
+    more Monitor instances never adds handlers and callers never block on file or
+    console I/O.
+    """
 
+    def __init__(self):
+        self.queue: queue.Queue = queue.Queue(-1)
+        self.listener: Optional[logging.handlers.QueueListener] = None
+        self.handler = _DeferredQueueHandler(self.queue)
+        self.configured = False
+        self._lock = threading.Lock()
+
+    def configure(self, level: str = "INFO", log_dir: str = 'data/logs', max_bytes: int = 10 * 1024 * 1024,
+                  backup_count: int = 5, json_logs: bool = True, console: bool = True):
+        with self._lock:
+            if self.listener is not None:
+                self.listener.stop()
+
+            os.makedirs(log_dir, exist_ok=True)
+            handlers = []
+            if console:
+                # Rich is only imported by processes that log to a console
+                from rich.console import Console
+                from rich.logging import RichHandler
+                from rich.traceback import install as install_rich_traceback
+                install_rich_traceback()
+                handlers.append(RichHandler(console=Console(), rich_tracebacks=True, log_time_format="[%X]"))
+
+            file_handler = logging.handlers.RotatingFileHandler(
+                os.path.join(log_dir, 'app.log'), maxBytes=max_bytes, backupCount=backup_count
+            )
+            file_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+            handlers.append(file_handler)
+
+            if json_logs:
+                json_handler = logging.handlers.RotatingFileHandler(
+                    os.path.join(log_dir, 'app.jsonl'), maxBytes=max_bytes, backupCount=backup_count
+                )
+                json_handler.setFormatter(JSONLinesFormatter())
+                handlers.append(json_handler)
+
+            root = logging.getLogger()
+            for handler in list(root.handlers):
+                root.removeHandler(handler)
+            root.addHandler(self.handler)
+            root.setLevel(level)
+
+            self.listener = logging.handlers.QueueListener(self.queue, *handlers, respect_handler_level=True)
+            self.listener.start()
+            self.configured = True
+
+    def ensure_configured(self):
+        if not self.configured:
+            self.configure()
+
+    def stop(self):
+        """Flush pending records and stop the writer thread."""
+        with self._lock:
+            if self.listener is not None:
+                self.listener.stop()
+                self.listener = None
+
+
+_pipeline = _LogPipeline()
+atexit.register(_pipeline.stop)
+
+
+def configure_logging(**kwargs):
+    """(Re)configure the shared pipeline: level, log_dir, max_bytes, backup_count, json_logs, console."""
+    _pipeline.configure(**kwargs)
+
+
+class Logger:
+    def __init__(self, name: str):
+        """Initialize the logger with a specified name; output goes through the shared pipeline."""
+        _pipeline.ensure_configured()
         self.logger = logging.getLogger(name)
 
-        # Add file handler for logging to file
-        file_handler = logging.FileHandler(log_file)
-        file_handler.setLevel(logging.DEBUG)
-        file_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-        file_handler.setFormatter(file_formatter)
-        self.logger.addHandler(file_handler)
+    def is_enabled_for(self, level: int) -> bool:
+        return self.logger.isEnabledFor(level)
 
-    def debug(self, message: str):
+    # stacklevel=3 attributes records to the caller of Monitor.log_*, not to this module
+    def debug(self, message: str, *args):
         """Log a debug message."""
-        self.logger.debug(message)
+        self.logger.debug(message, *args, stacklevel=3)
 
-    def info(self, message: str):
+    def info(self, message: str, *args):
         """Log an info message."""
-        self.logger.info(message)
+        self.logger.info(message, *args, stacklevel=3)
 
-    def warning(self, message: str):
+    def warning(self, message: str, *args):
         """Log a warning message."""
-        self.logger.warning(message)
+        self.logger.warning(message, *args, stacklevel=3)
 
-    def error(self, message: str):
+    def error(self, message: str, *args):
         """Log an error message."""
-        self.logger.error(message)
+        self.logger.error(message, *args, stacklevel=3)
 
-    def critical(self, message: str):
+    def critical(self, message: str, *args):
         """Log a critical message."""
-        self.logger.critical(message)
+        self.logger.critical(message, *args, stacklevel=3)
 
 
 class ErrorHandler:
@@ -62,24 +216,55 @@ class ErrorHandler:
 
 
 class Monitor:
+    _filters: Dict[str, SamplingFilter] = {}
+
     def __init__(self, name: str):
         """Initialize the monitor with a logger and error handler."""
+        self.name = name
         self.logger = Logger(name)
 
-    def log_info(self, message: str):
+    def is_enabled_for(self, level: int) -> bool:
+        """Whether a record at level would be emitted; use to guard expensive argument construction."""
+        return self.logger.is_enabled_for(level)
+
+    def set_sampling(self, sample_rate: float = 1.0, rate_limit: Optional[float] = None, burst: Optional[int] = None):
+        """Sample and/or rate limit (records per second) this logger's debug and info output."""
+        existing = self._filters.pop(self.name, None)
+        if existing is not None:
+            self.logger.logger.removeFilter(existing)
+        if sample_rate >= 1.0 and rate_limit is None:
+            return
+        sampling_filter = SamplingFilter(sample_rate, rate_limit, burst)
+        self._filters[self.name] = sampling_filter
+        self.logger.logger.addFilter(sampling_filter)
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        """Get or create a counter in the shared metrics registry."""
+        return registry.counter(name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        """Get or create a gauge in the shared metrics registry."""
+        return registry.gauge(name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        """Get or create a latency histogram (seconds) in the shared metrics registry."""
+        return registry.histogram(name, documentation, labelnames, buckets)
+
+    def log_info(self, message: str, *args):
         """Log an info message."""
-        self.logger.info(message)
+        self.logger.info(message, *args)
 
-    def log_error(self, message: str):
+    def log_error(self, message: str, *args):
         """Log an error message using the error handler."""
-        self.logger.error(message)
+        self.logger.error(message, *args)
 
-    def log_warning(self, message: str):
+    def log_warning(self, message: str, *args):
         """Log a warning message."""
-        self.logger.warning(message)
+        self.logger.warning(message, *args)
 
-    def log_debug(self, message: str):
+    def log_debug(self, message: str, *args):
         """Log a debug message."""
-        self.logger.debug(message)
+        self.logger.debug(message, *args)
 
     # Additional monitoring methods can be added here
@@ -0,0 +1,20 @@
+import redis.asyncio as redis
+from typing import Dict
+
+# One client (and therefore one connection pool) per Redis URL for the whole process
+_clients: Dict[str, redis.Redis] = {}
+
+def get_redis(url: str, max_connections: int = 32) -> redis.Redis:
+    """Return the process-wide Redis client for url, creating its pool on first use."""
+    client = _clients.get(url)
+    if client is None:
+        pool = redis.ConnectionPool.from_url(url, max_connections=max_connections)
+        client = redis.Redis(connection_pool=pool)
+        _clients[url] = client
+    return client
+
+async def close_all():
+    """Close every pooled client; used during shutdown."""
+    while _clients:
+        _, client = _clients.popitem()
+        await client.aclose()